@@ -1,5 +1,5 @@
 import graphene
-from crm.schema import Query as CRMQuery, Mutation as CRMMutation
+from crm.schema import AsyncQuery, Query as CRMQuery, Mutation as CRMMutation
 
 class Query(CRMQuery, graphene.ObjectType):
     pass
@@ -8,3 +8,6 @@ class Mutation(CRMMutation, graphene.ObjectType):
     pass
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
+
+# Query-only schema served by the async endpoint; mutations stay on /graphql.
+async_schema = graphene.Schema(query=AsyncQuery)
@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'crm.capture.graphql_capture_middleware',
 ]
 
 ROOT_URLCONF = 'alx_backend_graphql_crm.urls'
@@ -133,6 +134,9 @@ CRONJOBS = [
     ('0 */12 * * *\', \'crm.cron.update_low_stock'),
 ]
 
+# Parsed/validated GraphQL documents kept by crm.views.CachedGraphQLView
+GRAPHQL_DOCUMENT_CACHE_SIZE = 1000
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -147,3 +151,98 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),
     },
 }
+
+# Response cache for read-heavy root fields, see crm.response_cache.
+# Entries and invalidations live in the given CACHES alias, which has to be
+# shared (Redis, Memcached, ...) when more than one worker process serves
+# requests; "check --deploy" warns about process-local caches.
+# "crm.response_cache.LocalMemoryBackend" with {"max_entries": ...} is an
+# in-process LRU for single-process setups.
+GRAPHQL_RESPONSE_CACHE = {
+    "BACKEND": "crm.response_cache.DjangoCacheBackend",
+    "OPTIONS": {"alias": "default"},
+    "TTL": 300,
+    "FIELDS": ["allProducts", "allCustomers"],
+}
+
+# Default mode and tuning for connection totalCount, see crm.counts.
+# "estimate" reads PostgreSQL's planner statistics or SQLite's sqlite_stat1
+# (kept by ANALYZE, which seed_data runs) and counts exactly without them.
+GRAPHQL_TOTAL_COUNT = {
+    "MODE": "exact",
+    "CACHE_ALIAS": "default",
+    "MAX_STALENESS": 60,
+    "ESTIMATE_THRESHOLD": 100000,
+}
+
+# Per-request cost and depth limits, see crm.cost. Operations over either
+# limit are rejected before execution; accepted ones report their cost in
+# the response extensions.
+GRAPHQL_QUERY_COST = {
+    "MAX_COST": 50000,
+    "MAX_DEPTH": 6,
+    "WEIGHTS": {
+        "Query.crmStats": 10,
+        "totalCount": 5,
+        "pageInfo": 0,
+    },
+}
+
+# Per-operation tracing and the /metrics endpoint, see crm.tracing.
+# EXTENSIONS adds each request's resolver and SQL timings to the response
+# extensions; leave it off in production, the histograms are always kept.
+# /metrics is served to staff sessions, or to a scraper that sends
+# "Authorization: Bearer <METRICS_TOKEN>" once a token is set.
+GRAPHQL_TRACING = {
+    "ENABLED": True,
+    "EXTENSIONS": DEBUG,
+    "BUCKETS": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    "MAX_OPERATIONS": 200,
+    "METRICS_TOKEN": None,
+}
+
+# Sampled capture of /graphql traffic for `manage.py replay_graphql`, see
+# crm.capture. Off by default; captured variables may hold customer data,
+# list the ones to blank in REDACT.
+GRAPHQL_CAPTURE = {
+    "ENABLED": False,
+    "SAMPLE_RATE": 0.01,
+    "PATH": "/tmp/graphql_capture.ndjson",
+    "MAX_BYTES": 50 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    "REDACT": [],
+}
+
+# Shared GraphQL client used by crm.cron and crm.tasks, see crm.graphql_client.
+# SCHEMA_PATH defaults to BASE_DIR / "schema.graphql"; when that file is
+# missing the SDL is printed from the in-process schema.
+GRAPHQL_CLIENT = {
+    "ENDPOINT": "http://localhost:8000/graphql",
+    "TIMEOUT": 30,
+    "RETRIES": 3,
+}
+
+# /export/orders and /export/customers, see crm.exports. Served to staff
+# sessions, or to a script that sends "Authorization: Bearer <TOKEN>" once a
+# token is set.
+CRM_EXPORTS = {
+    "TOKEN": None,
+}
+
+# Order reminder pipeline, see crm.reminders. Use "crm.reminders.EmailSender"
+# with {"from_email": ..., "host": ..., "port": ...} to send real email.
+ORDER_REMINDERS = {
+    "SENDER": "crm.reminders.FileSender",
+    "OPTIONS": {"path": "/tmp/order_reminders_log.txt"},
+    "CHUNK_SIZE": 2000,
+    "CONCURRENCY": 8,
+    "RETRIES": 3,
+    "RETRY_DELAY": 1.0,
+    # Seconds before an unsent claim left by a crashed run is retried.
+    "LEASE": 3600,
+    # Sent reminders are recorded every FLUSH_SIZE sends or FLUSH_INTERVAL
+    # seconds, whichever comes first: at most that much is resent after a
+    # run is killed.
+    "FLUSH_SIZE": 100,
+    "FLUSH_INTERVAL": 1.0,
+}
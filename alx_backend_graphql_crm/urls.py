@@ -15,10 +15,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.urls import path
-from .schema import schema
+from .schema import async_schema, schema
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from crm.views import AsyncGraphQLView, CachedGraphQLView, document_cache_stats, export, graphql_metrics
 
 urlpatterns = [
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql", csrf_exempt(CachedGraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql/async", csrf_exempt(AsyncGraphQLView.as_view(schema=async_schema))),
+    path("graphql/cache-stats", document_cache_stats),
+    path("metrics", graphql_metrics),
+    path("export/<str:name>", export),
 ]
@@ -0,0 +1,287 @@
+import json
+import math
+from collections import namedtuple
+
+from graphene.relay import Node
+from graphql import OperationType, parse
+
+from crm.models import Customer, Order, Product
+
+# One benchmarked request. ``variables(fixtures)`` builds the variables from
+# the rows picked by ``dataset_fixtures``. ``budget`` is the most SQL
+# queries the operation may run: an int, or ``budget(fixtures)`` for the few
+# operations that walk the table in fixed-size ranges. Budgets do not depend
+# on page sizes, so a per-row query (N+1) fails them on any dataset.
+Operation = namedtuple("Operation", ["name", "document", "variables", "budget"])
+
+
+def no_variables(fixtures):
+    return {}
+
+
+def dataset_fixtures():
+    """Existing rows the operations read and write against."""
+    customer = Customer.objects.filter(orders__isnull=False).order_by("pk").first()
+    order = Order.objects.order_by("pk").first()
+    in_stock = list(Product.objects.filter(stock__gt=0).order_by("pk").values_list("pk", flat=True)[:3])
+    return {
+        "customer": Node.to_global_id("CustomerNode", customer.pk),
+        "customer_pk": customer.pk,
+        "product": Node.to_global_id("ProductNode", in_stock[0]),
+        "in_stock_pks": in_stock,
+        "order": Node.to_global_id("OrderNode", order.pk),
+        "low_stock": Product.objects.filter(stock__lt=10).count(),
+    }
+
+
+OPERATIONS = [
+    Operation(
+        "customer",
+        """
+        query Customer($id: ID!) {
+            customer(id: $id) {
+                id name email lastOrderAt
+                orders(first: 20) {
+                    edges { node { id totalAmount orderDate products { edges { node { id name price } } } } }
+                }
+            }
+        }
+        """,
+        lambda fixtures: {"id": fixtures["customer"]},
+        3,
+    ),
+    Operation(
+        "allCustomers",
+        """
+        query AllCustomers {
+            allCustomers(first: 50) {
+                totalCount
+                pageInfo { hasNextPage endCursor }
+                edges { node { id name email phone orders(first: 5) { edges { node { id totalAmount } } } } }
+            }
+        }
+        """,
+        no_variables,
+        3,
+    ),
+    Operation(
+        "allCustomersSearch",
+        """
+        query SearchCustomers {
+            allCustomers(first: 20, nameIcontains: "ali") { edges { node { id name email } } }
+        }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "product",
+        """
+        query Product($id: ID!) {
+            product(id: $id) { id name price stock orders(first: 20) { edges { node { id customer { name } } } } }
+        }
+        """,
+        lambda fixtures: {"id": fixtures["product"]},
+        3,
+    ),
+    Operation(
+        "allProducts",
+        """
+        query AllProducts {
+            allProducts(first: 50, priceGte: 10) {
+                totalCount
+                edges { node { id name price stock } }
+            }
+        }
+        """,
+        no_variables,
+        2,
+    ),
+    Operation(
+        "order",
+        """
+        query Order($id: ID!) {
+            order(id: $id) { id totalAmount orderDate customer { id name email } products { edges { node { id name price } } } }
+        }
+        """,
+        lambda fixtures: {"id": fixtures["order"]},
+        3,
+    ),
+    Operation(
+        "allOrders",
+        """
+        query AllOrders {
+            allOrders(first: 50) {
+                totalCount
+                edges { node { id totalAmount orderDate customer { id name } products { edges { node { id name } } } } }
+            }
+        }
+        """,
+        no_variables,
+        3,
+    ),
+    Operation(
+        "allOrdersForCustomersLessThanYear",
+        """
+        query RecentCustomerOrders {
+            allOrdersForCustomersLessThanYear(first: 50) {
+                edges { node { id totalAmount customer { name createdAt } } }
+            }
+        }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "allCustomersKeyset",
+        """
+        query CustomersKeyset {
+            allCustomersKeyset(first: 50) { pageInfo { hasNextPage endCursor } edges { node { id name email } } }
+        }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "allProductsKeyset",
+        """
+        query ProductsKeyset {
+            allProductsKeyset(first: 50) { pageInfo { hasNextPage endCursor } edges { node { id name price } } }
+        }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "allOrdersKeyset",
+        """
+        query OrdersKeyset {
+            allOrdersKeyset(first: 50) {
+                pageInfo { hasNextPage endCursor }
+                edges { node { id orderDate customer { name } products { edges { node { name } } } } }
+            }
+        }
+        """,
+        no_variables,
+        2,
+    ),
+    Operation(
+        "crmStats",
+        """
+        query Stats { crmStats { customerCount orderCount totalRevenue } }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "salesByPeriod",
+        """
+        query SalesByMonth { salesByPeriod(period: MONTH) { period orderCount revenue } }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "topCustomers",
+        """
+        query TopCustomers { topCustomers(first: 20) { customer { id name email } orderCount revenue } }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "topProducts",
+        """
+        query TopProducts { topProducts(first: 20) { product { id name price } units revenue } }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "createCustomer",
+        """
+        mutation CreateCustomer($email: String!) {
+            createCustomer(name: "Benchmark", email: $email, phone: "+15550000000") { customer { id } message }
+        }
+        """,
+        lambda fixtures: {"email": "benchmark@example.com"},
+        2,
+    ),
+    Operation(
+        "bulkCreateCustomers",
+        """
+        mutation BulkCreateCustomers($customers: [JSONString]!) {
+            bulkCreateCustomers(customers: $customers, returnObjects: false) { createdCount errors }
+        }
+        """,
+        lambda fixtures: {
+            "customers": [
+                json.dumps({"name": f"Benchmark {i}", "email": f"benchmark{i}@example.com"})
+                for i in range(200)
+            ]
+        },
+        3,
+    ),
+    Operation(
+        "createProduct",
+        """
+        mutation CreateProduct { createProduct(name: "Benchmark", price: 9.99, stock: 10) { product { id } } }
+        """,
+        no_variables,
+        1,
+    ),
+    Operation(
+        "createOrder",
+        """
+        mutation CreateOrder($customerId: ID!, $productIds: [ID]!) {
+            createOrder(customerId: $customerId, productIds: $productIds) {
+                order { id totalAmount products { edges { node { id } } } }
+            }
+        }
+        """,
+        lambda fixtures: {"customerId": fixtures["customer_pk"], "productIds": fixtures["in_stock_pks"]},
+        7,
+    ),
+    Operation(
+        "bulkCreateOrders",
+        """
+        mutation BulkCreateOrders($orders: [BulkOrderInput]!) {
+            bulkCreateOrders(orders: $orders, reserveStock: false, returnObjects: false) { createdCount errors }
+        }
+        """,
+        lambda fixtures: {
+            "orders": [
+                {"customerId": fixtures["customer_pk"], "productIds": fixtures["in_stock_pks"]}
+                for _ in range(200)
+            ]
+        },
+        # Fixed per chunk of rows; 200 rows are a single chunk.
+        6,
+    ),
+    Operation(
+        "updateLowStockProducts",
+        """
+        mutation Restock { updateLowStockProducts(threshold: 10, increment: 10) { message products { id stock } } }
+        """,
+        no_variables,
+        # One UPDATE ... RETURNING per page of 1000 matching products, and
+        # one that finds no more.
+        lambda fixtures: 1 + math.ceil(fixtures["low_stock"] / 1000),
+    ),
+]
+
+
+def uncovered_fields(schema, operations=OPERATIONS):
+    """Root query and mutation fields no operation selects."""
+    selected = set()
+    for operation in operations:
+        for definition in parse(operation.document).definitions:
+            root = "Mutation" if definition.operation == OperationType.MUTATION else "Query"
+            selected.update(
+                f"{root}.{selection.name.value}" for selection in definition.selection_set.selections
+            )
+    fields = set()
+    for root in (schema.query_type, schema.mutation_type):
+        if root is not None:
+            fields.update(f"{root.name}.{name}" for name in root.fields)
+    return sorted(fields - selected)
@@ -0,0 +1,162 @@
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone as dt_timezone
+from logging.handlers import RotatingFileHandler
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+DEFAULTS = {
+    "ENABLED": False,
+    "PATHS": ["/graphql", "/graphql/async"],
+    # Fraction of requests written to the capture.
+    "SAMPLE_RATE": 0.01,
+    "PATH": "/tmp/graphql_capture.ndjson",
+    # Rotate at MAX_BYTES, keeping BACKUP_COUNT older files (.1, .2, ...).
+    "MAX_BYTES": 50 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+    # Variable names whose values are replaced before writing.
+    "REDACT": [],
+}
+
+logger = logging.getLogger(__name__)
+
+
+def capture_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_CAPTURE", {})}
+
+
+def capture_logger(config):
+    """Logger writing one NDJSON line per record to the rotating capture file."""
+    capture = logging.getLogger("crm.capture.records")
+    if not capture.handlers:
+        handler = RotatingFileHandler(
+            config["PATH"], maxBytes=config["MAX_BYTES"], backupCount=config["BACKUP_COUNT"]
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        capture.addHandler(handler)
+        capture.setLevel(logging.INFO)
+        capture.propagate = False
+    return capture
+
+
+def request_operations(request):
+    """
+    The GraphQL operations of ``request`` as dicts of query, variables,
+    operationName and extensions; a batch body yields several.
+    """
+    if request.method == "GET":
+        params = request.GET
+        data = {key: params.get(key) for key in ("query", "variables", "operationName", "extensions")}
+        operations = [data]
+    else:
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return []
+        operations = body if isinstance(body, list) else [body]
+
+    result = []
+    for data in operations:
+        if not isinstance(data, dict):
+            continue
+        operation = {key: data.get(key) for key in ("query", "variables", "operationName", "extensions")}
+        for key in ("variables", "extensions"):
+            if isinstance(operation[key], str):
+                try:
+                    operation[key] = json.loads(operation[key])
+                except ValueError:
+                    operation[key] = None
+        result.append(operation)
+    return result
+
+
+def fill_persisted_query(operation):
+    """Add the text of a hash-only persisted query, so the capture replays on a cold server."""
+    from crm.views import async_document_cache, document_cache
+
+    persisted = (operation.get("extensions") or {}).get("persistedQuery") or {}
+    key = persisted.get("sha256Hash")
+    if operation.get("query") or not key:
+        return
+    entry = document_cache.peek(key) or async_document_cache.peek(key)
+    if entry is not None:
+        operation["query"] = entry.query
+
+
+def redact(variables, names):
+    if not names or not isinstance(variables, dict):
+        return variables
+    return {
+        key: "[redacted]" if key in names else redact(value, names)
+        for key, value in variables.items()
+    }
+
+
+@sync_and_async_middleware
+def graphql_capture_middleware(get_response):
+    """
+    Write a sample of the GraphQL requests on GRAPHQL_CAPTURE["PATHS"] to a
+    rotating NDJSON file for ``manage.py replay_graphql``. Each line holds the
+    operation, its variables, the response status and the latency. Off unless
+    GRAPHQL_CAPTURE["ENABLED"].
+    """
+    config = capture_settings()
+    if not config["ENABLED"]:
+        raise MiddlewareNotUsed
+    paths = set(config["PATHS"])
+    sample_rate = config["SAMPLE_RATE"]
+    redacted = set(config["REDACT"])
+    capture = capture_logger(config)
+
+    def sampled(request):
+        return request.path in paths and random.random() < sample_rate
+
+    def record(request, response, started):
+        elapsed = time.perf_counter() - started
+        try:
+            operations = request_operations(request)
+            timestamp = datetime.now(dt_timezone.utc).isoformat()
+            for operation in operations:
+                fill_persisted_query(operation)
+                operation["variables"] = redact(operation["variables"], redacted)
+                line = {
+                    "timestamp": timestamp,
+                    "path": request.path,
+                    "method": request.method,
+                    **operation,
+                    "status": response.status_code,
+                    "duration_ms": round(elapsed * 1000, 3),
+                }
+                capture.info(json.dumps(line, default=str))
+        except Exception:
+            # Capturing must never fail the request it observes.
+            logger.exception("Could not capture GraphQL request")
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            if not sampled(request):
+                return await get_response(request)
+            started = time.perf_counter()
+            response = await get_response(request)
+            record(request, response, started)
+            return response
+
+        markcoroutinefunction(middleware)
+    else:
+
+        def middleware(request):
+            if not sampled(request):
+                return get_response(request)
+            started = time.perf_counter()
+            response = get_response(request)
+            record(request, response, started)
+            return response
+
+    return middleware
+
@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+from crm import rollups
+from crm.response_cache import response_cache_settings
+
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.database)
+def check_rollup_triggers(app_configs, databases=None, **kwargs):
+    """The sales rollup triggers must exist once the rollup tables do."""
+    errors = []
+    for alias in databases or []:
+        connection = connections[alias]
+        if rollups.ROLLUP_TABLES[0] not in connection.introspection.table_names():
+            continue
+        missing = rollups.missing_triggers(connection)
+        if missing:
+            errors.append(
+                Error(
+                    f"Sales rollup triggers are missing on database '{alias}': {', '.join(missing)}.",
+                    hint=(
+                        "A migration probably rebuilt crm_order or crm_order_products. "
+                        "Run 'manage.py rebuild_sales_rollups' to reinstall them and recompute the rollups."
+                    ),
+                    id="crm.E001",
+                )
+            )
+    return errors
+
+
+@register(Tags.caches, deploy=True)
+def check_response_cache_is_shared(app_configs, **kwargs):
+    """Response cache invalidations must reach every worker process."""
+    config = response_cache_settings()
+    backend = config["BACKEND"]
+    if backend == "crm.response_cache.LocalMemoryBackend":
+        where = "LocalMemoryBackend"
+    elif backend == "crm.response_cache.DjangoCacheBackend":
+        alias = config["OPTIONS"].get("alias", "default")
+        cache_backend = settings.CACHES.get(alias, {}).get("BACKEND")
+        if cache_backend not in PROCESS_LOCAL_CACHES:
+            return []
+        where = f"the '{alias}' cache ({cache_backend.rsplit('.', 1)[-1]})"
+    else:
+        return []
+    return [
+        Warning(
+            f"GRAPHQL_RESPONSE_CACHE keeps responses in {where}, which is local to one process.",
+            hint=(
+                "Writes only invalidate the process that made them, so other workers keep serving "
+                "stale responses until the TTL expires. Point the response cache at a shared "
+                "CACHES alias (Redis, Memcached, ...) when running more than one worker."
+            ),
+            id="crm.W001",
+        )
+    ]
@@ -0,0 +1,174 @@
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLObjectType,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+    get_named_type,
+    is_leaf_type,
+)
+
+DEFAULTS = {
+    "MAX_COST": 50000,
+    "MAX_DEPTH": 6,
+    # "Type.field" or "field" -> cost of resolving it once. Object fields
+    # default to 1 and scalars to 0; a connection's "edges" weight is
+    # charged per row of the page.
+    "WEIGHTS": {
+        "Query.crmStats": 10,
+        "totalCount": 5,
+        "pageInfo": 0,
+    },
+}
+
+
+def cost_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_QUERY_COST", {})}
+
+
+def is_connection(graphql_type):
+    return isinstance(graphql_type, GraphQLObjectType) and {"edges", "pageInfo"} <= graphql_type.fields.keys()
+
+
+class CostAnalysis:
+    """
+    Upper-bound cost of one operation: every field is charged its weight
+    times the number of times it can resolve, which is the product of the
+    page sizes (``first``/``last``, else the connection max limit) of the
+    connections above it. Each connection also costs its ``edges`` weight
+    per row of its page, so page size is paid for even when the nodes only
+    select scalars. Depth counts object fields only; the edges/node
+    wrappers of a connection do not add a level.
+    """
+
+    def __init__(self, schema, document, variables, config):
+        self.schema = schema
+        self.variables = variables or {}
+        self.weights = config["WEIGHTS"]
+        self.default_page_size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.variable_defaults = {}
+        self.max_depth = 0
+
+    def operation_cost(self, operation_ast):
+        for definition in operation_ast.variable_definitions or ():
+            if isinstance(definition.default_value, IntValueNode):
+                self.variable_defaults[definition.variable.name.value] = int(definition.default_value.value)
+        root = self.schema.get_root_type(operation_ast.operation)
+        return self.selection_cost(root, operation_ast.selection_set, 1, 1)
+
+    def fields(self, parent_type, selection_set):
+        """Yield (parent type, FieldNode) pairs, expanding fragments."""
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragments.get(selection.name.value)
+                if fragment is None:
+                    continue
+                condition, selections = fragment.type_condition, fragment.selection_set
+            elif isinstance(selection, InlineFragmentNode):
+                condition, selections = selection.type_condition, selection.selection_set
+            else:
+                continue
+            fragment_type = self.schema.get_type(condition.name.value) if condition else parent_type
+            if isinstance(fragment_type, GraphQLObjectType):
+                yield from self.fields(fragment_type, selections)
+            else:
+                yield from self.fields(parent_type, selections)
+
+    def weight(self, parent_type, name, field_type):
+        default = 0 if is_leaf_type(field_type) else 1
+        return self.weights.get(f"{parent_type.name}.{name}", self.weights.get(name, default))
+
+    def page_size(self, node):
+        size = None
+        for argument in node.arguments:
+            if argument.name.value not in ("first", "last"):
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                size = int(value.value)
+            elif isinstance(value, VariableNode):
+                name = value.name.value
+                size = self.variables.get(name, self.variable_defaults.get(name))
+        return size if isinstance(size, int) and size >= 0 else self.default_page_size
+
+    def selection_cost(self, parent_type, selection_set, multiplier, depth):
+        return sum(
+            self.field_cost(owner, node, multiplier, depth)
+            for owner, node in self.fields(parent_type, selection_set)
+        )
+
+    def field_cost(self, owner, node, multiplier, depth):
+        name = node.name.value
+        field = owner.fields.get(name)
+        if name.startswith("__") or field is None:
+            return 0
+        field_type = get_named_type(field.type)
+        total = multiplier * self.weight(owner, name, field_type)
+        if is_leaf_type(field_type):
+            return total
+        self.max_depth = max(self.max_depth, depth)
+        if is_connection(field_type):
+            return total + self.connection_cost(field_type, node, multiplier, depth)
+        return total + self.selection_cost(field_type, node.selection_set, multiplier, depth + 1)
+
+    def connection_cost(self, connection_type, node, multiplier, depth):
+        total = 0
+        page = multiplier * self.page_size(node)
+        for owner, child in self.fields(connection_type, node.selection_set):
+            if child.name.value != "edges":
+                # totalCount, pageInfo: once per connection, not per row.
+                total += self.field_cost(owner, child, multiplier, depth)
+                continue
+            edge_type = get_named_type(owner.fields["edges"].type)
+            total += page * self.weight(owner, "edges", edge_type)
+            for edge_owner, edge_child in self.fields(edge_type, child.selection_set):
+                if edge_child.name.value == "node":
+                    node_type = get_named_type(edge_owner.fields["node"].type)
+                    total += self.selection_cost(node_type, edge_child.selection_set, page, depth + 1)
+        return total
+
+
+def analyze(schema, document, operation_ast, variables, config=None):
+    """
+    Cost and depth of ``operation_ast`` with the request's variables, plus
+    the error to answer with when either is over its limit.
+    """
+    config = config or cost_settings()
+    analysis = CostAnalysis(schema, document, variables, config)
+    cost = analysis.operation_cost(operation_ast)
+    extensions = {
+        "cost": {
+            "requested": cost,
+            "budget": config["MAX_COST"],
+            "depth": analysis.max_depth,
+            "maxDepth": config["MAX_DEPTH"],
+        }
+    }
+    error = None
+    if analysis.max_depth > config["MAX_DEPTH"]:
+        error = GraphQLError(
+            f"Query depth {analysis.max_depth} exceeds the maximum depth of {config['MAX_DEPTH']}.",
+            extensions={"code": "QUERY_TOO_DEEP", **extensions},
+        )
+    elif cost > config["MAX_COST"]:
+        error = GraphQLError(
+            f"Query cost {cost} exceeds the budget of {config['MAX_COST']}. "
+            "Request smaller pages with `first`/`last` or select fewer nested connections.",
+            extensions={"code": "QUERY_TOO_COSTLY", **extensions},
+        )
+    return extensions, error
@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DatabaseError, connections
+
+DEFAULTS = {
+    "MODE": "exact",
+    "CACHE_ALIAS": "default",
+    "MAX_STALENESS": 60,
+    "ESTIMATE_THRESHOLD": 100000,
+}
+
+EXACT = "exact"
+CACHED = "cached"
+ESTIMATE = "estimate"
+
+
+def count_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_TOTAL_COUNT", {})}
+
+
+def count_cache_key(queryset):
+    # Selected columns and ordering do not change the count, so leave them
+    # out of the key: only the model and the WHERE clause matter.
+    sql = str(queryset.order_by().values("pk").query)
+    return "crm:count:" + hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+
+def cached_count(queryset, config):
+    """
+    COUNT(*) shared between requests for up to MAX_STALENESS seconds, so the
+    unfiltered total and common filter sets are counted at most once per
+    window however often they are asked for.
+    """
+    cache = caches[config["CACHE_ALIAS"]]
+    key = count_cache_key(queryset)
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, config["MAX_STALENESS"])
+    return total
+
+
+def estimated_count(queryset):
+    """
+    Row estimate from the backend's statistics (PostgreSQL's planner,
+    SQLite's ANALYZE), or None when it has none for this queryset.
+    """
+    connection = connections[queryset.db]
+    filtered = bool(queryset.query.where)
+
+    if connection.vendor == "postgresql":
+        if not filtered:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    if connection.vendor == "sqlite" and not filtered:
+        # Table size as of the last ANALYZE. Without statistics there is no
+        # estimate: MAX(pk) - MIN(pk) overcounts once rows are deleted.
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None
+        return int(row[0].split()[0]) if row else None
+    return None
+
+
+def total_count(queryset, mode=None):
+    """
+    Row count of a connection's filtered queryset in the requested mode.
+    ``estimate`` only answers with an estimate for tables at least
+    ESTIMATE_THRESHOLD rows large; smaller ones are cheap to count exactly.
+    """
+    config = count_settings()
+    mode = mode or config["MODE"]
+
+    if mode == ESTIMATE:
+        estimate = estimated_count(queryset)
+        if estimate is not None and estimate >= config["ESTIMATE_THRESHOLD"]:
+            return estimate
+        return queryset.count()
+    if mode == CACHED:
+        return cached_count(queryset, config)
+    return queryset.count()
+
+
+async def atotal_count(queryset, mode=None):
+    """``total_count`` for async resolvers; the exact count uses ``acount``."""
+    if (mode or count_settings()["MODE"]) == EXACT:
+        return await queryset.acount()
+    return await sync_to_async(total_count)(queryset, mode)
@@ -1,11 +1,12 @@
 import os
 from datetime import datetime
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
+from gql import gql
+
+from crm.graphql_client import execute
 
-# Define the GraphQL endpoint
-GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
 LOG_FILE_PATH = "/tmp/crmheart_heartbeat_log.txt"
+LOW_STOCK_THRESHOLD = 10
+RESTOCK_AMOUNT = 10
 
 def log_crm_heartbeat():
     """
@@ -21,21 +22,17 @@ def log_crm_heartbeat():
 
         # Optional: Query the GraphQL endpoint to verify responsiveness
         try:
-            transport = RequestsHTTPTransport(url=GRAPHQL_ENDPOINT, verify=False, retries=3)
-            client = Client(transport=transport, fetch_schema_from_transport=True)
-
-            # Assuming there's a simple 'hello' query in your GraphQL schema
-            # If not, you might need to adjust this query to something that exists,
-            # e.g., a simple 'customer' query if it takes no arguments or a specific ID.
+            # The schema has no 'hello' field and the shared client validates
+            # against the local schema, so ping with __typename instead.
             query = gql(
                 """
-                query {
-                    hello
+                query Heartbeat {
+                    __typename
                 }
                 """
             )
-            result = client.execute(query)
-            graphql_status = f"GraphQL endpoint responsive. Hello: {result.get('hello', 'N/A')}\n"
+            result = execute(query)
+            graphql_status = f"GraphQL endpoint responsive. Root type: {result.get('__typename', 'N/A')}\n"
         except Exception as e:
             graphql_status = f"GraphQL endpoint not responsive or query failed: {e}\n"
 
@@ -59,13 +56,10 @@ def update_low_stock():
     current_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     try:
-        transport = RequestsHTTPTransport(url=GRAPHQL_ENDPOINT, verify=False, retries=3)
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
         mutation = gql(
             """
-            mutation {
-                updateLowStockProducts {
+            mutation UpdateLowStock($threshold: Int, $increment: Int) {
+                updateLowStockProducts(threshold: $threshold, increment: $increment) {
                     products {
                         id
                         name
@@ -77,7 +71,10 @@ def update_low_stock():
             """
         )
 
-        result = client.execute(mutation)
+        result = execute(
+            mutation,
+            variable_values={"threshold": LOW_STOCK_THRESHOLD, "increment": RESTOCK_AMOUNT},
+        )
         updated_products_info = result.get('updateLowStockProducts', {})
         products = updated_products_info.get('products', [])
         message = updated_products_info.get('message', 'No message from mutation.')
@@ -0,0 +1,401 @@
+import asyncio
+import base64
+import datetime
+import decimal
+import json
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from graphene.relay import PageInfo
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+from graphql import GraphQLError
+from graphql_relay import cursor_to_offset, get_offset_with_default, offset_to_cursor
+
+from crm.loaders import RelatedRows, get_loaders, is_filtered, prefetched
+from crm.optimizer import optimize_queryset
+
+
+def in_event_loop():
+    """Whether the caller runs on an event loop, where the sync ORM must not be used."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class CRMFilterConnectionField(DjangoFilterConnectionField):
+    """
+    DjangoFilterConnectionField that cooperates with the request loaders.
+
+    Nested relations resolve to RelatedRows, the leading rows of the
+    relation read by the optimizer's prefetch or the loaders, or to the
+    relation's queryset when filter arguments were given. Any other plain
+    list is paginated as-is, or turned back into a queryset for filters.
+    Querysets are shaped by the optimizer to match the client's selection
+    set, and every node on the resulting page is queued in the loaders so
+    any relation the optimizer did not prefetch still batches together.
+
+    Forward pages of a queryset are cut with ``LIMIT first + 1`` and no
+    COUNT; the count is left to ``totalCount`` and only runs when selected.
+
+    Below the async endpoint's root, a page the optimizer prefetched is cut
+    on the event loop; any other page (filtered, or not prefetched) is
+    resolved with sync_to_async, and the connection is marked ``is_async``
+    so ``totalCount`` counts off the loop too.
+    """
+
+    @classmethod
+    def resolve_queryset(
+        cls, connection, iterable, info, args, filtering_args, filterset_class
+    ):
+        if isinstance(iterable, list):
+            if not any(k in filtering_args for k in args):
+                return iterable
+            model = connection._meta.node._meta.model
+            iterable = model.objects.filter(pk__in=[obj.pk for obj in iterable])
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def forward_window(cls, args, max_limit):
+        """``(start, first)`` of a forward page; ``first`` is None when unbounded."""
+        offset = args.pop("offset", None)
+        after = args.get("after")
+        if offset:
+            if after:
+                offset += cursor_to_offset(after) + 1
+            args["after"] = offset_to_cursor(offset - 1)
+
+        start = get_offset_with_default(args.get("after"), -1) + 1
+        first = args.get("first")
+        if first is None:
+            first = max_limit
+        if first is not None and first < 0:
+            raise GraphQLError("Argument 'first' must be a non-negative integer.")
+        return start, first
+
+    @classmethod
+    def forward_page(cls, connection, iterable, rows, start, first):
+        """Build the connection from ``rows``, fetched with one extra row past ``first``."""
+        has_next_page = first is not None and len(rows) > first
+        if has_next_page:
+            rows = rows[:first]
+
+        edges = [
+            connection.Edge(node=row, cursor=offset_to_cursor(start + i))
+            for i, row in enumerate(rows)
+        ]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=False,
+                has_next_page=has_next_page,
+            ),
+        )
+        result.iterable = iterable
+        result.length = None
+        return result
+
+    @classmethod
+    def is_forward_queryset(cls, iterable, args):
+        return isinstance(iterable, QuerySet) and args.get("last") is None and args.get("before") is None
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        if isinstance(iterable, RelatedRows) and args.get("last") is None and args.get("before") is None:
+            start, first = cls.forward_window(args, max_limit)
+            rows = iterable[start:] if first is None else iterable[start:start + first + 1]
+            result = cls.forward_page(connection, iterable, rows, start, first)
+            if iterable.complete:
+                result.length = len(iterable)
+            return result
+        if not cls.is_forward_queryset(iterable, args):
+            return super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+
+        start, first = cls.forward_window(args, max_limit)
+        window = iterable[start:] if first is None else iterable[start:start + first + 1]
+        return cls.forward_page(connection, iterable, list(window), start, first)
+
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        resolve = partial(
+            super().connection_resolver,
+            resolver,
+            connection,
+            default_manager,
+            queryset_resolver,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args,
+        )
+        if not in_event_loop():
+            return cls.queue_page(resolve(), info)
+        if not cls.is_prefetched_page(root, info, args):
+            return cls.resolve_off_event_loop(resolve, info)
+        result = cls.queue_page(resolve(), info)
+        result.is_async = True
+        return result
+
+    @classmethod
+    def queue_page(cls, result, info):
+        get_loaders(info).queue(edge.node for edge in result.edges)
+        return result
+
+    @classmethod
+    def is_prefetched_page(cls, root, info, args):
+        """Whether a nested page is cut from rows the optimizer prefetched, without SQL."""
+        if root is None or is_filtered(args):
+            return False
+        return prefetched(root, to_snake_case(info.field_name)) is not None
+
+    @classmethod
+    async def resolve_off_event_loop(cls, resolve, info):
+        result = await sync_to_async(lambda: cls.queue_page(resolve(), info))()
+        result.is_async = True
+        return result
+
+
+ASYNC_CHUNK_SIZE = 2000
+
+
+class AsyncFilterConnectionField(CRMFilterConnectionField):
+    """
+    CRMFilterConnectionField for the async schema.
+
+    The resolver is a coroutine: forward pages are read with ``aiterator``
+    and ``totalCount`` with ``acount``, so sibling root fields of one
+    operation run concurrently instead of one after the other. Relations
+    below the page come from the optimizer's select_related and
+    prefetch_related, which run as part of the same async fetch; the rest
+    fall back to the loaders through sync_to_async.
+    """
+
+    @classmethod
+    async def aresolve_connection(cls, connection, args, iterable, max_limit=None):
+        if not isinstance(iterable, QuerySet):
+            return cls.resolve_connection(connection, args, iterable, max_limit=max_limit)
+        if not cls.is_forward_queryset(iterable, args):
+            # Backward pages need the total to slice from the end.
+            return await sync_to_async(cls.resolve_connection)(
+                connection, args, iterable, max_limit=max_limit
+            )
+
+        start, first = cls.forward_window(args, max_limit)
+        if first is None:
+            window, chunk_size = iterable[start:], ASYNC_CHUNK_SIZE
+        else:
+            window, chunk_size = iterable[start:start + first + 1], first + 1
+        rows = [row async for row in window.aiterator(chunk_size=chunk_size)]
+        return cls.forward_page(connection, iterable, rows, start, first)
+
+    @classmethod
+    async def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        enforce_first_or_last,
+        root,
+        info,
+        **args,
+    ):
+        first = args.get("first")
+        last = args.get("last")
+        if enforce_first_or_last and not (first or last):
+            raise GraphQLError(
+                f"You must provide a `first` or `last` value to properly paginate the `{info.field_name}` connection."
+            )
+        if max_limit:
+            for name, value in (("first", first), ("last", last)):
+                if value and value > max_limit:
+                    raise GraphQLError(
+                        f"Requesting {value} records on the `{info.field_name}` connection "
+                        f"exceeds the `{name}` limit of {max_limit} records."
+                    )
+        if args.get("offset") is not None and args.get("before") is not None:
+            raise GraphQLError(
+                f"You can't provide a `before` value at the same time as an `offset` value "
+                f"to properly paginate the `{info.field_name}` connection."
+            )
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        # Building the FilterSet may touch the database (search checks for
+        # its FTS table once per process), so it runs off the event loop.
+        queryset = await sync_to_async(queryset_resolver)(connection, iterable, info, args)
+        result = await cls.aresolve_connection(connection, args, queryset, max_limit=max_limit)
+        result.is_async = True
+        return cls.queue_page(result, info)
+
+
+KEYSET_DEFAULT_MAX_LIMIT = 100
+KEYSET_CURSOR_PREFIX = "keyset:"
+
+
+def encode_keyset_cursor(values):
+    def serialize(value):
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        return value
+
+    payload = KEYSET_CURSOR_PREFIX + json.dumps([serialize(v) for v in values])
+    return base64.b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_keyset_cursor(cursor, size):
+    try:
+        payload = base64.b64decode(cursor).decode("utf-8")
+        if not payload.startswith(KEYSET_CURSOR_PREFIX):
+            raise ValueError
+        values = json.loads(payload[len(KEYSET_CURSOR_PREFIX):])
+    except ValueError:
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+    if not isinstance(values, list) or len(values) != size:
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+    return values
+
+
+def keyset_filter(sort_key, values, forward):
+    """
+    Rows strictly after (``forward``) or before ``values`` in ``sort_key``
+    order, spelled as ``a > x OR (a = x AND b > y) ...`` so the database can
+    answer it with a range scan on the matching index.
+    """
+    condition = Q()
+    for i, field in enumerate(sort_key):
+        name = field.lstrip("-")
+        op = "lt" if field.startswith("-") == forward else "gt"
+        term = Q(**{f"{name}__{op}": values[i]})
+        for previous, value in zip(sort_key[:i], values[:i]):
+            term &= Q(**{previous.lstrip("-"): value})
+        condition |= term
+    return condition
+
+
+class KeysetConnectionField(CRMFilterConnectionField):
+    """
+    Opt-in seek pagination over a fixed sort key such as
+    ``("order_date", "id")``; prefix a name with ``-`` for descending order.
+
+    Cursors encode the sort-key values of the edge instead of an offset, so
+    deep pages cost the same as the first one and rows inserted while a client
+    pages through do not shift later cursors. ``first``/``last`` above the
+    connection's max limit are rejected rather than clamped.
+    """
+
+    def __init__(self, type_, *args, sort_key=("id",), **kwargs):
+        self.sort_key = tuple(sort_key)
+        super().__init__(type_, *args, **kwargs)
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.keyset_resolver,
+            self.resolver or parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.max_limit or KEYSET_DEFAULT_MAX_LIMIT,
+            self.sort_key,
+        )
+
+    @classmethod
+    def keyset_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        queryset_resolver,
+        max_limit,
+        sort_key,
+        root,
+        info,
+        **args,
+    ):
+        first = args.get("first")
+        last = args.get("last")
+        after = args.get("after")
+        before = args.get("before")
+
+        for name, value in (("first", first), ("last", last)):
+            if value is not None and not 0 <= value <= max_limit:
+                raise GraphQLError(
+                    f"`{name}` on the `{info.field_name}` connection must be between 0 and {max_limit}."
+                )
+        if first is not None and last is not None:
+            raise GraphQLError("Pass either `first` or `last`, not both.")
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = queryset_resolver(connection, iterable, info, args)
+
+        # Cursor values are read off each row, so keep them out of only().
+        names = [field.lstrip("-") for field in sort_key]
+        only, defer = queryset.query.deferred_loading
+        if only and not defer:
+            queryset = queryset.only(*only, *names)
+
+        unbounded = queryset
+        forward = last is None
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(sort_key, decode_keyset_cursor(after, len(sort_key)), True))
+        if before is not None:
+            queryset = queryset.filter(keyset_filter(sort_key, decode_keyset_cursor(before, len(sort_key)), False))
+
+        if forward:
+            limit = max_limit if first is None else first
+            queryset = queryset.order_by(*sort_key)
+        else:
+            limit = last
+            queryset = queryset.order_by(*[f[1:] if f.startswith("-") else f"-{f}" for f in sort_key])
+
+        rows = list(queryset[:limit + 1])
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not forward:
+            rows.reverse()
+
+        edges = [
+            connection.Edge(node=row, cursor=encode_keyset_cursor([getattr(row, n) for n in names]))
+            for row in rows
+        ]
+        get_loaders(info).queue(rows)
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_more if not forward else after is not None,
+                has_next_page=has_more if forward else before is not None,
+            ),
+        )
+        # totalCount counts the whole filtered set, not the keyset window.
+        result.iterable = unbounded
+        result.length = None
+        return result
@@ -1,11 +1,14 @@
 import django_filters
 from crm.models import Order, Product, Customer
+from crm.search import search
 
 class CustomerFilter(django_filters.FilterSet):
-    name_icontains = django_filters.CharFilter(field_name="name", lookup_expr='icontains')
-    email_icontains = django_filters.CharFilter(field_name="email", lookup_expr='icontains')
+    name_icontains = django_filters.CharFilter(field_name="name", method=search)
+    email_icontains = django_filters.CharFilter(field_name="email", method=search)
     created_at_gte = django_filters.DateFilter(field_name="created_at", lookup_expr='gte')
     created_at_lte = django_filters.DateFilter(field_name="created_at", lookup_expr='lte')
+    last_order_at_gte = django_filters.DateFilter(field_name="last_order_at", lookup_expr='gte')
+    last_order_at_lte = django_filters.DateFilter(field_name="last_order_at", lookup_expr='lte')
 
     phone_pattern = django_filters.CharFilter(method="filter_phone_pattern")
 
@@ -14,11 +17,12 @@ class CustomerFilter(django_filters.FilterSet):
 
     class Meta:
         model = Customer
-        fields = ["name_icontains", "email_icontains", "created_at_gte", "created_at_lte", "phone_pattern"]
+        fields = ["name_icontains", "email_icontains", "created_at_gte", "created_at_lte",
+                  "last_order_at_gte", "last_order_at_lte", "phone_pattern"]
 
 
 class ProductFilter(django_filters.FilterSet):
-    name_icontains = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
+    name_icontains = django_filters.CharFilter(field_name="name", method=search)
     price_gte = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     price_lte = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     stock_gte = django_filters.NumberFilter(field_name="stock", lookup_expr="gte")
@@ -35,9 +39,9 @@ class OrderFilter(django_filters.FilterSet):
     order_date_gte = django_filters.DateFilter(field_name="order_date", lookup_expr="gte")
     order_date_lte = django_filters.DateFilter(field_name="order_date", lookup_expr="lte")
 
-    # Related field lookups
-    customer_name = django_filters.CharFilter(field_name="customer__name", lookup_expr="icontains")
-    product_name = django_filters.CharFilter(field_name="products__name", lookup_expr="icontains")
+    # Related field lookups (substring matches use the crm.search index)
+    customer_name = django_filters.CharFilter(field_name="customer__name", method=search)
+    product_name = django_filters.CharFilter(field_name="products__name", method=search)
 
     # Challenge: filter orders that include a specific product ID
     product_id = django_filters.NumberFilter(field_name="products__id", lookup_expr="exact")
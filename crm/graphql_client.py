@@ -0,0 +1,129 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from gql import Client, GraphQLRequest
+from gql.transport.requests import RequestsHTTPTransport
+from graphql import print_schema
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENDPOINT": "http://localhost:8000/graphql",
+    # Generate with:
+    #   python manage.py graphql_schema --schema alx_backend_graphql_crm.schema.schema --out schema.graphql
+    "SCHEMA_PATH": os.path.join(settings.BASE_DIR, "schema.graphql"),
+    "TIMEOUT": 30,
+    "RETRIES": 3,
+}
+
+_lock = threading.Lock()
+_session = None
+
+
+def client_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_CLIENT", {})}
+
+
+def load_schema(path):
+    """
+    SDL the clients validate against. Read from ``path`` when it exists,
+    otherwise printed from the in-process schema; either way no
+    introspection query is sent.
+    """
+    if os.path.exists(path):
+        with open(path) as schema_file:
+            return schema_file.read()
+    from alx_backend_graphql_crm.schema import schema
+
+    return print_schema(schema.graphql_schema)
+
+
+def build_client(transport, config=None):
+    config = config or client_settings()
+    return Client(
+        schema=load_schema(config["SCHEMA_PATH"]),
+        transport=transport,
+        execute_timeout=config["TIMEOUT"],
+    )
+
+
+def get_session():
+    """
+    Process-wide sync session. The underlying requests.Session is kept open,
+    so jobs reuse pooled keep-alive connections instead of reconnecting.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            config = client_settings()
+            transport = RequestsHTTPTransport(
+                url=config["ENDPOINT"],
+                timeout=config["TIMEOUT"],
+                retries=config["RETRIES"],
+            )
+            _session = build_client(transport, config).connect_sync()
+        return _session
+
+
+def close_session():
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.client.close_sync()
+            _session = None
+
+
+def operation_label(request):
+    if request.operation_name:
+        return request.operation_name
+    for definition in request.document.definitions:
+        name = getattr(definition, "name", None)
+        if name is not None:
+            return name.value
+    return "anonymous"
+
+
+def log_timing(request, started):
+    logger.info(
+        "GraphQL operation %s took %.1f ms",
+        operation_label(request),
+        (time.perf_counter() - started) * 1000,
+    )
+
+
+def execute(document, variable_values=None, operation_name=None):
+    """Run ``document`` on the shared session and log how long it took."""
+    request = GraphQLRequest(document, variable_values=variable_values, operation_name=operation_name)
+    started = time.perf_counter()
+    try:
+        return get_session().execute(request)
+    finally:
+        log_timing(request, started)
+
+
+def async_client(config=None):
+    """
+    Client on the aiohttp transport (``pip install "gql[aiohttp]"``) for
+    running several operations concurrently::
+
+        async with async_client() as session:
+            a, b = await asyncio.gather(
+                execute_async(session, query_a), execute_async(session, query_b)
+            )
+    """
+    from gql.transport.aiohttp import AIOHTTPTransport
+
+    config = config or client_settings()
+    return build_client(AIOHTTPTransport(url=config["ENDPOINT"], timeout=config["TIMEOUT"]), config)
+
+
+async def execute_async(session, document, variable_values=None, operation_name=None):
+    request = GraphQLRequest(document, variable_values=variable_values, operation_name=operation_name)
+    started = time.perf_counter()
+    try:
+        return await session.execute(request)
+    finally:
+        log_timing(request, started)
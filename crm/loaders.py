@@ -0,0 +1,297 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from graphene_django.settings import graphene_settings
+from graphql_relay import get_offset_with_default
+
+from crm.models import Customer, Order
+
+# Arguments of a nested connection that only pick the page; any other
+# argument is a filter.
+PAGINATION_ARGS = frozenset({"first", "last", "before", "after", "offset"})
+
+
+def is_filtered(args):
+    """Whether the arguments of a nested connection filter the relation."""
+    return any(value is not None for key, value in args.items() if key not in PAGINATION_ARGS)
+
+
+def page_limit(args, max_limit):
+    """
+    Rows from the start of a relation that a forward page needs: the rows
+    before it, the page itself and one more to tell whether there is a next
+    page. None when the page needs the whole relation (``last``/``before``,
+    or no ``first`` and no max limit).
+    """
+    if args.get("last") is not None or args.get("before") is not None:
+        return None
+    first = args.get("first")
+    if first is None:
+        first = max_limit
+    if first is None:
+        return None
+    start = get_offset_with_default(args.get("after"), -1) + 1 + (args.get("offset") or 0)
+    return start + first + 1
+
+
+class DataLoader:
+    """
+    Per-request batching cache.
+
+    Keys queued with ``queue`` are fetched together the first time any key
+    of this loader is requested with ``load``, so resolving the same relation
+    on every node of a page costs a single query.
+    """
+
+    default = None
+
+    def __init__(self, loaders):
+        self.loaders = loaders
+        self._cache = {}
+        self._queue = {}
+
+    def batch_load(self, keys):
+        """Return a dict mapping each key that has a value to that value."""
+        raise NotImplementedError
+
+    def queue(self, key):
+        if key is not None and key not in self._cache:
+            self._queue[key] = None
+
+    def load(self, key):
+        if key not in self._cache:
+            self._queue[key] = None
+            keys = list(self._queue)
+            self._queue.clear()
+            results = self.batch_load(keys)
+            for k in keys:
+                self._cache[k] = results.get(k, self.default)
+        value = self._cache[key]
+        return list(value) if isinstance(value, list) else value
+
+
+class CustomerLoader(DataLoader):
+    """Order.customer, keyed by customer id."""
+
+    def batch_load(self, keys):
+        customers = Customer.objects.in_bulk(keys)
+        self.loaders.queue(customers.values())
+        return customers
+
+
+class RelationLoader(DataLoader):
+    """
+    A to-many relation keyed by parent id, in primary-key order of the
+    related rows. ``load(key, limit)`` returns at most ``limit`` rows per
+    parent (all of them for None), cut in SQL with ROW_NUMBER() over the
+    parent key, so the rows read follow the page size rather than the size
+    of the relation. Queued keys are batched for every limit asked for.
+    """
+
+    default = []
+
+    def queue(self, key):
+        if key is not None:
+            self._queue[key] = None
+
+    def load(self, key, limit=None):
+        if (key, limit) not in self._cache:
+            self._queue[key] = None
+            # Snapshot the queue: on the async endpoint, resolvers on the
+            # event loop may queue keys while a batch runs in a thread.
+            keys = [k for k in list(self._queue) if (k, limit) not in self._cache]
+            results = self.batch_load(keys, limit)
+            for k in keys:
+                self._cache[(k, limit)] = results.get(k, self.default)
+        return list(self._cache[(key, limit)])
+
+    @staticmethod
+    def first_rows(queryset, parent, order, limit):
+        if limit is not None:
+            row_number = Window(RowNumber(), partition_by=F(parent), order_by=F(order).asc())
+            queryset = queryset.annotate(row_number=row_number).filter(row_number__lte=limit)
+        return queryset.order_by(parent, order)
+
+
+class OrderProductsLoader(RelationLoader):
+    """Order.products, keyed by order id."""
+
+    def batch_load(self, keys, limit):
+        results = defaultdict(list)
+        rows = self.first_rows(
+            Order.products.through.objects.filter(order_id__in=keys).select_related("product"),
+            "order_id", "product_id", limit,
+        )
+        for row in rows:
+            results[row.order_id].append(row.product)
+        for products in results.values():
+            self.loaders.queue(products)
+        return results
+
+
+class CustomerOrdersLoader(RelationLoader):
+    """Customer.orders, keyed by customer id."""
+
+    def batch_load(self, keys, limit):
+        results = defaultdict(list)
+        for order in self.first_rows(Order.objects.filter(customer_id__in=keys), "customer_id", "pk", limit):
+            results[order.customer_id].append(order)
+        for orders in results.values():
+            self.loaders.queue(orders)
+        return results
+
+
+class ProductOrdersLoader(RelationLoader):
+    """Product.orders, keyed by product id."""
+
+    def batch_load(self, keys, limit):
+        results = defaultdict(list)
+        rows = self.first_rows(
+            Order.products.through.objects.filter(product_id__in=keys).select_related("order"),
+            "product_id", "order_id", limit,
+        )
+        for row in rows:
+            results[row.product_id].append(row.order)
+        for orders in results.values():
+            self.loaders.queue(orders)
+        return results
+
+
+class RelationCountLoader(DataLoader):
+    """Size of a to-many relation per parent key: one grouped COUNT for a whole page."""
+
+    default = 0
+
+    def __init__(self, loaders, queryset, parent):
+        super().__init__(loaders)
+        self.queryset = queryset
+        self.parent = parent
+
+    def batch_load(self, keys):
+        rows = (
+            self.queryset.filter(**{f"{self.parent}__in": keys})
+            .order_by()
+            .values(self.parent)
+            .annotate(total=Count("pk"))
+            .values_list(self.parent, "total")
+        )
+        return dict(rows)
+
+
+class Loaders:
+    """The set of loaders shared by every resolver of one GraphQL request."""
+
+    def __init__(self):
+        self.customer = CustomerLoader(self)
+        self.order_products = OrderProductsLoader(self)
+        self.customer_orders = CustomerOrdersLoader(self)
+        self.product_orders = ProductOrdersLoader(self)
+        through = Order.products.through.objects.all()
+        self.order_product_counts = RelationCountLoader(self, through, "order_id")
+        self.customer_order_counts = RelationCountLoader(self, Order.objects.all(), "customer_id")
+        self.product_order_counts = RelationCountLoader(self, through, "product_id")
+
+    def queue(self, instances):
+        """Queue the relation keys of freshly fetched instances."""
+        for obj in instances:
+            if isinstance(obj, Order):
+                # Read through __dict__ so a column deferred by only() is
+                # skipped rather than fetched row by row.
+                self.customer.queue(vars(obj).get("customer_id"))
+                self.order_products.queue(obj.pk)
+                self.order_product_counts.queue(obj.pk)
+            elif isinstance(obj, Customer):
+                self.customer_orders.queue(obj.pk)
+                self.customer_order_counts.queue(obj.pk)
+            else:
+                self.product_orders.queue(obj.pk)
+                self.product_order_counts.queue(obj.pk)
+            # Rows the optimizer prefetched below this one are resolved one
+            # parent at a time, so queue them now for their own relations.
+            for name in ("orders", "products"):
+                rows = vars(obj).get(prefetch_attr(name))
+                if rows:
+                    self.queue(rows)
+
+
+def prefetch_attr(name):
+    """
+    Attribute the optimizer prefetches relation ``name`` into. A sliced
+    prefetch cannot fill the related manager's cache, so it is stored as a
+    plain list.
+    """
+    return f"_{name}_rows"
+
+
+def prefetched(instance, name):
+    """
+    Return the related object(s) for ``name`` if the queryset that produced
+    ``instance`` already fetched them via select_related/prefetch_related,
+    else None.
+    """
+    field = instance._meta.get_field(name)
+    if field.many_to_one:
+        return getattr(instance, name) if field.is_cached(instance) else None
+    rows = vars(instance).get(prefetch_attr(name))
+    if rows is not None:
+        return list(rows)
+    cache = getattr(instance, "_prefetched_objects_cache", {})
+    if name in cache:
+        return list(cache[name])
+    return None
+
+
+def get_loaders(info):
+    """Return the loaders bound to the current request, creating them on first use."""
+    context = info.context
+    loaders = getattr(context, "crm_loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        if context is not None:
+            context.crm_loaders = loaders
+    return loaders
+
+
+# (model label, relation) -> (rows loader, count loader) on Loaders.
+RELATION_LOADERS = {
+    ("crm.customer", "orders"): ("customer_orders", "customer_order_counts"),
+    ("crm.product", "orders"): ("product_orders", "product_order_counts"),
+    ("crm.order", "products"): ("order_products", "order_product_counts"),
+}
+
+
+class RelatedRows(list):
+    """
+    The leading rows of one parent's to-many relation, as many as a nested
+    connection page needs. ``complete`` says whether they are the whole
+    relation; if not, ``total()`` counts it with one grouped COUNT shared
+    by every parent on the page.
+    """
+
+    def __init__(self, rows, limit, count_loader, key):
+        super().__init__(rows if limit is None else rows[:limit])
+        self.complete = limit is None or len(rows) < limit
+        self.count_loader = count_loader
+        self.key = key
+
+    def total(self):
+        return len(self) if self.complete else self.count_loader.load(self.key)
+
+
+def related_rows(instance, name, info, args):
+    """
+    Resolve the nested connection ``name`` of ``instance``. A filtered page
+    gets the relation's queryset, so the FilterSet, the LIMIT and the count
+    run in SQL; an unfiltered one gets RelatedRows, from the optimizer's
+    prefetch when it ran, else from the batched loaders.
+    """
+    if is_filtered(args):
+        return getattr(instance, name).all()
+    loaders = get_loaders(info)
+    rows_loader, count_loader = (getattr(loaders, attr) for attr in RELATION_LOADERS[(instance._meta.label_lower, name)])
+    limit = page_limit(args, graphene_settings.RELAY_CONNECTION_MAX_LIMIT)
+    rows = prefetched(instance, name)
+    if rows is None:
+        rows = rows_loader.load(instance.pk, limit)
+    return RelatedRows(rows, limit, count_loader, instance.pk)
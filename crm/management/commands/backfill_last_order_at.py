@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery
+
+from crm.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = "Fill Customer.last_order_at from existing orders, in primary-key pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        latest_order = Subquery(
+            Order.objects.filter(customer=OuterRef("pk"))
+            .order_by()
+            .values("customer")
+            .annotate(latest=Max("order_date"))
+            .values("latest")
+        )
+
+        # Walk the customers in primary-key pages: one index read for the
+        # page's last key, then one correlated UPDATE over the page, so each
+        # write stays short and gaps in the key space cost nothing.
+        keys = Customer.objects.order_by("pk").values_list("pk", flat=True)
+        updated = 0
+        last_pk = 0
+        while True:
+            # The page's last key; empty on the final, partial page.
+            bound = list(keys.filter(pk__gt=last_pk)[batch_size - 1 : batch_size])
+            page = Customer.objects.filter(pk__gt=last_pk)
+            if bound:
+                page = page.filter(pk__lte=bound[0])
+            with transaction.atomic():
+                updated += page.update(last_order_at=latest_order)
+            if not bound:
+                break
+            last_pk = bound[0]
+
+        if not updated:
+            self.stdout.write("No customers to backfill.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"Backfilled last_order_at for {updated} customers."))
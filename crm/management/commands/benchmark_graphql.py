@@ -0,0 +1,93 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+WORKLOAD = """
+query Workload {
+    allCustomers(first: 20) {
+        edges { node { id name email orders { edges { node { id totalAmount } } } } }
+    }
+    allProducts(first: 20) {
+        edges { node { id name price stock } }
+    }
+    crmStats { customerCount orderCount totalRevenue }
+}
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the sync /graphql and async /graphql/async "
+        "endpoints on the same query, in process through Django's test clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--query-file", help="Run this query instead of the built-in workload.")
+        parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+
+    def handle(self, *args, **options):
+        query = WORKLOAD
+        if options["query_file"]:
+            with open(options["query_file"]) as query_file:
+                query = query_file.read()
+        # Distinct variables per request keep the response cache out of the measurement.
+        bodies = [
+            json.dumps({"query": query, "variables": {"n": i}})
+            for i in range(options["requests"])
+        ]
+
+        # The test clients always send Host: testserver.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            if options["mode"] in ("sync", "both"):
+                self.report("sync", *self.run_sync(bodies, options["concurrency"]))
+            if options["mode"] in ("async", "both"):
+                self.report("async", *asyncio.run(self.run_async(bodies, options["concurrency"])))
+
+    def run_sync(self, bodies, concurrency):
+        def call(body):
+            client = Client()
+            started = time.perf_counter()
+            response = client.post("/graphql", body, content_type="application/json")
+            elapsed = time.perf_counter() - started
+            close_old_connections()
+            return elapsed, response.status_code == 200 and "errors" not in response.json()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(call, bodies))
+        return time.perf_counter() - started, results
+
+    async def run_async(self, bodies, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(body):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/graphql/async", body, content_type="application/json")
+                elapsed = time.perf_counter() - started
+            return elapsed, response.status_code == 200 and "errors" not in response.json()
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call(body) for body in bodies))
+        return time.perf_counter() - started, results
+
+    def report(self, label, wall, results):
+        latencies = sorted(elapsed for elapsed, _ in results)
+        failures = sum(1 for _, ok in results if not ok)
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        self.stdout.write(
+            f"{label:>5}: {len(results) / wall:8.1f} req/s  "
+            f"p50 {quantiles[49] * 1000:7.1f} ms  p95 {quantiles[94] * 1000:7.1f} ms  "
+            f"failures {failures}"
+        )
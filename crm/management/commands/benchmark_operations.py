@@ -0,0 +1,193 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+
+from alx_backend_graphql_crm.schema import schema
+from crm.benchmarks import OPERATIONS, dataset_fixtures, uncovered_fields
+from crm.models import Customer, Order, Product
+from crm.response_cache import response_cache
+from crm.seeding import SCALES
+
+# Fixed so that datasets, and therefore results, are comparable across runs.
+DATASET_SEED = 0
+DATASET_UNTIL = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+TRANSACTION_STATEMENTS = ("BEGIN", "SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run every operation in crm.benchmarks against generated datasets in a "
+        "throwaway test database, recording wall time, SQL query count and peak "
+        "memory. Fails when an operation runs more queries than its budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="tiny,small",
+            help=f"Comma-separated seed_data scales: {', '.join(SCALES)}.",
+        )
+        parser.add_argument("--iterations", type=int, default=5)
+        parser.add_argument("--operation", action="append", help="Only run this operation; repeatable.")
+        parser.add_argument("--output", default="benchmark_results.json")
+        parser.add_argument("--baseline", help="Earlier --output file to compare against.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs.")
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options["sizes"].split(",") if size.strip()]
+        unknown = set(sizes) - SCALES.keys()
+        if unknown:
+            raise CommandError(f"Unknown sizes: {', '.join(sorted(unknown))}.")
+        operations = OPERATIONS
+        if options["operation"]:
+            operations = [op for op in OPERATIONS if op.name in options["operation"]]
+        else:
+            uncovered = uncovered_fields(schema.graphql_schema)
+            if uncovered:
+                raise CommandError(
+                    f"No benchmark for {', '.join(uncovered)}; add one to crm.benchmarks.OPERATIONS."
+                )
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options["keepdb"])
+        try:
+            # The test client always sends Host: testserver.
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+                results = []
+                for size in sizes:
+                    call_command("seed_data", scale=size, seed=DATASET_SEED, until=DATASET_UNTIL, flush=True, verbosity=0)
+                    fixtures = dataset_fixtures()
+                    for operation in operations:
+                        results.append(self.run_operation(size, operation, fixtures, options["iterations"]))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options["keepdb"])
+
+        report = {
+            "created_at": datetime.now(dt_timezone.utc).isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "machine": platform.machine(),
+            },
+            "iterations": options["iterations"],
+            "results": results,
+        }
+        with open(options["output"], "w") as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(f"Results written to {options['output']}.")
+
+        if options["baseline"]:
+            self.compare(results, options["baseline"])
+
+        failures = [result for result in results if not result["ok"]]
+        if failures:
+            raise CommandError(
+                "Over budget or failing: "
+                + ", ".join(f"{result['operation']} ({result['size']})" for result in failures)
+            )
+
+    def request(self, client, operation, variables):
+        """Post ``operation`` once; mutations are rolled back so every iteration sees the same data."""
+        body = json.dumps({"query": operation.document, "variables": variables})
+        # Keep the response cache out of the measurement.
+        response_cache.invalidate(Customer, Product, Order)
+        with transaction.atomic():
+            response = client.post("/graphql", body, content_type="application/json")
+            transaction.set_rollback(True)
+        payload = response.json()
+        return response.status_code == 200 and not payload.get("errors"), payload
+
+    def run_operation(self, size, operation, fixtures, iterations):
+        client = Client()
+        variables = operation.variables(fixtures)
+        budget = operation.budget(fixtures) if callable(operation.budget) else operation.budget
+
+        # Warm-up: parses the document and fills the per-process caches.
+        ok, payload = self.request(client, operation, variables)
+
+        # An execute wrapper rather than CaptureQueriesContext: the test
+        # client's request_started signal resets connection.queries.
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            # Transaction control from the rollback wrapper is not the operation's.
+            if not sql.startswith(TRANSACTION_STATEMENTS):
+                statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.request(client, operation, variables)
+        queries = len(statements)
+
+        timings = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            self.request(client, operation, variables)
+            timings.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            self.request(client, operation, variables)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            "size": size,
+            "operation": operation.name,
+            "queries": queries,
+            "budget": budget,
+            "wall_ms": {
+                "min": min(timings) * 1000,
+                "median": statistics.median(timings) * 1000,
+                "max": max(timings) * 1000,
+            },
+            "peak_memory_bytes": peak_memory,
+            "ok": ok and queries <= budget,
+        }
+        if not ok:
+            result["errors"] = payload.get("errors")
+
+        status = "ok" if result["ok"] else ("ERROR" if not ok else "OVER BUDGET")
+        self.stdout.write(
+            f"{size:>6} {operation.name:<34} {queries:>3}/{budget:<3} queries  "
+            f"{result['wall_ms']['median']:8.2f} ms  {peak_memory / 1024:8.0f} KiB  {status}"
+        )
+        if not ok:
+            self.stdout.write(f"       {payload.get('errors')}")
+        elif queries > budget:
+            # The most repeated statement is usually the per-row lookup.
+            sql, count = Counter(statements).most_common(1)[0]
+            self.stdout.write(f"       {count}x {sql[:200]}")
+        return result
+
+    def compare(self, results, path):
+        with open(path) as baseline_file:
+            baseline = {
+                (result["size"], result["operation"]): result
+                for result in json.load(baseline_file)["results"]
+            }
+        self.stdout.write(f"Compared with {path}:")
+        for result in results:
+            before = baseline.get((result["size"], result["operation"]))
+            if before is None:
+                continue
+            median, previous = result["wall_ms"]["median"], before["wall_ms"]["median"]
+            change = (median - previous) / previous * 100 if previous else 0
+            self.stdout.write(
+                f"{result['size']:>6} {result['operation']:<34} "
+                f"queries {before['queries']:>3} -> {result['queries']:<3} "
+                f"median {previous:8.2f} -> {median:8.2f} ms ({change:+.0f}%)"
+            )
@@ -0,0 +1,79 @@
+import csv
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from crm.order_import import IMPORT_CHUNK_SIZE, import_orders
+
+
+def ndjson_rows(lines):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Reported as a row error, like any other malformed row.
+            yield None
+
+
+class Command(BaseCommand):
+    help = (
+        "Import orders from a CSV or NDJSON file in bulk, streaming it chunk "
+        "by chunk. Takes the /export/orders formats: customer_id or "
+        "customer_email, product_ids and an optional order_date per row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to import, or "-" for stdin.')
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument(
+            "--reserve-stock",
+            action="store_true",
+            help="Take one unit of stock per product as CreateOrder does. Off for historical imports.",
+        )
+        parser.add_argument("--show-errors", type=int, default=20, help="Row errors to print.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        export_format = options["format"]
+        if export_format is None:
+            if path.endswith(".csv"):
+                export_format = "csv"
+            elif path.endswith((".ndjson", ".jsonl")):
+                export_format = "ndjson"
+            else:
+                raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        source = sys.stdin if path == "-" else open(path, newline="")
+        try:
+            rows = csv.DictReader(source) if export_format == "csv" else ndjson_rows(source)
+            self.run(rows, options)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+    def run(self, rows, options):
+        created = failed = 0
+        shown = options["show_errors"]
+        started = time.perf_counter()
+        for result in import_orders(rows, options["chunk_size"], options["reserve_stock"]):
+            created += len(result.orders)
+            failed += len(result.errors)
+            for index, message in result.errors:
+                if shown > 0:
+                    self.stderr.write(f"Row {index + 1}: {message}")
+                    shown -= 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{created} orders imported, {failed} rejected ({created / elapsed:,.0f} orders/s)")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {created} orders in {elapsed:.1f}s ({created / elapsed if elapsed else 0:,.0f} orders/s); "
+                f"{failed} rows rejected."
+            )
+        )
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.models import Customer, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete customers with no order in the last --days days, in primary-key "
+        "batches with one short transaction each. Progress is checkpointed so an "
+        "interrupted run resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0,
+                            help="Seconds to pause between batches so other writers get the lock.")
+        parser.add_argument("--checkpoint", default="/tmp/purge_inactive_customers.checkpoint")
+        parser.add_argument("--log-file", default="/tmp/customer_cleanup_log.txt")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report what would be deleted without deleting or checkpointing.")
+        parser.add_argument("--reset", action="store_true", help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        self.log_file = options["log_file"]
+        batch_size = options["batch_size"]
+        checkpoint_path = options["checkpoint"]
+        dry_run = options["dry_run"]
+
+        checkpoint = None if options["reset"] else self.read_checkpoint(checkpoint_path)
+        if checkpoint:
+            # Resume against the original cutoff so the candidate set does not move.
+            cutoff = parse_datetime(checkpoint["cutoff"])
+            last_pk = checkpoint["last_pk"]
+            self.log(f"Resuming from customer id {last_pk} (cutoff {cutoff.isoformat()}).")
+        else:
+            cutoff = timezone.now() - timedelta(days=options["days"])
+            last_pk = 0
+
+        inactive = Q(last_order_at__lt=cutoff) | Q(last_order_at__isnull=True)
+        candidates = Customer.objects.filter(inactive).order_by("pk")
+
+        total_customers = total_orders = batch_number = 0
+        while True:
+            started = time.monotonic()
+            with transaction.atomic():
+                ids = list(candidates.filter(pk__gt=last_pk).values_list("pk", flat=True)[:batch_size])
+                if not ids:
+                    break
+                # Re-check against orders inside the transaction so a customer
+                # who ordered since last_order_at was written is kept.
+                batch = Customer.objects.filter(pk__in=ids).filter(inactive).exclude(
+                    orders__order_date__gte=cutoff
+                )
+                if dry_run:
+                    customers = batch.count()
+                    orders = Order.objects.filter(customer__in=batch).count()
+                else:
+                    _, deleted = batch.delete()
+                    customers = deleted.get(Customer._meta.label, 0)
+                    orders = deleted.get(Order._meta.label, 0)
+            last_pk = ids[-1]
+            batch_number += 1
+            total_customers += customers
+            total_orders += orders
+
+            if not dry_run:
+                self.write_checkpoint(checkpoint_path, cutoff, last_pk)
+            self.log(
+                f"Batch {batch_number}: {'would delete' if dry_run else 'deleted'} "
+                f"{customers} customers and {orders} orders up to id {last_pk} "
+                f"in {time.monotonic() - started:.3f}s."
+            )
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        if not dry_run and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        verb = "Would delete" if dry_run else "Deleted"
+        self.log(f"{verb} {total_customers} inactive customers ({total_orders} orders).")
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return None
+
+    def write_checkpoint(self, path, cutoff, last_pk):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump({"cutoff": cutoff.isoformat(), "last_pk": last_pk}, checkpoint_file)
+        os.replace(tmp_path, path)
+
+    def log(self, message):
+        line = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+        self.stdout.write(line)
+        with open(self.log_file, "a") as log_file:
+            log_file.write(line + "\n")
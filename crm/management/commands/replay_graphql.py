@@ -0,0 +1,149 @@
+import json
+import statistics
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from graphql import GraphQLError, OperationType, get_operation_ast, parse
+
+
+def operation_info(query, operation_name, cache):
+    """(label, is_mutation) for a captured operation, parsing each distinct text once."""
+    key = (query, operation_name)
+    if key not in cache:
+        label, is_mutation = operation_name, False
+        try:
+            operation = get_operation_ast(parse(query), operation_name) if query else None
+        except GraphQLError:
+            operation = None
+        if operation is not None:
+            is_mutation = operation.operation == OperationType.MUTATION
+            if not label and operation.name is not None:
+                label = operation.name.value
+        cache[key] = (label or "anonymous", is_mutation)
+    return cache[key]
+
+
+def percentile(quantiles, p):
+    return quantiles[p - 1] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a GraphQL capture written by crm.capture against a running "
+        "server and report latency, throughput and error rate per operation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("captures", nargs="+", help="Capture files, replayed in the order given.")
+        parser.add_argument("--url", default="http://localhost:8000", help="Server to replay against.")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--rate", type=float, default=0, help="Requests per second; 0 sends as fast as possible.")
+        parser.add_argument("--limit", type=int, help="Stop after this many requests.")
+        parser.add_argument("--include-mutations", action="store_true", help="Mutations are skipped by default.")
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Also write the report as JSON to this file.")
+
+    def handle(self, *args, **options):
+        entries = self.load(options["captures"], options["include_mutations"], options["limit"])
+        if not entries:
+            raise CommandError("Nothing to replay.")
+
+        local = threading.local()
+        base_url = options["url"].rstrip("/")
+        timeout = options["timeout"]
+
+        def send(entry):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            body = {key: entry.get(key) for key in ("query", "variables", "operationName", "extensions")}
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}{entry.get('path') or '/graphql'}", json=body, timeout=timeout)
+                ok = response.status_code == 200 and not response.json().get("errors")
+            except (requests.RequestException, ValueError):
+                ok = False
+            return time.perf_counter() - started, ok
+
+        results = defaultdict(list)
+        in_flight = {}
+        concurrency, rate = options["concurrency"], options["rate"]
+
+        def collect(done):
+            for future in done:
+                results[in_flight.pop(future)].append(future.result())
+
+        self.stdout.write(f"Replaying {len(entries)} requests against {base_url}...")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for index, (label, entry) in enumerate(entries):
+                if rate:
+                    delay = started + index / rate - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                if len(in_flight) >= concurrency:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                in_flight[executor.submit(send, entry)] = label
+            collect(wait(in_flight).done)
+        wall = time.perf_counter() - started
+
+        report = self.report(results, wall)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(report, output, indent=2)
+
+    def load(self, paths, include_mutations, limit):
+        entries, skipped, cache = [], 0, {}
+        for path in paths:
+            with open(path) as capture:
+                for line in capture:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if not entry.get("query"):
+                        # A persisted-query hash the server never resolved.
+                        skipped += 1
+                        continue
+                    label, is_mutation = operation_info(entry["query"], entry.get("operationName"), cache)
+                    if is_mutation and not include_mutations:
+                        skipped += 1
+                        continue
+                    entries.append((label, entry))
+                    if limit and len(entries) >= limit:
+                        return entries
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} captured requests (mutations or hash-only persisted queries).")
+        return entries
+
+    def report(self, results, wall):
+        rows = []
+        everything = [result for label_results in results.values() for result in label_results]
+        for label, label_results in [*sorted(results.items(), key=lambda item: -len(item[1])), ("TOTAL", everything)]:
+            latencies = sorted(elapsed for elapsed, _ in label_results)
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            errors = sum(1 for _, ok in label_results if not ok)
+            rows.append({
+                "operation": label,
+                "requests": len(label_results),
+                "throughput": len(label_results) / wall,
+                "error_rate": errors / len(label_results),
+                "p50_ms": percentile(quantiles, 50),
+                "p95_ms": percentile(quantiles, 95),
+                "p99_ms": percentile(quantiles, 99),
+            })
+
+        self.stdout.write(
+            f"{'operation':<34} {'requests':>8} {'req/s':>8} {'errors':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['operation'][:34]:<34} {row['requests']:>8} {row['throughput']:>8.1f} "
+                f"{row['error_rate']:>7.1%} {row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+            )
+        return {"wall_seconds": wall, "operations": rows}
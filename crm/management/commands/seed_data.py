@@ -0,0 +1,169 @@
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from crm.models import Customer, CustomerSales, DailySales, Order, OrderReminder, Product, ProductSales
+from crm.response_cache import invalidate
+from crm.seeding import SCALES, Plan, generate_rows, init_worker, insert_rows, plan_jobs, product_prices, run_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic customers, products and orders with bulk inserts. "
+        "The same --seed, counts and --until produce the same rows, whatever "
+        "the number of --workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=SCALES, default="small")
+        parser.add_argument("--customers", type=int, help="Overrides the --scale preset.")
+        parser.add_argument("--products", type=int, help="Overrides the --scale preset.")
+        parser.add_argument("--orders", type=int, help="Overrides the --scale preset.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--days", type=int, default=730, help="Span of customer signups and order dates.")
+        parser.add_argument(
+            "--until",
+            type=datetime.fromisoformat,
+            help="Latest order date (ISO format, UTC). Defaults to midnight today.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Generate chunks in this many processes. This process does all "
+            "the inserts, so there is a single writer on every backend.",
+        )
+        parser.add_argument("--flush", action="store_true", help="Delete all CRM data first.")
+
+    def handle(self, *args, **options):
+        customers, products, orders = SCALES[options["scale"]]
+        customers = options["customers"] if options["customers"] is not None else customers
+        products = options["products"] if options["products"] is not None else products
+        orders = options["orders"] if options["orders"] is not None else orders
+        if orders and not (customers and products):
+            raise CommandError("Orders need at least one customer and one product.")
+
+        if options["flush"]:
+            self.flush()
+
+        until = options["until"] or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        if timezone.is_naive(until):
+            until = until.replace(tzinfo=dt_timezone.utc)
+        plan = Plan(
+            seed=options["seed"],
+            start=until - timedelta(days=options["days"]),
+            until=until,
+            customers=customers,
+            first_customer_pk=self.next_pk(Customer),
+            products=products,
+            first_product_pk=self.next_pk(Product),
+        )
+        chunk_size = options["chunk_size"]
+        phases = [
+            ("products", plan_jobs("product", products, plan.first_product_pk, chunk_size, plan)),
+            ("customers", plan_jobs("customer", customers, plan.first_customer_pk, chunk_size, plan)),
+            ("orders", plan_jobs("order", orders, self.next_pk(Order), chunk_size, plan)),
+        ]
+
+        started = time.perf_counter()
+        written = Counter()
+        for label, jobs in phases:
+            if options["workers"] > 1:
+                written += self.run_phase(label, jobs, self.parallel(options["workers"], plan, label))
+            else:
+                written += self.run_phase(label, jobs, lambda jobs: map(run_job, jobs))
+
+        self.reset_sequences()
+        if orders:
+            call_command("backfill_last_order_at", stdout=self.stdout)
+        self.analyze()
+        # bulk_create sends no post_save, so drop cached responses here.
+        invalidate(Customer, Product, Order)
+
+        elapsed = time.perf_counter() - started
+        total = sum(written.values())
+        self.stdout.write(
+            self.style.SUCCESS(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s).")
+        )
+
+    def run_phase(self, label, jobs, run):
+        if not jobs:
+            return Counter()
+        started = time.perf_counter()
+        written = Counter()
+        for result in run(jobs):
+            written.update(result)
+        elapsed = time.perf_counter() - started
+        rows = sum(written.values())
+        details = ", ".join(f"{count} {name}" for name, count in written.items())
+        self.stdout.write(f"{label}: {details} in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+        return written
+
+    def parallel(self, workers, plan, label):
+        """
+        Generate in ``workers`` processes and insert here, in job order.
+        SQLite allows one writer at a time, so writing from the workers
+        fails with "database is locked". At most two jobs per worker are
+        in flight, which bounds the rows held in memory.
+        """
+        prices = product_prices(plan) if label == "orders" else None
+
+        def run(jobs):
+            # Children open no connections, but none may be inherited.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(plan, prices)) as executor:
+                pending = deque()
+                for job in jobs:
+                    pending.append((job, executor.submit(generate_rows, job)))
+                    if len(pending) >= 2 * workers:
+                        job, future = pending.popleft()
+                        yield insert_rows(job, future.result())
+                for job, future in pending:
+                    yield insert_rows(job, future.result())
+
+        return run
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def reset_sequences(self):
+        # Rows were inserted with explicit keys, which do not advance
+        # PostgreSQL sequences. A no-op on SQLite.
+        statements = connection.ops.sequence_reset_sql(no_style(), [Customer, Product, Order])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    def analyze(self):
+        # Fresh planner statistics for the new rows; on SQLite they are also
+        # what totalCount(mode: ESTIMATE) reads.
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+    def flush(self):
+        # Plain DELETEs, children first: the ORM would collect every row
+        # for cascades and signals.
+        tables = [
+            DailySales._meta.db_table,
+            CustomerSales._meta.db_table,
+            ProductSales._meta.db_table,
+            OrderReminder._meta.db_table,
+            Order.products.through._meta.db_table,
+            Order._meta.db_table,
+            Customer._meta.db_table,
+            Product._meta.db_table,
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(table)}")
+        invalidate(Customer, Product, Order)
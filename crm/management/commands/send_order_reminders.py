@@ -0,0 +1,75 @@
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from crm.reminders import build_sender, claim_reminders, dispatch, mark_sent, release, reminder_settings
+
+
+class Command(BaseCommand):
+    help = (
+        "Send a reminder for every order placed in the last --days days that "
+        "has not had one yet, through the configured ORDER_REMINDERS sender."
+    )
+
+    def add_arguments(self, parser):
+        config = reminder_settings()
+        parser.add_argument("--days", type=int, default=7)
+        parser.add_argument("--chunk-size", type=int, default=config["CHUNK_SIZE"])
+        parser.add_argument("--concurrency", type=int, default=config["CONCURRENCY"])
+        parser.add_argument("--retries", type=int, default=config["RETRIES"])
+        parser.add_argument("--retry-delay", type=float, default=config["RETRY_DELAY"])
+        parser.add_argument("--lease", type=float, default=config["LEASE"])
+        parser.add_argument("--flush-size", type=int, default=config["FLUSH_SIZE"])
+        parser.add_argument("--flush-interval", type=float, default=config["FLUSH_INTERVAL"])
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options["days"])
+        reminders = claim_reminders(
+            since, options["chunk_size"], uuid.uuid4(), timedelta(seconds=options["lease"])
+        )
+
+        # Sent reminders are stamped with one UPDATE per small batch, at
+        # least every --flush-interval seconds while sends complete. A run
+        # killed before its finally block resends at most one batch once its
+        # claims expire.
+        sent_reminders = []
+        flushed_at = time.monotonic()
+
+        def flush():
+            nonlocal flushed_at
+            mark_sent(sent_reminders)
+            sent_reminders.clear()
+            flushed_at = time.monotonic()
+
+        def record(reminder, error):
+            if error is None:
+                sent_reminders.append(reminder)
+                if (
+                    len(sent_reminders) >= options["flush_size"]
+                    or time.monotonic() - flushed_at >= options["flush_interval"]
+                ):
+                    flush()
+            else:
+                release(reminder)
+                self.stderr.write(f"Reminder for order {reminder.order_id} failed: {error}")
+
+        sender = build_sender()
+        try:
+            sent, failed = dispatch(
+                reminders,
+                sender,
+                options["concurrency"],
+                retries=options["retries"],
+                retry_delay=options["retry_delay"],
+                on_result=record,
+            )
+        finally:
+            sender.close()
+            flush()
+
+        if failed:
+            raise CommandError(f"Processed {sent} order reminders, {failed} failed.")
+        self.stdout.write(f"Processed {sent} order reminders, {failed} failed.")
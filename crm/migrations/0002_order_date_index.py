@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['order_date', 'id'], name='crm_order_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+from crm.migrations._search_triggers import create_triggers, drop_triggers
+
+INDEXES = {
+    "crm_customer": ("crm_customer_fts", ("name", "email")),
+    "crm_product": ("crm_product_fts", ("name",)),
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for source, (table, columns) in INDEXES.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, content='{source}', "
+            f"content_rowid='id', tokenize='trigram')"
+        )
+        create_triggers(schema_editor, table, source, columns)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table, _ in INDEXES.values():
+        drop_triggers(schema_editor, table)
+        schema_editor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0002_order_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
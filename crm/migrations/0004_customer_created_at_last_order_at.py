@@ -0,0 +1,53 @@
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+from crm.migrations._search_triggers import create_triggers
+
+# Adding columns makes SQLite rebuild crm_customer, which drops the search
+# index triggers 0003 put on it; they are recreated right after.
+TABLE, SOURCE, COLUMNS = "crm_customer_fts", "crm_customer", ("name", "email")
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    create_triggers(schema_editor, TABLE, SOURCE, COLUMNS)
+
+
+def backfill_last_order_at(apps, schema_editor):
+    # One UPDATE for the whole table; backfill_last_order_at does the same
+    # in primary-key ranges for tables too large to lock at once.
+    Customer = apps.get_model("crm", "Customer")
+    Order = apps.get_model("crm", "Order")
+    latest_order = Subquery(
+        Order.objects.filter(customer=OuterRef("pk"))
+        .order_by()
+        .values("customer")
+        .annotate(latest=Max("order_date"))
+        .values("latest")
+    )
+    Customer.objects.using(schema_editor.connection.alias).update(last_order_at=latest_order)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_last_order_at, migrations.RunPython.noop),
+    ]
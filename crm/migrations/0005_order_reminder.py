@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_customer_created_at_last_order_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_id', models.UUIDField(db_index=True)),
+                ('claimed_at', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reminder', to='crm.order')),
+            ],
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of the trigger and rebuild SQL of crm.rollups as of this
+# migration, so later edits there cannot change what it applies.
+DAY_SQL = {
+    "sqlite": "date({})",
+    "postgresql": "({} AT TIME ZONE 'UTC')::date",
+}
+
+SQLITE_TRIGGERS = ["crm_sales_order_ai", "crm_sales_order_ad", "crm_sales_order_au", "crm_sales_line_ai", "crm_sales_line_ad"]
+POSTGRESQL_TRIGGERS = [("crm_sales_order", "crm_order"), ("crm_sales_line", "crm_order_products")]
+
+
+def add_order_sql(row, day):
+    day = day.format(f"{row}.order_date")
+    return (
+        f"INSERT INTO crm_dailysales (day, order_count, revenue) VALUES ({day}, 1, {row}.total_amount) "
+        f"ON CONFLICT (day) DO UPDATE SET order_count = crm_dailysales.order_count + 1, "
+        f"revenue = crm_dailysales.revenue + excluded.revenue; "
+        f"INSERT INTO crm_customersales (customer_id, order_count, revenue) "
+        f"VALUES ({row}.customer_id, 1, {row}.total_amount) "
+        f"ON CONFLICT (customer_id) DO UPDATE SET order_count = crm_customersales.order_count + 1, "
+        f"revenue = crm_customersales.revenue + excluded.revenue;"
+    )
+
+
+def remove_order_sql(row, day):
+    day = day.format(f"{row}.order_date")
+    return (
+        f"UPDATE crm_dailysales SET order_count = order_count - 1, revenue = revenue - {row}.total_amount "
+        f"WHERE day = {day}; "
+        f"UPDATE crm_customersales SET order_count = order_count - 1, revenue = revenue - {row}.total_amount "
+        f"WHERE customer_id = {row}.customer_id;"
+    )
+
+
+def add_line_sql(row):
+    return (
+        f"INSERT INTO crm_productsales (product_id, units) VALUES ({row}.product_id, 1) "
+        f"ON CONFLICT (product_id) DO UPDATE SET units = crm_productsales.units + 1;"
+    )
+
+
+def remove_line_sql(row):
+    return f"UPDATE crm_productsales SET units = units - 1 WHERE product_id = {row}.product_id;"
+
+
+def sqlite_triggers():
+    day = DAY_SQL["sqlite"]
+    changed = " OR ".join(f"old.{column} IS NOT new.{column}" for column in ("customer_id", "total_amount", "order_date"))
+    return [
+        f"CREATE TRIGGER crm_sales_order_ai AFTER INSERT ON crm_order BEGIN {add_order_sql('new', day)} END",
+        f"CREATE TRIGGER crm_sales_order_ad AFTER DELETE ON crm_order BEGIN {remove_order_sql('old', day)} END",
+        f"CREATE TRIGGER crm_sales_order_au AFTER UPDATE OF customer_id, total_amount, order_date ON crm_order "
+        f"WHEN {changed} BEGIN {remove_order_sql('old', day)} {add_order_sql('new', day)} END",
+        f"CREATE TRIGGER crm_sales_line_ai AFTER INSERT ON crm_order_products BEGIN {add_line_sql('new')} END",
+        f"CREATE TRIGGER crm_sales_line_ad AFTER DELETE ON crm_order_products BEGIN {remove_line_sql('old')} END",
+    ]
+
+
+def postgresql_triggers():
+    day = DAY_SQL["postgresql"]
+    return [
+        "CREATE OR REPLACE FUNCTION crm_sales_order() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN {remove_order_sql('OLD', day)} END IF; "
+        f"IF TG_OP <> 'DELETE' THEN {add_order_sql('NEW', day)} END IF; "
+        "RETURN NULL; END $$",
+        "CREATE TRIGGER crm_sales_order AFTER INSERT OR DELETE OR UPDATE OF customer_id, total_amount, order_date "
+        "ON crm_order FOR EACH ROW EXECUTE FUNCTION crm_sales_order()",
+        "CREATE OR REPLACE FUNCTION crm_sales_line() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"IF TG_OP = 'DELETE' THEN {remove_line_sql('OLD')} ELSE {add_line_sql('NEW')} END IF; "
+        "RETURN NULL; END $$",
+        "CREATE TRIGGER crm_sales_line AFTER INSERT OR DELETE ON crm_order_products "
+        "FOR EACH ROW EXECUTE FUNCTION crm_sales_line()",
+    ]
+
+
+def drop_rollup_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        for name in SQLITE_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    elif vendor == "postgresql":
+        for name, table in POSTGRESQL_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            schema_editor.execute(f"DROP FUNCTION IF EXISTS {name}()")
+
+
+def create_rollups(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("LOCK TABLE crm_order, crm_order_products IN SHARE ROW EXCLUSIVE MODE")
+    triggers = {"sqlite": sqlite_triggers, "postgresql": postgresql_triggers}.get(vendor)
+    if triggers is not None:
+        drop_rollup_triggers(apps, schema_editor)
+        for sql in triggers():
+            schema_editor.execute(sql)
+    day = DAY_SQL.get(vendor, "CAST({} AS DATE)").format("order_date")
+    schema_editor.execute(
+        "INSERT INTO crm_dailysales (day, order_count, revenue) "
+        f"SELECT {day}, COUNT(*), SUM(total_amount) FROM crm_order GROUP BY {day}"
+    )
+    schema_editor.execute(
+        "INSERT INTO crm_customersales (customer_id, order_count, revenue) "
+        "SELECT customer_id, COUNT(*), SUM(total_amount) FROM crm_order GROUP BY customer_id"
+    )
+    schema_editor.execute(
+        "INSERT INTO crm_productsales (product_id, units) "
+        "SELECT product_id, COUNT(*) FROM crm_order_products GROUP BY product_id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_order_reminder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerSales',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.customer')),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('day', models.DateField(primary_key=True, serialize=False)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='crm.product')),
+                ('units', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_rollups, drop_rollup_triggers),
+    ]
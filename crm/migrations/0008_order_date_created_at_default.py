@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0007_sales_rollups'),
+    ]
+
+    # Python-side defaults only, so the columns are unchanged. Applied as
+    # AlterField, SQLite would rebuild both tables and drop the search-index
+    # and sales-rollup triggers on them.
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='customer',
+                    name='created_at',
+                    field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+                ),
+                migrations.AlterField(
+                    model_name='order',
+                    name='order_date',
+                    field=models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+        ),
+    ]
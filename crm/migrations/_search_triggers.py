@@ -0,0 +1,34 @@
+"""
+FTS5 sync-trigger SQL shared by the search-index migrations.
+
+The leading underscore keeps the migration loader from treating this module
+as a migration. It lives here rather than in crm.search so later edits to the
+app cannot change what an applied migration did.
+"""
+
+
+def drop_triggers(schema_editor, table):
+    for suffix in ("ai", "ad", "au"):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+
+
+def create_triggers(schema_editor, table, source, columns):
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    drop_triggers(schema_editor, table)
+    schema_editor.execute(
+        f"CREATE TRIGGER {table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER {table}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    )
+    # Only indexed columns re-index, so stock updates leave the index alone.
+    schema_editor.execute(
+        f"CREATE TRIGGER {table}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    schema_editor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 
 class Customer(models.Model):
@@ -9,6 +10,10 @@ class Customer(models.Model):
         max_length=20,
         blank=True
     )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Denormalized from Order so inactivity checks are a range scan on
+    # this index instead of an anti-join over every order.
+    last_order_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def __str__(self):
         return str(self.name)
@@ -23,11 +28,40 @@ class Product(models.Model):
         return str(self.name)
 
 
+class OrderQuerySet(models.QuerySet):
+    def delete(self):
+        # Order has no post_delete receiver, so that cascades keep Django's
+        # fast delete; direct deletes invalidate cached responses here.
+        from crm.response_cache import invalidate
+
+        deleted = super().delete()
+        invalidate(Order)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name="orders")
     products = models.ManyToManyField(Product, related_name="orders")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
-    order_date = models.DateTimeField(auto_now_add=True)
+    order_date = models.DateTimeField(default=timezone.now)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves keyset pagination of allOrdersKeyset and date-range filters.
+            models.Index(fields=["order_date", "id"], name="crm_order_date_id_idx"),
+        ]
+
+    def delete(self, *args, **kwargs):
+        from crm.response_cache import invalidate
+
+        deleted = super().delete(*args, **kwargs)
+        invalidate(Order)
+        return deleted
 
     @property
     def calculate_total(self):
@@ -35,3 +69,60 @@ class Order(models.Model):
 
     def __str__(self):
         return str(f"Order {self.id}  - {self.customer.name}")
+
+
+class OrderReminder(models.Model):
+    """
+    Reminder ledger: one row per order, claimed by a reminder run before it
+    sends and stamped with ``sent_at`` once the send succeeded. The one-to-one
+    key makes a second claim on the same order fail, so overlapping or
+    retried runs never send twice.
+    """
+
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name="reminder")
+    run_id = models.UUIDField(db_index=True)
+    claimed_at = models.DateTimeField()
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return str(f"Reminder for order {self.order_id}")
+
+
+# Sales rollups. Database triggers on crm_order and crm_order_products keep
+# these current in the same transaction as the write (see crm.rollups), so
+# revenue questions read one row per day, customer or product instead of
+# scanning orders. ``manage.py rebuild_sales_rollups`` recomputes them.
+# Counts are plain integers: a rollup that drifted must not make a
+# decrement violate a CHECK constraint and fail the order delete.
+
+
+class DailySales(models.Model):
+    """Orders and revenue per UTC day of ``Order.order_date``."""
+
+    day = models.DateField(primary_key=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return str(f"Sales on {self.day}")
+
+
+class CustomerSales(models.Model):
+    """Lifetime orders and revenue of one customer."""
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name="sales")
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return str(f"Sales to customer {self.customer_id}")
+
+
+class ProductSales(models.Model):
+    """Units of one product sold; each order takes one unit of each of its products."""
+
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="sales")
+    units = models.IntegerField(default=0)
+
+    def __str__(self):
+        return str(f"Sales of product {self.product_id}")
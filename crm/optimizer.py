@@ -0,0 +1,150 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.settings import graphene_settings
+from graphql import value_from_ast_untyped
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+from crm.loaders import PAGINATION_ARGS, page_limit, prefetch_attr
+
+
+def collect_fields(field_nodes, fragments):
+    """
+    Merge the sub-selections of ``field_nodes`` into ``{field name: [FieldNode]}``,
+    expanding inline fragments and fragment spreads along the way.
+    """
+    fields = {}
+
+    def visit(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, InlineFragmentNode):
+                visit(selection.selection_set)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    visit(fragment.selection_set)
+
+    for node in field_nodes:
+        visit(node.selection_set)
+    return fields
+
+
+def connection_node_fields(field_nodes, fragments):
+    """Selections made on ``edges { node { ... } }`` of a connection field."""
+    edges = collect_fields(field_nodes, fragments).get("edges", [])
+    nodes = collect_fields(edges, fragments).get("node", [])
+    return collect_fields(nodes, fragments)
+
+
+class QueryPlan:
+    def __init__(self):
+        self.only = set()
+        self.select_related = set()
+        self.prefetch_related = []
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def nested_page_limit(nodes, variables):
+    """
+    ``(filtered, limit)`` for the selections of one nested connection:
+    whether any of them passes a filter, and the rows per parent that serve
+    all of them (see crm.loaders.page_limit; None for every row).
+    """
+    filtered, limits = False, []
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    for node in nodes:
+        args = {arg.name.value: value_from_ast_untyped(arg.value, variables) for arg in node.arguments}
+        filtered = filtered or any(v is not None for k, v in args.items() if k not in PAGINATION_ARGS)
+        limits.append(page_limit(args, max_limit))
+    return filtered, None if None in limits else max(limits)
+
+
+def build_plan(model, fields, fragments, plan, prefix="", variables=None):
+    """
+    Fill ``plan`` with the columns, joins and prefetches needed to resolve
+    ``fields`` on ``model``. Names the model does not know about (``id``,
+    ``__typename``, computed fields) are left to their resolvers.
+
+    A nested connection is prefetched only as far as its pages reach; a
+    filtered one is not prefetched, its resolver queries it with the
+    FilterSet instead.
+    """
+    plan.only.add(prefix + model._meta.pk.name)
+    for name, nodes in fields.items():
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            continue
+
+        if not field.is_relation:
+            plan.only.add(prefix + field.name)
+        elif field.many_to_one or (field.one_to_one and field.concrete):
+            plan.only.add(prefix + field.name)
+            plan.select_related.add(prefix + field.name)
+            build_plan(
+                field.related_model,
+                collect_fields(nodes, fragments),
+                fragments,
+                plan,
+                prefix + field.name + "__",
+                variables,
+            )
+        elif field.one_to_many or field.many_to_many:
+            filtered, limit = nested_page_limit(nodes, variables)
+            if filtered:
+                continue
+            child = QueryPlan()
+            if field.one_to_many:
+                # The reverse FK column is needed to attach rows to parents.
+                child.only.add(field.field.name)
+            build_plan(
+                field.related_model,
+                connection_node_fields(nodes, fragments),
+                fragments,
+                child,
+                variables=variables,
+            )
+            accessor = field.name if field.concrete else field.get_accessor_name()
+            queryset = child.apply(field.related_model._default_manager.order_by("pk"))
+            if limit is not None:
+                # Django cuts a sliced prefetch per parent with ROW_NUMBER()
+                # over the relation key, like the loaders do.
+                queryset = queryset[:limit]
+            plan.prefetch_related.append(
+                Prefetch(prefix + accessor, queryset=queryset, to_attr=prefetch_attr(accessor))
+            )
+
+
+def optimize_queryset(queryset, info):
+    """
+    Apply select_related, prefetch_related and only() to a connection's
+    queryset according to what the client selected under ``edges.node``.
+    """
+    fields = connection_node_fields(info.field_nodes, info.fragments)
+    if not fields:
+        return queryset
+    plan = QueryPlan()
+    build_plan(queryset.model, fields, info.fragments, plan, variables=info.variable_values)
+    return plan.apply(queryset)
+
+
+def optimize_object_queryset(queryset, info):
+    """``optimize_queryset`` for a field that returns a single object rather than a connection."""
+    fields = collect_fields(info.field_nodes, info.fragments)
+    if not fields:
+        return queryset
+    plan = QueryPlan()
+    build_plan(queryset.model, fields, info.fragments, plan, variables=info.variable_values)
+    return plan.apply(queryset)
@@ -0,0 +1,200 @@
+from collections import Counter, namedtuple
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from crm.models import Customer, Order, Product
+from crm.response_cache import invalidate
+
+IMPORT_CHUNK_SIZE = 5000
+
+OrderRow = namedtuple("OrderRow", ["index", "customer_id", "customer_email", "product_ids", "order_date"])
+ChunkResult = namedtuple("ChunkResult", ["orders", "errors"])
+
+
+def parse_row(index, raw):
+    """
+    Normalize one input row: a dict with ``customer_id`` or
+    ``customer_email``, ``product_ids`` (a list, or a ";"-separated string
+    as written by the CSV export) and an optional ISO ``order_date``.
+    Raises ValueError with the message reported for the row.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("Each order must be an object.")
+
+    customer_id = raw.get("customer_id") or None
+    customer_email = raw.get("customer_email") or None
+    if customer_id is None and customer_email is None:
+        raise ValueError("customer_id or customer_email is required.")
+    if customer_id is not None:
+        try:
+            customer_id = int(customer_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid customer ID.")
+
+    product_ids = raw.get("product_ids") or []
+    if isinstance(product_ids, str):
+        product_ids = [pid for pid in product_ids.split(";") if pid.strip()]
+    if not product_ids:
+        raise ValueError("At least one product must be selected.")
+    try:
+        product_ids = [int(pid) for pid in product_ids]
+    except (TypeError, ValueError):
+        raise ValueError("One or more product IDs are invalid.")
+    if len(set(product_ids)) != len(product_ids):
+        raise ValueError("One or more product IDs are invalid.")
+
+    order_date = raw.get("order_date") or None
+    if isinstance(order_date, str):
+        parsed = parse_datetime(order_date)
+        if parsed is None:
+            raise ValueError(f"Invalid order_date: {order_date}")
+        order_date = parsed
+    if order_date is not None and not isinstance(order_date, datetime):
+        raise ValueError(f"Invalid order_date: {order_date}")
+    if order_date is not None and timezone.is_naive(order_date):
+        order_date = timezone.make_aware(order_date)
+
+    return OrderRow(index, customer_id, customer_email, product_ids, order_date)
+
+
+def insert_rows(model, fields, rows):
+    """
+    INSERT ``rows``, tuples of ``fields`` values, as multi-row VALUES in
+    batches as large as the backend allows. For rows nothing reads back:
+    bulk_create builds and compiles a model instance per row, which cost
+    more than the inserts themselves.
+    """
+    opts = model._meta
+    fields = [opts.get_field(name) for name in fields]
+    qn = connection.ops.quote_name
+    columns = ", ".join(qn(field.column) for field in fields)
+    row_sql = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            cursor.execute(
+                f"INSERT INTO {qn(opts.db_table)} ({columns}) VALUES {', '.join([row_sql] * len(batch))}",
+                [value for row in batch for value in row],
+            )
+
+
+@transaction.atomic
+def import_chunk(rows, reserve_stock):
+    """
+    Create the orders for one chunk of ``(index, raw)`` rows with a fixed
+    number of statements: customers, products, one bulk INSERT for orders and
+    one for their products, then at most one stock UPDATE and one
+    last_order_at UPDATE. A row that fails validation is reported in
+    ``errors`` as ``(index, message)`` and the others are still created.
+
+    With ``reserve_stock``, each order takes one unit of each of its products
+    as CreateOrder does, and an order whose products ran out is rejected.
+    Historical imports leave stock alone.
+    """
+    errors = []
+    parsed = []
+    for index, raw in rows:
+        try:
+            parsed.append(parse_row(index, raw))
+        except ValueError as e:
+            errors.append((index, str(e)))
+    if not parsed:
+        return ChunkResult([], errors)
+
+    customers = set(
+        Customer.objects.filter(pk__in={row.customer_id for row in parsed if row.customer_id})
+        .values_list("pk", flat=True)
+    )
+    customers_by_email = dict(
+        Customer.objects.filter(
+            email__in={row.customer_email for row in parsed if row.customer_id is None}
+        ).values_list("email", "pk")
+    )
+    products = Product.objects.filter(pk__in={pid for row in parsed for pid in row.product_ids})
+    if reserve_stock:
+        products = products.select_for_update()
+    prices, stock = {}, {}
+    for pk, price, units in products.values_list("pk", "price", "stock"):
+        prices[pk] = price
+        stock[pk] = units
+
+    now = timezone.now()
+    orders, order_products = [], []
+    taken = Counter()
+    for row in parsed:
+        if row.customer_id is not None:
+            customer_pk = row.customer_id if row.customer_id in customers else None
+            if customer_pk is None:
+                errors.append((row.index, f"Unknown customer_id {row.customer_id}."))
+                continue
+        else:
+            customer_pk = customers_by_email.get(row.customer_email)
+            if customer_pk is None:
+                errors.append((row.index, f"Unknown customer_email {row.customer_email}."))
+                continue
+        if any(pid not in prices for pid in row.product_ids):
+            errors.append((row.index, "One or more product IDs are invalid."))
+            continue
+        if reserve_stock:
+            if any(stock[pid] - taken[pid] <= 0 for pid in row.product_ids):
+                errors.append((row.index, "One or more products are out of stock."))
+                continue
+            taken.update(row.product_ids)
+        orders.append(
+            Order(
+                customer_id=customer_pk,
+                total_amount=sum((prices[pid] for pid in row.product_ids), Decimal(0)),
+                order_date=row.order_date or now,
+            )
+        )
+        order_products.append(row.product_ids)
+
+    if orders:
+        Through = Order.products.through
+        # Primary keys come back from the INSERT (RETURNING on SQLite and
+        # PostgreSQL), so the through rows need no extra lookup.
+        Order.objects.bulk_create(orders)
+        insert_rows(
+            Through,
+            ["order", "product"],
+            [(order.pk, pid) for order, product_ids in zip(orders, order_products) for pid in product_ids],
+        )
+        if taken:
+            Product.objects.filter(pk__in=taken).update(
+                stock=Case(*[When(pk=pk, then=F("stock") - units) for pk, units in taken.items()])
+            )
+        # Imported orders may be older than the latest one, so recompute
+        # instead of overwriting.
+        latest_order = Subquery(
+            Order.objects.filter(customer=OuterRef("pk"))
+            .order_by()
+            .values("customer")
+            .annotate(latest=Max("order_date"))
+            .values("latest")
+        )
+        Customer.objects.filter(pk__in={order.customer_id for order in orders}).update(
+            last_order_at=latest_order
+        )
+        # bulk_create() and update() bypass the model signals.
+        invalidate(Product, Order, Customer)
+
+    errors.sort()
+    return ChunkResult(orders, errors)
+
+
+def import_orders(rows, chunk_size=IMPORT_CHUNK_SIZE, reserve_stock=False):
+    """
+    Import an iterable of raw order rows ``chunk_size`` at a time, yielding
+    one ChunkResult per chunk. Each chunk commits on its own; wrap the call in
+    a transaction for all-or-nothing.
+    """
+    iterator = enumerate(rows)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield import_chunk(chunk, reserve_stock)
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from crm.models import Order, OrderReminder
+
+DEFAULTS = {
+    "SENDER": "crm.reminders.FileSender",
+    "OPTIONS": {"path": "/tmp/order_reminders_log.txt"},
+    "CHUNK_SIZE": 2000,
+    "CONCURRENCY": 8,
+    "RETRIES": 3,
+    "RETRY_DELAY": 1.0,
+    "LEASE": 3600,
+    "FLUSH_SIZE": 100,
+    "FLUSH_INTERVAL": 1.0,
+}
+
+Reminder = namedtuple("Reminder", ["order_id", "order_date", "email", "run_id"])
+
+
+def reminder_settings():
+    return {**DEFAULTS, **getattr(settings, "ORDER_REMINDERS", {})}
+
+
+class FileSender:
+    """Appends one line per reminder to a file; the stand-in used by the cron job and for testing."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def send(self, reminder):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] Reminder for Order ID: {reminder.order_id}, Customer Email: {reminder.email}\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class EmailSender:
+    """
+    Sends reminders as email through a Django mail backend (SMTP by default).
+    Each worker thread keeps its own open connection.
+    """
+
+    def __init__(self, from_email=None, subject="Your recent order", backend=None, **backend_options):
+        self.from_email = from_email
+        self.subject = subject
+        self.backend = backend
+        self.backend_options = backend_options
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = get_connection(self.backend, fail_silently=False, **self.backend_options)
+            conn.open()
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def send(self, reminder):
+        body = f"Thanks for your order #{reminder.order_id} placed on {reminder.order_date:%Y-%m-%d}."
+        message = EmailMessage(
+            self.subject, body, self.from_email, [reminder.email], connection=self.connection()
+        )
+        message.send()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def build_sender(config=None):
+    config = config or reminder_settings()
+    return import_string(config["SENDER"])(**config["OPTIONS"])
+
+
+def claim_reminders(since, chunk_size, run_id, lease):
+    """
+    Claim and yield the orders placed since ``since`` that have no reminder
+    yet, ``chunk_size`` at a time in primary-key order.
+
+    Each chunk is claimed with one INSERT ... ON CONFLICT DO NOTHING into the
+    ledger; only the rows that came back with this run's ``run_id`` are
+    yielded, so an order claimed by a concurrent run is skipped. Claims older
+    than ``lease`` that were never marked sent belong to a crashed run and are
+    released first. Each chunk's claims are stamped when they are inserted,
+    so a long run does not age its later chunks towards the lease.
+    """
+    OrderReminder.objects.filter(sent_at__isnull=True, claimed_at__lt=timezone.now() - lease).delete()
+
+    candidates = (
+        Order.objects.filter(order_date__gte=since, reminder__isnull=True)
+        .order_by("pk")
+        .values_list("pk", flat=True)
+    )
+    last_pk = 0
+    while True:
+        ids = list(candidates.filter(pk__gt=last_pk)[:chunk_size])
+        if not ids:
+            return
+        last_pk = ids[-1]
+        claimed_at = timezone.now()
+        OrderReminder.objects.bulk_create(
+            [OrderReminder(order_id=pk, run_id=run_id, claimed_at=claimed_at) for pk in ids],
+            ignore_conflicts=True,
+        )
+        claimed = (
+            OrderReminder.objects.filter(run_id=run_id, order_id__in=ids)
+            .order_by("order_id")
+            .values_list("order_id", "order__order_date", "order__customer__email", "run_id")
+        )
+        for row in claimed:
+            yield Reminder(*row)
+
+
+def mark_sent(reminders):
+    """
+    Stamp ``sent_at`` on the claims of ``reminders``, one UPDATE per run.
+    Only claims still held by the reminder's run are touched, so a claim
+    that expired and was taken over by another run is left to that run.
+    """
+    orders_by_run = defaultdict(list)
+    for reminder in reminders:
+        orders_by_run[reminder.run_id].append(reminder.order_id)
+    sent_at = timezone.now()
+    for run_id, order_ids in orders_by_run.items():
+        OrderReminder.objects.filter(run_id=run_id, order_id__in=order_ids).update(sent_at=sent_at)
+
+
+def release(reminder):
+    """Give up a claim so the next run retries the order."""
+    OrderReminder.objects.filter(
+        order_id=reminder.order_id, run_id=reminder.run_id, sent_at__isnull=True
+    ).delete()
+
+
+def send_with_retry(sender, reminder, retries, delay):
+    for attempt in range(retries + 1):
+        try:
+            sender.send(reminder)
+            return
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def dispatch(reminders, sender, concurrency, retries=0, retry_delay=0, on_result=None):
+    """
+    Send ``reminders`` through ``sender`` on ``concurrency`` worker threads.
+
+    At most twice ``concurrency`` sends are in flight, so the producer is
+    throttled to the pace of the sender instead of buffering the stream.
+    ``on_result(reminder, error)`` is called from the calling thread once
+    per reminder, with ``error`` None on success. Returns (sent, failed).
+    """
+    sent = failed = 0
+    in_flight = {}
+
+    def collect(done):
+        nonlocal sent, failed
+        for future in done:
+            reminder = in_flight.pop(future)
+            error = future.exception()
+            if error is None:
+                sent += 1
+            else:
+                failed += 1
+            if on_result is not None:
+                on_result(reminder, error)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for reminder in reminders:
+                if len(in_flight) >= concurrency * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+                future = executor.submit(send_with_retry, sender, reminder, retries, retry_delay)
+                in_flight[future] = reminder
+        finally:
+            # Sends already handed to the pool complete even when the stream
+            # fails; report them so they are recorded, not resent.
+            collect(wait(in_flight).done)
+    return sent, failed
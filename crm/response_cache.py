@@ -0,0 +1,213 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils.module_loading import import_string
+from graphene.utils.str_converters import to_snake_case
+from graphql import FragmentDefinitionNode, OperationType, print_ast
+
+from crm.optimizer import collect_fields, connection_node_fields
+
+DEFAULTS = {
+    "BACKEND": "crm.response_cache.DjangoCacheBackend",
+    "OPTIONS": {},
+    "TTL": 300,
+    "FIELDS": ["allProducts", "allCustomers"],
+}
+
+
+class LocalMemoryBackend:
+    """
+    Per-process LRU with per-entry TTL. Invalidations only reach the process
+    that made the write, so use it with a single worker process only.
+    """
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, labels):
+        with self._lock:
+            return [self._versions.get(label, 0) for label in labels]
+
+    def bump_version(self, label):
+        with self._lock:
+            self._versions[label] = self._versions.get(label, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoCacheBackend:
+    """
+    Shared backend on top of a Django cache alias (Redis, Memcached, ...).
+    Size-bounded eviction is left to the cache server.
+    """
+
+    def __init__(self, alias="default", key_prefix="crm:response"):
+        self.cache = caches[alias]
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        return self.cache.get(f"{self.key_prefix}:{key}")
+
+    def set(self, key, value, ttl):
+        self.cache.set(f"{self.key_prefix}:{key}", value, ttl)
+
+    # Version of the whole namespace, bumped by clear(). It is read along
+    # with the model versions, so it costs no extra round trip.
+    GENERATION = "*"
+
+    def _version_key(self, label):
+        return f"{self.key_prefix}:version:{label}"
+
+    def get_versions(self, labels):
+        keys = [self._version_key(label) for label in [*labels, self.GENERATION]]
+        found = self.cache.get_many(keys)
+        return [found.get(key, 0) for key in keys]
+
+    def bump_version(self, label):
+        key = self._version_key(label)
+        self.cache.add(key, 0, None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, None)
+
+    def clear(self):
+        """
+        Drop this cache's entries by moving to a new generation; other users
+        of the cache alias are left alone, and old entries age out by TTL.
+        """
+        self.bump_version(self.GENERATION)
+
+
+class ResponseCache:
+    """
+    Caches whole query responses whose root fields are all in FIELDS.
+
+    The key covers the normalized document, operation name, variables and the
+    current version of every model the selection reads; invalidating a model
+    bumps its version, so stale entries are simply never looked up again and
+    age out through TTL/LRU eviction.
+    """
+
+    def __init__(self, backend, ttl, fields):
+        self.backend = backend
+        self.ttl = ttl
+        self.fields = set(fields)
+
+    def get_key(self, schema, entry, operation_ast, operation_name, variables):
+        if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+            return None
+
+        fragments = {
+            definition.name.value: definition
+            for definition in entry.document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        root_fields = collect_fields([operation_ast], fragments)
+        models = set()
+        for name, nodes in root_fields.items():
+            if name == "__typename":
+                continue
+            if name not in self.fields:
+                return None
+            model = root_field_model(schema, name)
+            if model is None:
+                return None
+            selected_models(model, connection_node_fields(nodes, fragments), fragments, models)
+
+        labels = sorted(model._meta.label_lower for model in models)
+        if not labels:
+            return None
+        if entry.normalized is None:
+            entry.normalized = print_ast(entry.document)
+        payload = json.dumps(
+            [entry.normalized, operation_name, variables or {}, labels, self.backend.get_versions(labels)],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, data):
+        self.backend.set(key, data, self.ttl)
+
+    def invalidate(self, *models):
+        for model in models:
+            self.backend.bump_version(model._meta.label_lower)
+
+
+def root_field_model(schema, name):
+    field = schema.query_type.fields.get(name)
+    if field is None:
+        return None
+    connection = getattr(field.type, "graphene_type", None)
+    node = getattr(getattr(connection, "_meta", None), "node", None)
+    return getattr(getattr(node, "_meta", None), "model", None)
+
+
+def selected_models(model, fields, fragments, models):
+    """Collect every model a selection on ``model`` reads from."""
+    models.add(model)
+    for name, nodes in fields.items():
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            continue
+        if not field.is_relation:
+            continue
+        if field.one_to_many or field.many_to_many:
+            children = connection_node_fields(nodes, fragments)
+        else:
+            children = collect_fields(nodes, fragments)
+        selected_models(field.related_model, children, fragments, models)
+
+
+def response_cache_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_RESPONSE_CACHE", {})}
+
+
+def build_response_cache():
+    config = response_cache_settings()
+    backend = import_string(config["BACKEND"])(**config["OPTIONS"])
+    return ResponseCache(backend, config["TTL"], config["FIELDS"])
+
+
+response_cache = build_response_cache()
+
+
+def invalidate(*models):
+    """Drop cached responses that read any of ``models`` once the current transaction commits."""
+    transaction.on_commit(lambda: response_cache.invalidate(*models))
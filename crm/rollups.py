@@ -0,0 +1,167 @@
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Sales rollups (DailySales, CustomerSales, ProductSales) are maintained by
+# triggers on crm_order and crm_order_products, like the search index in
+# crm.search: save(), bulk_create(), update(), cascades and raw SQL all
+# keep them current, in the transaction of the write. Triggers exist on
+# SQLite and PostgreSQL; elsewhere run rebuild() to refresh the tables.
+#
+# A migration that makes SQLite rebuild crm_order or crm_order_products
+# (most AlterField/RemoveField, or adding a constrained column) drops
+# their triggers with the old table, and the rollups silently stop
+# following writes. Such a migration must call install_triggers() after
+# the rebuild; the crm.E001 database check (``manage.py check --database
+# default``, also run by migrate and the test runner) reports any missing.
+#
+# Days are UTC calendar days of order_date, whatever TIME_ZONE says.
+DAY_SQL = {
+    "sqlite": "date({})",
+    "postgresql": "({} AT TIME ZONE 'UTC')::date",
+}
+
+ROLLUP_TABLES = ["crm_dailysales", "crm_customersales", "crm_productsales"]
+
+SQLITE_TRIGGERS = ["crm_sales_order_ai", "crm_sales_order_ad", "crm_sales_order_au", "crm_sales_line_ai", "crm_sales_line_ad"]
+POSTGRESQL_TRIGGERS = [("crm_sales_order", "crm_order"), ("crm_sales_line", "crm_order_products")]
+
+
+def add_order_sql(row, day):
+    day = day.format(f"{row}.order_date")
+    return (
+        f"INSERT INTO crm_dailysales (day, order_count, revenue) VALUES ({day}, 1, {row}.total_amount) "
+        f"ON CONFLICT (day) DO UPDATE SET order_count = crm_dailysales.order_count + 1, "
+        f"revenue = crm_dailysales.revenue + excluded.revenue; "
+        f"INSERT INTO crm_customersales (customer_id, order_count, revenue) "
+        f"VALUES ({row}.customer_id, 1, {row}.total_amount) "
+        f"ON CONFLICT (customer_id) DO UPDATE SET order_count = crm_customersales.order_count + 1, "
+        f"revenue = crm_customersales.revenue + excluded.revenue;"
+    )
+
+
+def remove_order_sql(row, day):
+    # UPDATE, never upsert: when a customer is deleted its rollup row may go
+    # before its orders, and must not be recreated.
+    day = day.format(f"{row}.order_date")
+    return (
+        f"UPDATE crm_dailysales SET order_count = order_count - 1, revenue = revenue - {row}.total_amount "
+        f"WHERE day = {day}; "
+        f"UPDATE crm_customersales SET order_count = order_count - 1, revenue = revenue - {row}.total_amount "
+        f"WHERE customer_id = {row}.customer_id;"
+    )
+
+
+def add_line_sql(row):
+    return (
+        f"INSERT INTO crm_productsales (product_id, units) VALUES ({row}.product_id, 1) "
+        f"ON CONFLICT (product_id) DO UPDATE SET units = crm_productsales.units + 1;"
+    )
+
+
+def remove_line_sql(row):
+    return f"UPDATE crm_productsales SET units = units - 1 WHERE product_id = {row}.product_id;"
+
+
+def sqlite_triggers():
+    day = DAY_SQL["sqlite"]
+    changed = " OR ".join(f"old.{column} IS NOT new.{column}" for column in ("customer_id", "total_amount", "order_date"))
+    return [
+        f"CREATE TRIGGER crm_sales_order_ai AFTER INSERT ON crm_order BEGIN {add_order_sql('new', day)} END",
+        f"CREATE TRIGGER crm_sales_order_ad AFTER DELETE ON crm_order BEGIN {remove_order_sql('old', day)} END",
+        f"CREATE TRIGGER crm_sales_order_au AFTER UPDATE OF customer_id, total_amount, order_date ON crm_order "
+        f"WHEN {changed} BEGIN {remove_order_sql('old', day)} {add_order_sql('new', day)} END",
+        f"CREATE TRIGGER crm_sales_line_ai AFTER INSERT ON crm_order_products BEGIN {add_line_sql('new')} END",
+        f"CREATE TRIGGER crm_sales_line_ad AFTER DELETE ON crm_order_products BEGIN {remove_line_sql('old')} END",
+    ]
+
+
+def postgresql_triggers():
+    day = DAY_SQL["postgresql"]
+    return [
+        "CREATE OR REPLACE FUNCTION crm_sales_order() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"IF TG_OP <> 'INSERT' THEN {remove_order_sql('OLD', day)} END IF; "
+        f"IF TG_OP <> 'DELETE' THEN {add_order_sql('NEW', day)} END IF; "
+        "RETURN NULL; END $$",
+        "CREATE TRIGGER crm_sales_order AFTER INSERT OR DELETE OR UPDATE OF customer_id, total_amount, order_date "
+        "ON crm_order FOR EACH ROW EXECUTE FUNCTION crm_sales_order()",
+        "CREATE OR REPLACE FUNCTION crm_sales_line() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"IF TG_OP = 'DELETE' THEN {remove_line_sql('OLD')} ELSE {add_line_sql('NEW')} END IF; "
+        "RETURN NULL; END $$",
+        "CREATE TRIGGER crm_sales_line AFTER INSERT OR DELETE ON crm_order_products "
+        "FOR EACH ROW EXECUTE FUNCTION crm_sales_line()",
+    ]
+
+
+def drop_triggers(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        elif connection.vendor == "postgresql":
+            for name, table in POSTGRESQL_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+                cursor.execute(f"DROP FUNCTION IF EXISTS {name}()")
+
+
+def missing_triggers(connection):
+    """Rollup triggers absent from the database; always empty on backends without them."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            expected = SQLITE_TRIGGERS
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT tgname FROM pg_trigger WHERE NOT tgisinternal")
+            expected = [name for name, _ in POSTGRESQL_TRIGGERS]
+        else:
+            return []
+        installed = {name for name, in cursor.fetchall()}
+    return [name for name in expected if name not in installed]
+
+
+def install_triggers(connection):
+    """
+    (Re)create the rollup triggers. Safe to repeat, and needed after any
+    migration that makes SQLite rebuild crm_order or crm_order_products,
+    which drops their triggers.
+    """
+    triggers = {"sqlite": sqlite_triggers, "postgresql": postgresql_triggers}.get(connection.vendor)
+    if triggers is None:
+        return False
+    drop_triggers(connection)
+    with connection.cursor() as cursor:
+        for sql in triggers():
+            cursor.execute(sql)
+    return True
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """
+    Recompute every rollup from crm_order and crm_order_products, one
+    INSERT ... SELECT per table, and reinstall the triggers. Runs in one
+    transaction; on PostgreSQL, order writes wait for it to finish so none
+    is counted twice or missed. Returns the row count of each table.
+    """
+    connection = connections[using]
+    day = DAY_SQL.get(connection.vendor, "CAST({} AS DATE)").format("order_date")
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("LOCK TABLE crm_order, crm_order_products IN SHARE ROW EXCLUSIVE MODE")
+        install_triggers(connection)
+        for table in ROLLUP_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(
+            "INSERT INTO crm_dailysales (day, order_count, revenue) "
+            f"SELECT {day}, COUNT(*), SUM(total_amount) FROM crm_order GROUP BY {day}"
+        )
+        cursor.execute(
+            "INSERT INTO crm_customersales (customer_id, order_count, revenue) "
+            "SELECT customer_id, COUNT(*), SUM(total_amount) FROM crm_order GROUP BY customer_id"
+        )
+        cursor.execute(
+            "INSERT INTO crm_productsales (product_id, units) "
+            "SELECT product_id, COUNT(*) FROM crm_order_products GROUP BY product_id"
+        )
+        counts = {}
+        for table in ROLLUP_TABLES:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+    return counts
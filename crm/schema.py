@@ -1,12 +1,26 @@
+from decimal import Decimal
+
 import graphene
+from asgiref.sync import sync_to_async
+from graphene_django.settings import graphene_settings
 from graphene_django.types import DjangoObjectType
+from graphql import GraphQLError
 from .models import Customer, Order
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Trunc
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
-from graphene_django.filter import DjangoFilterConnectionField
 from crm.filters import CustomerFilter, ProductFilter, OrderFilter
-from crm.models import Product
+from crm.models import CustomerSales, DailySales, Product, ProductSales
+from crm.fields import AsyncFilterConnectionField, CRMFilterConnectionField, KeysetConnectionField, in_event_loop
+from crm.loaders import RelatedRows, get_loaders, prefetched, related_rows
+from crm.optimizer import optimize_object_queryset
+from crm.response_cache import invalidate
+from crm.counts import atotal_count, total_count
+from crm.order_import import import_orders
+
+CENTS = Decimal("0.01")
 
 # ==============================
 # GraphQL Types
@@ -29,29 +43,124 @@ class OrderType(DjangoObjectType):
         fields = ("id", "customer", "products", "total_amount", "order_date")
 
 
+class CountMode(graphene.Enum):
+    EXACT = "exact"
+    CACHED = "cached"
+    ESTIMATE = "estimate"
+
+
+class CountableConnection(graphene.relay.Connection):
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(mode=CountMode())
+
+    # Only runs when the client selects totalCount; pagination itself does
+    # not need the count.
+    def resolve_total_count(self, info, mode=None):
+        if getattr(self, "length", None) is not None:
+            return self.length
+        is_async = getattr(self, "is_async", False)
+        if isinstance(self.iterable, RelatedRows):
+            if is_async and not self.iterable.complete:
+                return sync_to_async(self.iterable.total)()
+            return self.iterable.total()
+        mode = getattr(mode, "value", mode)
+        if is_async:
+            return atotal_count(self.iterable, mode)
+        return total_count(self.iterable, mode)
+
+
 class CustomerNode(DjangoObjectType):
+    orders = CRMFilterConnectionField(lambda: OrderNode)
+
     class Meta:
         model = Customer
         filterset_class = CustomerFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         # fields = ("id", "name", "email", "phone")
 
+    def resolve_orders(self, info, **kwargs):
+        return related_rows(self, "orders", info, kwargs)
+
 
 class ProductNode(DjangoObjectType):
+    orders = CRMFilterConnectionField(lambda: OrderNode)
+
     class Meta:
         model = Product
         filterset_class = ProductFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         # fields = ("id", "name", "price", "stock")
 
+    def resolve_orders(self, info, **kwargs):
+        return related_rows(self, "orders", info, kwargs)
+
 
 class OrderNode(DjangoObjectType):
+    products = CRMFilterConnectionField(ProductNode)
+
     class Meta:
         model = Order
         filterset_class = OrderFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
         # fields = ("id", "customer", "products", "total_amount", "order_date")
 
+    # Relations come from the optimizer's select_related/prefetch_related when
+    # available, otherwise from the per-request loaders, so a page of orders
+    # costs one query per relation instead of one per row.
+    def resolve_customer(self, info):
+        customer = prefetched(self, "customer")
+        if customer is None:
+            load = get_loaders(info).customer.load
+            if in_event_loop():
+                return sync_to_async(load)(self.customer_id)
+            customer = load(self.customer_id)
+        return customer
+
+    def resolve_products(self, info, **kwargs):
+        return related_rows(self, "products", info, kwargs)
+
+
+class CRMStats(graphene.ObjectType):
+    customer_count = graphene.Int()
+    order_count = graphene.Int()
+    total_revenue = graphene.Decimal()
+
+    # SQLite returns SUM() of a decimal column unscaled; report cents.
+    def resolve_total_revenue(self, info):
+        return Decimal(self.total_revenue).quantize(CENTS)
+
+
+class SalesPeriod(graphene.Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class PeriodSales(graphene.ObjectType):
+    period = graphene.Date(description="First day of the period (UTC).")
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class CustomerSalesTotal(graphene.ObjectType):
+    customer = graphene.Field(CustomerNode)
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+
+
+class ProductSalesTotal(graphene.ObjectType):
+    product = graphene.Field(ProductNode)
+    units = graphene.Int()
+    revenue = graphene.Decimal(description="Units sold at the product's current price.")
+
+    def resolve_revenue(self, info):
+        return self.units * self.product.price
+
 
 # ==============================
 # Mutations
@@ -80,20 +189,39 @@ class CreateCustomer(graphene.Mutation):
         customer.save()
         return CreateCustomer(customer=customer, message="Customer created successfully")
 
+PHONE_REGEX = r"^\+?\d{7,15}$|^\d{3}-\d{3}-\d{4}$"
+BULK_PHONE_VALIDATOR = RegexValidator(regex=PHONE_REGEX, message="Invalid phone format.")
+BULK_CREATE_CHUNK_SIZE = 500
+
+
+class RowError(graphene.ObjectType):
+    index = graphene.Int()
+    message = graphene.String()
+
+
 class BulkCreateCustomers(graphene.Mutation):
     class Arguments:
         customers = graphene.List(graphene.JSONString, required=True)
+        return_objects = graphene.Boolean(default_value=True)
 
     customers = graphene.List(CustomerNode)
+    ids = graphene.List(graphene.ID)
+    created_count = graphene.Int()
     errors = graphene.List(graphene.String)
+    row_errors = graphene.List(RowError)
 
     @transaction.atomic
-    def mutate(self, info, customers):
-        created_customers = []
-        errors = []
+    def mutate(self, info, customers, return_objects=True):
+        row_errors = []
+        pending = []
+        seen_emails = set()
 
-        for entry in customers:
+        # Validate every row in memory first; nothing touches the database yet.
+        for index, entry in enumerate(customers):
             try:
+                if not isinstance(entry, dict):
+                    raise ValidationError("Each customer must be an object.")
+
                 name = entry.get("name")
                 email = entry.get("email")
                 phone = entry.get("phone")
@@ -101,24 +229,50 @@ class BulkCreateCustomers(graphene.Mutation):
                 if not name or not email:
                     raise ValidationError("Name and email are required.")
 
-                if Customer.objects.filter(email=email).exists():
-                    raise ValidationError(f"Email already exists: {email}")
+                if email in seen_emails:
+                    raise ValidationError(f"Duplicate email in batch: {email}")
 
                 if phone:
-                    validator = RegexValidator(
-                        regex=r"^\+?\d{7,15}$|^\d{3}-\d{3}-\d{4}$",
-                        message="Invalid phone format."
-                    )
-                    validator(phone)
+                    BULK_PHONE_VALIDATOR(phone)
 
-                customer = Customer(name=name, email=email, phone=phone)
-                customer.save()
-                created_customers.append(customer)
+            except ValidationError as e:
+                row_errors.append(RowError(index=index, message=" ".join(e.messages)))
+                continue
+
+            seen_emails.add(email)
+            pending.append((index, Customer(name=name, email=email, phone=phone or "")))
+
+        # One IN lookup and one bulk INSERT per chunk.
+        created_customers = []
+        for start in range(0, len(pending), BULK_CREATE_CHUNK_SIZE):
+            chunk = pending[start:start + BULK_CREATE_CHUNK_SIZE]
+            existing = set(
+                Customer.objects
+                .filter(email__in=[customer.email for _, customer in chunk])
+                .values_list("email", flat=True)
+            )
+            new_customers = []
+            for index, customer in chunk:
+                if customer.email in existing:
+                    row_errors.append(
+                        RowError(index=index, message=f"Email already exists: {customer.email}")
+                    )
+                else:
+                    new_customers.append(customer)
+            created_customers.extend(Customer.objects.bulk_create(new_customers))
 
-            except Exception as e:
-                errors.append(str(e))
+        # bulk_create sends no post_save signals.
+        if created_customers:
+            invalidate(Customer)
 
-        return BulkCreateCustomers(customers=created_customers, errors=errors)
+        row_errors.sort(key=lambda error: error.index)
+        return BulkCreateCustomers(
+            customers=created_customers if return_objects else None,
+            ids=[graphene.relay.Node.to_global_id(CustomerNode._meta.name, c.pk) for c in created_customers],
+            created_count=len(created_customers),
+            errors=[error.message for error in row_errors],
+            row_errors=row_errors,
+        )
 
 
 class CreateProduct(graphene.Mutation):
@@ -157,56 +311,215 @@ class CreateOrder(graphene.Mutation):
         if not product_ids:
             raise Exception("At least one product must be selected.")
 
-        products = Product.objects.filter(id__in=product_ids)
-        if products.count() != len(product_ids):\n            raise Exception("One or more product IDs are invalid.")
+        try:
+            ids = [int(pid) for pid in product_ids]
+        except (TypeError, ValueError):
+            raise Exception("One or more product IDs are invalid.")
+        if len(set(ids)) != len(ids):
+            raise Exception("One or more product IDs are invalid.")
+
+        # A fixed number of statements whatever the number of products.
+        with transaction.atomic():
+            stats = Product.objects.filter(pk__in=ids).aggregate(count=Count("pk"), total=Sum("price"))
+            if stats["count"] != len(ids):
+                raise Exception("One or more product IDs are invalid.")
+
+            # Conditional decrement: a product another order just emptied is
+            # not matched, so the count comes up short and the order rolls back
+            # instead of overselling.
+            reserved = Product.objects.filter(pk__in=ids, stock__gt=0).update(stock=F("stock") - 1)
+            if reserved != len(ids):
+                raise Exception("One or more products are out of stock.")
+
+            # SQLite sums decimals as floats, so round back to cents.
+            order = Order(customer=customer, total_amount=stats["total"].quantize(CENTS))
+            order.save()
+            through = Order.products.through
+            through.objects.bulk_create([through(order_id=order.pk, product_id=pid) for pid in ids])
+            Customer.objects.filter(pk=customer.pk).update(last_order_at=order.order_date)
+            customer.last_order_at = order.order_date
+            # update() and bulk_create() bypass the model signals.
+            invalidate(Product, Order, Customer)
+        return CreateOrder(order=order)
 
-        total_amount = sum([p.price for p in products])
 
-        order = Order(customer=customer, total_amount=total_amount)
-        order.save()
-        order.products.set(products)
-        return CreateOrder(order=order)
+class BulkOrderInput(graphene.InputObjectType):
+    customer_id = graphene.ID()
+    customer_email = graphene.String()
+    product_ids = graphene.List(graphene.ID, required=True)
+    order_date = graphene.DateTime()
+
+
+class BulkCreateOrders(graphene.Mutation):
+    """
+    Create many orders through crm.order_import, the code path shared with
+    the import_orders command: a fixed number of statements per chunk of
+    rows, with invalid rows reported in row_errors instead of failing the
+    batch. reserveStock takes stock as CreateOrder does; turn it off for
+    historical orders.
+    """
+
+    class Arguments:
+        orders = graphene.List(BulkOrderInput, required=True)
+        reserve_stock = graphene.Boolean(default_value=True)
+        return_objects = graphene.Boolean(default_value=True)
+
+    orders = graphene.List(OrderNode)
+    ids = graphene.List(graphene.ID)
+    created_count = graphene.Int()
+    errors = graphene.List(graphene.String)
+    row_errors = graphene.List(RowError)
+
+    @transaction.atomic
+    def mutate(self, info, orders, reserve_stock=True, return_objects=True):
+        created_orders = []
+        row_errors = []
+        for result in import_orders(orders, reserve_stock=reserve_stock):
+            created_orders.extend(result.orders)
+            row_errors.extend(RowError(index=index, message=message) for index, message in result.errors)
+
+        return BulkCreateOrders(
+            orders=created_orders if return_objects else None,
+            ids=[graphene.relay.Node.to_global_id(OrderNode._meta.name, o.pk) for o in created_orders],
+            created_count=len(created_orders),
+            errors=[error.message for error in row_errors],
+            row_errors=row_errors,
+        )
+
+
+RESTOCK_CHUNK_SIZE = 1000
 
 
 class UpdateLowStockProducts(graphene.Mutation):
     class Arguments:
-        # No arguments needed, as it queries based on internal logic (stock < 10)
-        pass
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
 
     products = graphene.List(ProductNode)
     message = graphene.String()
 
-    def mutate(self, info):
+    def mutate(self, info, threshold=10, increment=10):
+        if threshold < 0:
+            raise Exception("threshold cannot be negative")
+        if increment <= 0:
+            raise Exception("increment must be positive")
+
+        # Walk the matching products in primary-key order, a page of
+        # RESTOCK_CHUNK_SIZE at a time, so each UPDATE stays short and gaps
+        # in the key space cost nothing.
         updated_products = []
-        low_stock_products = Product.objects.filter(stock__lt=10)
+        last_pk = 0
+        while page := UpdateLowStockProducts.restock_page(last_pk, threshold, increment):
+            updated_products.extend(page)
+            last_pk = page[-1].pk
 
-        if not low_stock_products.exists():
+        if not updated_products:
             return UpdateLowStockProducts(products=[], message="No low stock products found to update.")
 
-        for product in low_stock_products:
-            product.stock += 10 # Increment stock by 10
-            product.save()
-            updated_products.append(product)
-
+        invalidate(Product)
         message = f"Successfully restocked {len(updated_products)} products."
         return UpdateLowStockProducts(products=updated_products, message=message)
 
+    @staticmethod
+    def restock_page(after, threshold, increment):
+        """
+        Add ``increment`` to the next RESTOCK_CHUNK_SIZE products after
+        primary key ``after`` whose stock is below ``threshold`` and return
+        the updated rows in primary-key order. The increment is an F()-style
+        ``stock = stock + n`` in SQL, so concurrent orders are never
+        overwritten.
+        """
+        if connection.vendor in ("postgresql", "sqlite") and connection.features.can_return_columns_from_insert:
+            opts = Product._meta
+            qn = connection.ops.quote_name
+            table = qn(opts.db_table)
+            stock = qn(opts.get_field("stock").column)
+            pk = qn(opts.pk.column)
+            # The outer stock test skips rows a concurrent restock already
+            # topped up after the page was selected.
+            sql = (
+                f"UPDATE {table} SET {stock} = {stock} + %s "
+                f"WHERE {stock} < %s AND {pk} IN ("
+                f"SELECT {pk} FROM {table} WHERE {stock} < %s AND {pk} > %s ORDER BY {pk} LIMIT %s"
+                f") RETURNING {', '.join(qn(f.column) for f in opts.concrete_fields)}"
+            )
+            with transaction.atomic():
+                rows = Product.objects.raw(sql, [increment, threshold, threshold, after, RESTOCK_CHUNK_SIZE])
+                return sorted(rows, key=lambda product: product.pk)
+
+        # No UPDATE ... RETURNING: lock the page, update it, then read it back.
+        with transaction.atomic():
+            ids = list(
+                Product.objects.select_for_update()
+                .filter(pk__gt=after, stock__lt=threshold)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:RESTOCK_CHUNK_SIZE]
+            )
+            if not ids:
+                return []
+            Product.objects.filter(pk__in=ids).update(stock=F("stock") + increment)
+            return list(Product.objects.filter(pk__in=ids).order_by("pk"))
+
 
 # ###############
 # ROOT TYPES
 # ##############
 
+def crm_stats_aggregates(order_date_gte=None, order_date_lte=None):
+    # Single statement: customers LEFT JOIN orders, aggregated in SQL.
+    # The date range applies to orders; every customer is counted.
+    in_range = Q()
+    if order_date_gte:
+        in_range &= Q(orders__order_date__gte=order_date_gte)
+    if order_date_lte:
+        in_range &= Q(orders__order_date__lte=order_date_lte)
+    return {
+        "customer_count": Count("id", distinct=True),
+        "order_count": Count("orders", filter=in_range),
+        "total_revenue": Sum("orders__total_amount", filter=in_range, default=0),
+    }
+
+
+def sales_limit(info, first):
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    if first < 0 or (max_limit and first > max_limit):
+        raise GraphQLError(f"`first` on `{info.field_name}` must be between 0 and {max_limit}.")
+    return first
+
+
 class Query(graphene.ObjectType):
     customer = graphene.relay.Node.Field(CustomerNode)
-    all_customers = DjangoFilterConnectionField(CustomerNode, order_by=graphene.List(of_type=graphene.String))
+    all_customers = CRMFilterConnectionField(CustomerNode, order_by=graphene.List(of_type=graphene.String))
 
     product = graphene.relay.Node.Field(ProductNode)
-    all_products = DjangoFilterConnectionField(ProductNode, order_by=graphene.List(of_type=graphene.String))
+    all_products = CRMFilterConnectionField(ProductNode, order_by=graphene.List(of_type=graphene.String))
 
     order = graphene.relay.Node.Field(OrderNode)
-    all_orders = DjangoFilterConnectionField(OrderNode, order_by=graphene.List(of_type=graphene.String))
-
-    all_orders_for_customers_less_than_year = DjangoFilterConnectionField(OrderNode, order_by=graphene.List(of_type=graphene.String))
+    all_orders = CRMFilterConnectionField(OrderNode, order_by=graphene.List(of_type=graphene.String))
+
+    all_orders_for_customers_less_than_year = CRMFilterConnectionField(OrderNode, order_by=graphene.List(of_type=graphene.String))
+
+    # Seek-paginated variants: cursors carry the sort key, not an offset.
+    all_customers_keyset = KeysetConnectionField(CustomerNode)
+    all_products_keyset = KeysetConnectionField(ProductNode)
+    all_orders_keyset = KeysetConnectionField(OrderNode, sort_key=("order_date", "id"))
+
+    crm_stats = graphene.Field(
+        CRMStats,
+        order_date_gte=graphene.DateTime(),
+        order_date_lte=graphene.DateTime(),
+    )
+
+    # Read from the rollup tables kept by crm.rollups: the cost grows with
+    # the number of days, customers or products returned, not with orders.
+    sales_by_period = graphene.List(
+        PeriodSales,
+        period=SalesPeriod(default_value=SalesPeriod.DAY.value),
+        date_gte=graphene.Date(),
+        date_lte=graphene.Date(),
+    )
+    top_customers = graphene.List(CustomerSalesTotal, first=graphene.Int(default_value=10))
+    top_products = graphene.List(ProductSalesTotal, first=graphene.Int(default_value=10))
 
     # Add ordering logic
     def resolve_all_customers(self, info, order_by=None, **kwargs):
@@ -227,6 +540,43 @@ class Query(graphene.ObjectType):
             qs = qs.order_by(*order_by)
         return qs
 
+    def resolve_crm_stats(self, info, order_date_gte=None, order_date_lte=None):
+        return CRMStats(**Customer.objects.aggregate(**crm_stats_aggregates(order_date_gte, order_date_lte)))
+
+    def resolve_sales_by_period(self, info, period=SalesPeriod.DAY.value, date_gte=None, date_lte=None):
+        # The date range selects days, so the first and last week or month
+        # may be partial.
+        days = DailySales.objects.exclude(order_count=0)
+        if date_gte:
+            days = days.filter(day__gte=date_gte)
+        if date_lte:
+            days = days.filter(day__lte=date_lte)
+        rows = (
+            days.annotate(period=Trunc("day", getattr(period, "value", period)))
+            .values("period")
+            .annotate(order_count=Sum("order_count"), revenue=Sum("revenue"))
+            .order_by("period")
+        )
+        # SQLite sums decimals as floats; round back to cents.
+        return [
+            PeriodSales(period=row["period"], order_count=row["order_count"], revenue=round(row["revenue"], 2))
+            for row in rows
+        ]
+
+    def resolve_top_customers(self, info, first=10):
+        return (
+            CustomerSales.objects.exclude(order_count=0)
+            .select_related("customer")
+            .order_by("-revenue", "pk")[: sales_limit(info, first)]
+        )
+
+    def resolve_top_products(self, info, first=10):
+        return (
+            ProductSales.objects.exclude(units=0)
+            .select_related("product")
+            .order_by("-units", "pk")[: sales_limit(info, first)]
+        )
+
     def resolve_all_orders_less_than_year(self, info, order_by=None, **kwargs):
         print(order_by)
         qs = Order.objects.all()
@@ -235,9 +585,65 @@ class Query(graphene.ObjectType):
         return qs
 
 
+async def aget_node(node_type, info, global_id):
+    # Same parsing and errors as relay.Node.Field on the sync schema.
+    type_name, pk = graphene.relay.Node.resolve_global_id(info, global_id)
+    if type_name != node_type._meta.name:
+        raise GraphQLError(f"Must receive a {node_type._meta.name} id.")
+    model = node_type._meta.model
+    try:
+        return await optimize_object_queryset(model.objects.all(), info).aget(pk=pk)
+    except (model.DoesNotExist, ValueError):
+        return None
+
+
+class AsyncQuery(graphene.ObjectType):
+    """
+    Read-only root for the async endpoint. Each resolver is a coroutine on
+    the async ORM, so independent root fields of one operation are fetched
+    concurrently.
+    """
+
+    class Meta:
+        name = "Query"
+
+    customer = graphene.Field(CustomerNode, id=graphene.ID(required=True))
+    all_customers = AsyncFilterConnectionField(CustomerNode, order_by=graphene.List(of_type=graphene.String))
+
+    product = graphene.Field(ProductNode, id=graphene.ID(required=True))
+    all_products = AsyncFilterConnectionField(ProductNode, order_by=graphene.List(of_type=graphene.String))
+
+    order = graphene.Field(OrderNode, id=graphene.ID(required=True))
+    all_orders = AsyncFilterConnectionField(OrderNode, order_by=graphene.List(of_type=graphene.String))
+
+    crm_stats = graphene.Field(
+        CRMStats,
+        order_date_gte=graphene.DateTime(),
+        order_date_lte=graphene.DateTime(),
+    )
+
+    resolve_all_customers = Query.resolve_all_customers
+    resolve_all_products = Query.resolve_all_products
+    resolve_all_orders = Query.resolve_all_orders
+
+    async def resolve_customer(self, info, id):
+        return await aget_node(CustomerNode, info, id)
+
+    async def resolve_product(self, info, id):
+        return await aget_node(ProductNode, info, id)
+
+    async def resolve_order(self, info, id):
+        return await aget_node(OrderNode, info, id)
+
+    async def resolve_crm_stats(self, info, order_date_gte=None, order_date_lte=None):
+        stats = await Customer.objects.aaggregate(**crm_stats_aggregates(order_date_gte, order_date_lte))
+        return CRMStats(**stats)
+
+
 class Mutation(graphene.ObjectType):
     create_customer = CreateCustomer.Field()
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()
+    bulk_create_orders = BulkCreateOrders.Field()
     update_low_stock_products = UpdateLowStockProducts.Field()
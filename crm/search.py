@@ -0,0 +1,61 @@
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+# model label -> (FTS5 table, indexed columns). The tables are created by
+# migration 0003 on SQLite only and kept in sync by triggers, so bulk_create,
+# update() and raw SQL writes are indexed as well as save().
+FTS_INDEXES = {
+    "crm.customer": ("crm_customer_fts", ("name", "email")),
+    "crm.product": ("crm_product_fts", ("name",)),
+}
+
+_available = {}
+
+
+def fts_available(alias, table):
+    key = (alias, table)
+    if key not in _available:
+        connection = connections[alias]
+        _available[key] = (
+            connection.vendor == "sqlite"
+            and table in connection.introspection.table_names()
+        )
+    return _available[key]
+
+
+def like_pattern(value):
+    """
+    ``%value%`` plus the ESCAPE clause it needs. FTS5 only uses the trigram
+    index for a LIKE without ESCAPE, so the clause is added only when the
+    value contains a wildcard character.
+    """
+    if not any(c in value for c in "\\%_"):
+        return f"%{value}%", ""
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%", " ESCAPE '\\'"
+
+
+def search(queryset, field_name, value):
+    """
+    ``<field_name>__icontains=value`` answered from the FTS5 trigram index
+    when the target column has one; any other backend (or a missing index)
+    falls back to the plain icontains lookup.
+    """
+    if not value:
+        return queryset
+
+    *path, column = field_name.split("__")
+    model = queryset.model
+    for name in path:
+        model = model._meta.get_field(name).related_model
+
+    index = FTS_INDEXES.get(model._meta.label_lower)
+    if index is None or column not in index[1] or not fts_available(queryset.db, index[0]):
+        return queryset.filter(**{f"{field_name}__icontains": value})
+
+    table, _ = index
+    qn = connections[queryset.db].ops.quote_name
+    pattern, escape = like_pattern(value)
+    rowids = RawSQL(f"SELECT rowid FROM {qn(table)} WHERE {qn(column)} LIKE %s{escape}", [pattern])
+    lookup = "__".join(path + ["in"]) if path else "pk__in"
+    return queryset.filter(**{lookup: rowids})
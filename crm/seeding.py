@@ -0,0 +1,188 @@
+import math
+import random
+from collections import namedtuple
+from decimal import Decimal
+from itertools import accumulate
+
+import django
+from django.db import transaction
+
+from crm.models import Customer, Order, Product
+
+# --scale presets: (customers, products, orders).
+SCALES = {
+    "tiny": (50, 20, 200),
+    "small": (2_000, 200, 10_000),
+    "medium": (100_000, 10_000, 1_000_000),
+    "large": (1_000_000, 100_000, 10_000_000),
+}
+
+FIRST_NAMES = [
+    "Alice", "Bob", "Carol", "David", "Emma", "Farah", "George", "Hana", "Ivan", "Julia",
+    "Kwame", "Laura", "Mateo", "Nadia", "Omar", "Priya", "Quentin", "Rosa", "Samuel", "Tariq",
+    "Uma", "Victor", "Wanjiru", "Xavier", "Yara", "Zane",
+]
+LAST_NAMES = [
+    "Adams", "Banda", "Chen", "Diallo", "Evans", "Fischer", "Garcia", "Haddad", "Ibrahim",
+    "Johnson", "Kim", "Lopez", "Mensah", "Novak", "Okafor", "Patel", "Rossi", "Silva",
+    "Tanaka", "Usman", "Varga", "Walker", "Yilmaz", "Zhang",
+]
+ADJECTIVES = [
+    "Compact", "Deluxe", "Eco", "Ergonomic", "Portable", "Premium", "Pro", "Rugged",
+    "Smart", "Ultra", "Wireless", "Classic",
+]
+NOUNS = [
+    "Laptop", "Phone", "Tablet", "Monitor", "Keyboard", "Mouse", "Headphones", "Speaker",
+    "Camera", "Charger", "Router", "Watch", "Printer", "Desk Lamp", "Backpack",
+]
+
+# Products per order: 1 to 8, most orders small.
+PRODUCTS_PER_ORDER = range(1, 9)
+PRODUCTS_PER_ORDER_CUM_WEIGHTS = list(accumulate([40, 25, 14, 8, 5, 4, 2, 2]))
+
+# One unit of work: ``count`` rows of ``kind`` with primary keys from
+# ``first_pk``. ``plan`` carries what every job of a run shares.
+Job = namedtuple("Job", ["kind", "index", "first_pk", "count", "plan"])
+Plan = namedtuple(
+    "Plan",
+    ["seed", "start", "until", "customers", "first_customer_pk", "products", "first_product_pk"],
+)
+
+
+def job_random(plan, kind, index):
+    """Per-job generator: the output does not depend on how jobs are spread over workers."""
+    return random.Random(f"{plan.seed}:{kind}:{index}")
+
+
+def signup_time(plan, offset):
+    """Customers sign up in primary-key order, evenly over the first half of the range."""
+    span = (plan.until - plan.start) / 2
+    return plan.start + span * (offset / max(plan.customers, 1))
+
+
+def product_rows(job):
+    rng = job_random(job.plan, "product", job.index)
+    for pk in range(job.first_pk, job.first_pk + job.count):
+        # Log-normal prices: mostly tens of dollars, a long tail of expensive items.
+        price = min(max(math.exp(rng.gauss(3.5, 1.1)), 0.99), 99_999)
+        yield Product(
+            pk=pk,
+            name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.randint(100, 999)}",
+            price=Decimal(f"{price:.2f}"),
+            stock=rng.choice((0, rng.randint(1, 20), rng.randint(20, 500))),
+        )
+
+
+def customer_rows(job):
+    rng = job_random(job.plan, "customer", job.index)
+    first_pk = job.plan.first_customer_pk
+    for pk in range(job.first_pk, job.first_pk + job.count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield Customer(
+            pk=pk,
+            name=f"{first} {last}",
+            email=f"{first}.{last}.{pk}@example.com".lower(),
+            phone=rng.choice(("", f"+1{rng.randint(2_000_000_000, 9_999_999_999)}")),
+            created_at=signup_time(job.plan, pk - first_pk),
+        )
+
+
+_prices = {}
+
+
+def product_prices(plan):
+    """Prices of the run's products by offset, loaded once per worker process."""
+    key = (plan.first_product_pk, plan.products)
+    if key not in _prices:
+        rows = Product.objects.filter(
+            pk__gte=plan.first_product_pk, pk__lt=plan.first_product_pk + plan.products
+        ).values_list("pk", "price")
+        prices = [Decimal(0)] * plan.products
+        for pk, price in rows:
+            prices[pk - plan.first_product_pk] = price
+        _prices.clear()
+        _prices[key] = prices
+    return _prices[key]
+
+
+def order_rows(job):
+    """
+    Yield (order, product ids). Long-standing customers and popular products
+    are picked more often, and order dates lean towards the recent end of
+    each customer's lifetime.
+    """
+    plan = job.plan
+    rng = job_random(plan, "order", job.index)
+    prices = product_prices(plan)
+    for pk in range(job.first_pk, job.first_pk + job.count):
+        offset = int(plan.customers * rng.random() ** 1.5)
+        signed_up = signup_time(plan, offset)
+        order_date = signed_up + (plan.until - signed_up) * rng.random() ** 0.5
+
+        size = rng.choices(PRODUCTS_PER_ORDER, cum_weights=PRODUCTS_PER_ORDER_CUM_WEIGHTS)[0]
+        picked = set()
+        while len(picked) < min(size, plan.products):
+            picked.add(int(plan.products * rng.random() ** 3))
+
+        order = Order(
+            pk=pk,
+            customer_id=plan.first_customer_pk + offset,
+            total_amount=sum((prices[p] for p in picked), Decimal(0)),
+            order_date=order_date,
+        )
+        yield order, sorted(plan.first_product_pk + p for p in picked)
+
+
+def generate_rows(job):
+    """Build one job's model instances without touching the database, so workers can run it."""
+    if job.kind == "product":
+        return list(product_rows(job))
+    if job.kind == "customer":
+        return list(customer_rows(job))
+    return list(order_rows(job))
+
+
+def insert_rows(job, rows):
+    """Insert one job's rows in its own transaction. Returns rows written per table."""
+    if job.kind == "product":
+        with transaction.atomic():
+            Product.objects.bulk_create(rows, batch_size=job.count)
+        return {"products": job.count}
+
+    if job.kind == "customer":
+        with transaction.atomic():
+            Customer.objects.bulk_create(rows, batch_size=job.count)
+        return {"customers": job.count}
+
+    Through = Order.products.through
+    orders = [order for order, _ in rows]
+    links = [Through(order_id=order.pk, product_id=pk) for order, product_ids in rows for pk in product_ids]
+    with transaction.atomic():
+        Order.objects.bulk_create(orders, batch_size=job.count)
+        # Straight into the through table: Order.products.add() would
+        # re-query existing links and send m2m_changed for every order.
+        Through.objects.bulk_create(links, batch_size=job.count)
+    return {"orders": len(orders), "order products": len(links)}
+
+
+def run_job(job):
+    return insert_rows(job, generate_rows(job))
+
+
+def init_worker(plan, prices):
+    """
+    ProcessPoolExecutor initializer. Workers only generate rows, so the
+    parent hands them the product prices instead of letting them query.
+    """
+    django.setup()
+    if prices is not None:
+        _prices.clear()
+        _prices[(plan.first_product_pk, plan.products)] = prices
+
+
+def plan_jobs(kind, total, first_pk, chunk_size, plan):
+    return [
+        Job(kind, index, first_pk + start, min(chunk_size, total - start), plan)
+        for index, start in enumerate(range(0, total, chunk_size))
+    ]
+
@@ -0,0 +1,27 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from crm.models import Customer, Order, Product
+from crm.response_cache import invalidate
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+def invalidate_on_save(sender, **kwargs):
+    invalidate(sender)
+
+
+# Order has no post_delete receiver on purpose: that would stop Django from
+# fast-deleting orders when customers are purged. Deleting a customer or a
+# product invalidates orders as well, which covers the cascade; direct and
+# queryset deletes of orders invalidate in Order.delete and OrderQuerySet.
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+def invalidate_on_delete(sender, **kwargs):
+    invalidate(sender, Order)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_on_order_products_changed(sender, **kwargs):
+    invalidate(Order, Product)
@@ -1,12 +1,11 @@
 import os
 from datetime import datetime
+from decimal import Decimal
 from celery import shared_task
-from gql import Client, gql
-from gql.transport.requests import RequestsHTTPTransport
-import requests
+from gql import gql
+
+from crm.graphql_client import execute
 
-# Define the GraphQL endpoint
-GRAPHQL_ENDPOINT = "http://localhost:8000/graphql"
 LOG_FILE_PATH = "/tmp/crm_report_log.txt"
 
 @shared_task
@@ -18,40 +17,26 @@ def generate_crm_report():
     current_timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     try:
-        transport = RequestsHTTPTransport(url=GRAPHQL_ENDPOINT, verify=False, retries=3)
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-
-        # GraphQL query to fetch report data
-        # Assuming you have fields like `customerCount`, `orderCount`, `totalRevenue`
-        # in your GraphQL schema's Query type.
-        # If not, you'll need to create resolvers for these in crm/schema.py.
+        # crmStats aggregates in a single SQL statement on the server, so the
+        # report no longer downloads every order.
         query = gql(
             """
             query CrmReport {
-                allCustomers {
-                    totalCount
-                }
-                allOrders {
-                    totalCount
-                    edges {
-                        node {
-                            totalAmount
-                        }
-                    }
+                crmStats {
+                    customerCount
+                    orderCount
+                    totalRevenue
                 }
             }
             """
         )
 
-        result = client.execute(query)
-
-        customer_count = result.get('allCustomers', {}).get('totalCount', 0)
-        order_count = result.get('allOrders', {}).get('totalCount', 0)
+        result = execute(query)
 
-        total_revenue = 0
-        order_edges = result.get('allOrders', {}).get('edges', [])
-        for edge in order_edges:
-            total_revenue += edge.get('node', {}).get('totalAmount', 0)
+        stats = result.get('crmStats') or {}
+        customer_count = stats.get('customerCount', 0)
+        order_count = stats.get('orderCount', 0)
+        total_revenue = Decimal(stats.get('totalRevenue') or 0)
 
         report_message = (
             f"{current_timestamp} - Report: {customer_count} customers, "
@@ -1,3 +1,1209 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import tempfile
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from gql import gql
+from gql.transport.exceptions import TransportQueryError
+from graphene.relay import Node
+from graphene_django.utils.testing import GraphQLTestCase
+from graphql import GraphQLError
+
+from crm import graphql_client, rollups
+from crm.benchmarks import OPERATIONS, dataset_fixtures
+from crm.checks import check_response_cache_is_shared, check_rollup_triggers
+from crm.loaders import Loaders
+from crm.management.commands import purge_inactive_customers, send_order_reminders
+from crm.management.commands.benchmark_operations import DATASET_SEED, DATASET_UNTIL, TRANSACTION_STATEMENTS
+from crm.models import Customer, CustomerSales, DailySales, Order, OrderReminder, Product, ProductSales
+from crm.order_import import import_orders
+from crm.reminders import claim_reminders, mark_sent, release
+from crm.response_cache import DjangoCacheBackend, response_cache
+from crm.search import search
+from crm.views import CachedGraphQLView, DocumentCache, query_hash
+
+
+def make_catalog(customers=2, products=3):
+    customers = [
+        Customer.objects.create(name=f"Customer {i}", email=f"customer{i}@example.com")
+        for i in range(customers)
+    ]
+    products = [
+        Product.objects.create(name=f"Product {i}", price=Decimal("10.00") + i, stock=100)
+        for i in range(products)
+    ]
+    return customers, products
+
+
+def make_orders(customer, products, count, amount="10.00"):
+    orders = []
+    for _ in range(count):
+        order = Order.objects.create(customer=customer, total_amount=Decimal(amount))
+        order.products.set(products)
+        orders.append(order)
+    return orders
+
+
+class CRMTestCase(GraphQLTestCase):
+    GRAPHQL_URL = "/graphql"
+
+    def setUp(self):
+        # The response cache lives for the whole process, and invalidation
+        # waits for commits that never happen inside a test.
+        response_cache.backend.clear()
+
+    def execute(self, query, variables=None):
+        response = self.query(query, variables=variables)
+        self.assertResponseNoErrors(response)
+        return response.json()["data"]
+
+
+class LoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (cls.alice, cls.bob), cls.products = make_catalog()
+        cls.orders = make_orders(cls.alice, cls.products, 3) + make_orders(cls.bob, cls.products[:1], 2)
+
+    def test_queued_keys_load_in_one_batch(self):
+        loaders = Loaders()
+        orders = list(Order.objects.order_by("pk"))
+        loaders.queue(orders)
+        with self.assertNumQueries(1):
+            customers = [loaders.customer.load(order.customer_id) for order in orders]
+        self.assertEqual([customer.pk for customer in customers], [order.customer_id for order in orders])
+
+        with self.assertNumQueries(1):
+            products = [loaders.order_products.load(order.pk) for order in orders]
+        self.assertEqual([len(rows) for rows in products], [3, 3, 3, 1, 1])
+
+    def test_relation_rows_are_limited_per_parent(self):
+        loaders = Loaders()
+        loaders.queue([self.alice, self.bob])
+        with self.assertNumQueries(1):
+            alice = loaders.customer_orders.load(self.alice.pk, 2)
+            bob = loaders.customer_orders.load(self.bob.pk, 2)
+        self.assertEqual(alice, self.orders[:2])
+        self.assertEqual(bob, self.orders[3:5])
+
+        with self.assertNumQueries(1):
+            totals = [loaders.customer_order_counts.load(pk) for pk in (self.alice.pk, self.bob.pk)]
+        self.assertEqual(totals, [3, 2])
+
+    def test_loaded_rows_queue_their_own_relations(self):
+        loaders = Loaders()
+        loaders.queue([self.products[0]])
+        orders = loaders.product_orders.load(self.products[0].pk)
+        self.assertEqual(len(orders), 5)
+        with self.assertNumQueries(1):
+            for order in orders:
+                loaders.customer.load(order.customer_id)
+
+
+class NestedConnectionTests(CRMTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (cls.alice, cls.bob), cls.products = make_catalog()
+        cls.alice_orders = make_orders(cls.alice, cls.products[:1], 7)
+        cls.bob_orders = make_orders(cls.bob, cls.products[:2], 3)
+
+    def test_page_per_parent_with_grouped_total(self):
+        query = """
+            {
+                allCustomers(first: 2) {
+                    edges { node { orders(first: 2) { totalCount pageInfo { hasNextPage } edges { node { id } } } } }
+                }
+            }
+        """
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(query)
+        # The page, the windowed prefetch and one COUNT for both customers.
+        self.assertEqual(len(queries), 3)
+        self.assertIn("ROW_NUMBER", queries[1]["sql"])
+
+        alice, bob = (edge["node"]["orders"] for edge in data["allCustomers"]["edges"])
+        self.assertEqual(alice["totalCount"], 7)
+        self.assertTrue(alice["pageInfo"]["hasNextPage"])
+        self.assertEqual(
+            [edge["node"]["id"] for edge in alice["edges"]],
+            [Node.to_global_id("OrderNode", order.pk) for order in self.alice_orders[:2]],
+        )
+        self.assertEqual(bob["totalCount"], 3)
+
+    def test_after_cursor_reads_past_the_window(self):
+        query = """
+            query Orders($after: String) {
+                allProducts(first: 1) {
+                    edges { node { orders(first: 3, after: $after) { edges { cursor node { id } } } } }
+                }
+            }
+        """
+
+        def page(after=None):
+            data = self.execute(query, {"after": after})
+            return data["allProducts"]["edges"][0]["node"]["orders"]["edges"]
+
+        first = page()
+        second = page(first[-1]["cursor"])
+        # The first product is on every order, in primary-key order.
+        orders = sorted(self.alice_orders + self.bob_orders, key=lambda order: order.pk)
+        self.assertEqual(
+            [edge["node"]["id"] for edge in first + second],
+            [Node.to_global_id("OrderNode", order.pk) for order in orders[:6]],
+        )
+
+    def test_filtered_nested_connection(self):
+        Order.objects.filter(pk=self.alice_orders[-1].pk).update(total_amount=Decimal("50.00"))
+        data = self.execute(
+            """
+            { allCustomers(first: 1) { edges { node { orders(first: 5, totalAmountGte: 20) { totalCount edges { node { id } } } } } } }
+            """
+        )
+        orders = data["allCustomers"]["edges"][0]["node"]["orders"]
+        self.assertEqual(orders["totalCount"], 1)
+        self.assertEqual(orders["edges"][0]["node"]["id"], Node.to_global_id("OrderNode", self.alice_orders[-1].pk))
+
+
+class AsyncNestedConnectionTests(CRMTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (cls.alice, cls.bob), cls.products = make_catalog()
+        make_orders(cls.alice, cls.products[:1], 3, amount="5.00")
+        cls.large = make_orders(cls.alice, cls.products[:1], 2, amount="25.00")
+        make_orders(cls.bob, cls.products[:1], 1, amount="25.00")
+
+    async def test_filtered_nested_connection_runs_off_the_event_loop(self):
+        response = await self.async_client.post(
+            "/graphql/async",
+            {
+                "query": """
+                    { allCustomers(first: 2) { edges { node {
+                        orders(first: 2, totalAmountGte: 10) { totalCount edges { node { id customer { name } } } }
+                    } } } }
+                """
+            },
+            content_type="application/json",
+        )
+        payload = response.json()
+        self.assertNotIn("errors", payload)
+        alice, bob = (edge["node"]["orders"] for edge in payload["data"]["allCustomers"]["edges"])
+        self.assertEqual(alice["totalCount"], 2)
+        self.assertEqual(
+            [edge["node"]["id"] for edge in alice["edges"]],
+            [Node.to_global_id("OrderNode", order.pk) for order in self.large],
+        )
+        self.assertEqual(bob["edges"][0]["node"]["customer"]["name"], "Customer 1")
+
+    async def test_prefetched_nested_total_count(self):
+        response = await self.async_client.post(
+            "/graphql/async",
+            {"query": "{ allCustomers(first: 2) { edges { node { orders(first: 1) { totalCount } } } } }"},
+            content_type="application/json",
+        )
+        payload = response.json()
+        self.assertNotIn("errors", payload)
+        totals = [edge["node"]["orders"]["totalCount"] for edge in payload["data"]["allCustomers"]["edges"]]
+        self.assertEqual(totals, [5, 1])
+
+
+class RecordingSender:
+    """Reminder sender for tests; fails for the order ids in ``fail``."""
+
+    sent = []
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+
+    def send(self, reminder):
+        if reminder.order_id in self.fail:
+            raise ConnectionError("mailbox unavailable")
+        self.sent.append(reminder.order_id)
+
+    def close(self):
+        pass
+
+
+class ReminderLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (customer,), products = make_catalog(customers=1, products=1)
+        cls.orders = make_orders(customer, products, 5)
+
+    def claim(self, run_id, chunk_size=2):
+        return list(claim_reminders(timezone.now() - timedelta(days=1), chunk_size, run_id, timedelta(hours=1)))
+
+    def test_claims_skip_orders_held_by_another_run(self):
+        other_run = uuid.uuid4()
+        OrderReminder.objects.create(order=self.orders[0], run_id=other_run, claimed_at=timezone.now())
+
+        run_id = uuid.uuid4()
+        reminders = self.claim(run_id)
+        self.assertEqual([r.order_id for r in reminders], [order.pk for order in self.orders[1:]])
+        self.assertEqual({r.run_id for r in reminders}, {run_id})
+        self.assertEqual(self.claim(uuid.uuid4()), [])
+
+    def test_expired_claims_are_released_and_reclaimed(self):
+        stale = uuid.uuid4()
+        OrderReminder.objects.create(
+            order=self.orders[0], run_id=stale, claimed_at=timezone.now() - timedelta(hours=2)
+        )
+        run_id = uuid.uuid4()
+        self.assertEqual(len(self.claim(run_id)), 5)
+        self.assertFalse(OrderReminder.objects.filter(run_id=stale).exists())
+
+    def test_mark_sent_and_release_only_touch_the_runs_own_claims(self):
+        run_id = uuid.uuid4()
+        mine, taken_over = self.claim(run_id)[:2]
+        # The lease on ``taken_over`` expired and another run claimed it.
+        other_run = uuid.uuid4()
+        OrderReminder.objects.filter(order_id=taken_over.order_id).update(run_id=other_run)
+
+        with self.assertNumQueries(1):
+            mark_sent([mine, taken_over])
+        release(taken_over)
+
+        self.assertIsNotNone(OrderReminder.objects.get(order_id=mine.order_id).sent_at)
+        reclaimed = OrderReminder.objects.get(order_id=taken_over.order_id)
+        self.assertEqual(reclaimed.run_id, other_run)
+        self.assertIsNone(reclaimed.sent_at)
+
+
+def sqlite_triggers(table):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s", [table])
+        return {name for name, in cursor.fetchall()}
+
+
+class SearchIndexTests(TestCase):
+    def test_index_follows_inserts_updates_and_deletes(self):
+        customer = Customer.objects.create(name="Ada Lovelace", email="ada@example.com")
+        Customer.objects.bulk_create([Customer(name="Grace Hopper", email="grace@example.com")])
+
+        def names(value):
+            return sorted(search(Customer.objects.all(), "name", value).values_list("name", flat=True))
+
+        self.assertEqual(names("lovelace"), ["Ada Lovelace"])
+        self.assertEqual(names("hopper"), ["Grace Hopper"])
+
+        Customer.objects.filter(pk=customer.pk).update(name="Ada Byron")
+        self.assertEqual(names("lovelace"), [])
+        self.assertEqual(names("byron"), ["Ada Byron"])
+
+        Customer.objects.filter(name="Grace Hopper").delete()
+        self.assertEqual(names("hopper"), [])
+
+
+class CustomerColumnsMigrationTests(TransactionTestCase):
+    before = [("crm", "0003_search_index")]
+    after = [("crm", "0004_customer_created_at_last_order_at")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_0004_keeps_search_triggers_and_backfills_last_order_at(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        customer = apps.get_model("crm", "Customer").objects.create(name="Ada", email="ada@example.com")
+        Order = apps.get_model("crm", "Order")
+        orders = [Order.objects.create(customer=customer) for _ in range(2)]
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        customer = apps.get_model("crm", "Customer").objects.get(pk=customer.pk)
+        self.assertEqual(customer.last_order_at, orders[-1].order_date)
+        if connection.vendor == "sqlite":
+            self.assertEqual(
+                sqlite_triggers("crm_customer"),
+                {"crm_customer_fts_ai", "crm_customer_fts_ad", "crm_customer_fts_au"},
+            )
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (cls.alice, cls.bob), cls.products = make_catalog()
+
+    def assertRollups(self, customers, units):
+        self.assertEqual(
+            {row.customer_id: (row.order_count, row.revenue) for row in CustomerSales.objects.filter(order_count__gt=0)},
+            customers,
+        )
+        self.assertEqual(
+            {row.product_id: row.units for row in ProductSales.objects.filter(units__gt=0)},
+            units,
+        )
+        day = DailySales.objects.get()
+        self.assertEqual(day.order_count, sum(count for count, _ in customers.values()))
+        self.assertEqual(day.revenue, sum(revenue for _, revenue in customers.values()))
+
+    def test_triggers_follow_order_writes(self):
+        first, second = make_orders(self.alice, self.products[:2], 2, amount="12.50")
+        make_orders(self.bob, self.products[:1], 1, amount="7.00")
+        a, b = self.alice.pk, self.bob.pk
+        p0, p1 = self.products[0].pk, self.products[1].pk
+        self.assertRollups({a: (2, Decimal("25.00")), b: (1, Decimal("7.00"))}, {p0: 3, p1: 2})
+
+        Order.objects.filter(pk=first.pk).update(customer=self.bob, total_amount=Decimal("20.00"))
+        second.products.remove(self.products[1])
+        self.assertRollups({a: (1, Decimal("12.50")), b: (2, Decimal("27.00"))}, {p0: 3, p1: 1})
+
+        Order.objects.filter(customer=self.bob).delete()
+        self.assertRollups({a: (1, Decimal("12.50"))}, {p0: 1})
+
+    def test_rebuild_matches_the_triggers(self):
+        make_orders(self.alice, self.products, 3, amount="3.30")
+        expected = list(CustomerSales.objects.values_list("customer_id", "order_count", "revenue"))
+        CustomerSales.objects.all().delete()
+        rollups.rebuild()
+        self.assertEqual(list(CustomerSales.objects.values_list("customer_id", "order_count", "revenue")), expected)
+
+    def test_check_reports_missing_triggers(self):
+        self.assertEqual(check_rollup_triggers(None, databases=["default"]), [])
+        rollups.drop_triggers(connection)
+        try:
+            errors = check_rollup_triggers(None, databases=["default"])
+        finally:
+            rollups.install_triggers(connection)
+        if connection.vendor in ("sqlite", "postgresql"):
+            self.assertEqual([error.id for error in errors], ["crm.E001"])
+
+
+class PurgeInactiveCustomersCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        customers, cls.products = make_catalog(customers=5)
+        cls.never, cls.lapsed, cls.active, cls.also_lapsed, cls.stale_flag = customers
+        long_ago = timezone.now() - timedelta(days=400)
+        for customer, when in (
+            (cls.lapsed, long_ago),
+            (cls.active, timezone.now()),
+            (cls.also_lapsed, long_ago),
+            # last_order_at is behind: the re-check against orders keeps it.
+            (cls.stale_flag, timezone.now()),
+        ):
+            (order,) = make_orders(customer, cls.products[:2], 1)
+            Order.objects.filter(pk=order.pk).update(order_date=when)
+        Customer.objects.filter(pk__in=[cls.lapsed.pk, cls.also_lapsed.pk, cls.stale_flag.pk]).update(
+            last_order_at=long_ago
+        )
+        Customer.objects.filter(pk=cls.active.pk).update(last_order_at=timezone.now())
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, "purge.checkpoint")
+        self.log_file = os.path.join(directory.name, "purge.log")
+
+    def purge(self, **options):
+        stdout = StringIO()
+        call_command(
+            "purge_inactive_customers", checkpoint=self.checkpoint, log_file=self.log_file, stdout=stdout, **options
+        )
+        return stdout.getvalue()
+
+    def remaining(self):
+        return set(Customer.objects.values_list("pk", flat=True))
+
+    def test_dry_run_deletes_nothing(self):
+        everyone = self.remaining()
+        output = self.purge(dry_run=True, batch_size=2)
+        self.assertIn("Would delete 3 inactive customers (2 orders).", output)
+        self.assertEqual(self.remaining(), everyone)
+        self.assertEqual(Order.objects.count(), 4)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        with mock.patch.object(purge_inactive_customers.time, "sleep", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.purge(batch_size=2, sleep=1)
+        self.assertEqual(self.remaining(), {self.active.pk, self.also_lapsed.pk, self.stale_flag.pk})
+        with open(self.checkpoint) as checkpoint_file:
+            self.assertEqual(json.load(checkpoint_file)["last_pk"], self.lapsed.pk)
+
+        output = self.purge(batch_size=2)
+        self.assertIn(f"Resuming from customer id {self.lapsed.pk}", output)
+        self.assertIn("Deleted 1 inactive customers (1 orders).", output)
+        self.assertEqual(self.remaining(), {self.active.pk, self.stale_flag.pk})
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_sales_rollups_match_a_rebuild_after_a_purge(self):
+        def rollup_rows():
+            return (
+                sorted(DailySales.objects.exclude(order_count=0).values_list("day", "order_count", "revenue")),
+                sorted(CustomerSales.objects.exclude(order_count=0).values_list("customer_id", "order_count", "revenue")),
+                sorted(ProductSales.objects.exclude(units=0).values_list("product_id", "units")),
+            )
+
+        self.purge(batch_size=2)
+        self.assertFalse(CustomerSales.objects.filter(customer__in=[self.lapsed, self.also_lapsed]).exists())
+        self.assertEqual(ProductSales.objects.get(product=self.products[0]).units, 2)
+        after_purge = rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(rollup_rows(), after_purge)
+
+
+class ResponseCacheTests(CRMTestCase):
+    query_text = "{ allCustomers(first: 5) { edges { node { name orders(first: 5) { totalCount } } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        (cls.customer,), products = make_catalog(customers=1, products=1)
+        cls.orders = make_orders(cls.customer, products, 3)
+
+    def order_total(self):
+        return self.execute(self.query_text)["allCustomers"]["edges"][0]["node"]["orders"]["totalCount"]
+
+    def test_repeated_query_is_served_from_the_cache(self):
+        self.assertEqual(self.order_total(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.order_total(), 3)
+
+    def test_saves_invalidate_on_commit(self):
+        self.order_total()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.name = "Renamed"
+            self.customer.save()
+        self.assertEqual(self.execute(self.query_text)["allCustomers"]["edges"][0]["node"]["name"], "Renamed")
+
+    def test_order_deletes_invalidate(self):
+        self.assertEqual(self.order_total(), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.orders[0].delete()
+        self.assertEqual(self.order_total(), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(pk=self.orders[1].pk).delete()
+        self.assertEqual(self.order_total(), 1)
+
+
+class DjangoCacheBackendTests(TestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def test_clear_keeps_other_entries_of_the_alias(self):
+        backend = DjangoCacheBackend(key_prefix="test:response")
+        cache.set("unrelated", "kept")
+        backend.bump_version("crm.order")
+        before = backend.get_versions(["crm.order"])
+
+        backend.clear()
+
+        self.assertEqual(cache.get("unrelated"), "kept")
+        # Every response key is built from these versions, so none of the
+        # entries cached before clear() can be looked up again.
+        self.assertNotEqual(backend.get_versions(["crm.order"]), before)
+
+    def test_deploy_check_warns_about_process_local_caches(self):
+        shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        local = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        cases = [
+            ({"BACKEND": "crm.response_cache.DjangoCacheBackend"}, shared, []),
+            ({"BACKEND": "crm.response_cache.DjangoCacheBackend"}, local, ["crm.W001"]),
+            ({"BACKEND": "crm.response_cache.LocalMemoryBackend"}, shared, ["crm.W001"]),
+        ]
+        for config, caches_setting, expected in cases:
+            with self.subTest(config=config, caches=caches_setting), override_settings(
+                GRAPHQL_RESPONSE_CACHE=config, CACHES=caches_setting
+            ):
+                self.assertEqual([warning.id for warning in check_response_cache_is_shared(None)], expected)
+
+
+class PersistedQueryTests(CRMTestCase):
+    product_names = "{ allProducts(first: 5) { edges { node { name } } } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(customers=0, products=2)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(CachedGraphQLView, "document_cache", DocumentCache(2))
+        self.document_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, query=None, sha256=None):
+        body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha256 or query_hash(query)}}}
+        if query:
+            body["query"] = query
+        return self.client.post(self.GRAPHQL_URL, body, content_type="application/json").json()
+
+    def error_code(self, content):
+        return content["errors"][0]["extensions"]["code"]
+
+    def test_known_hash_runs_without_the_query_text(self):
+        self.assertEqual(self.error_code(self.post(sha256=query_hash(self.product_names))), "PERSISTED_QUERY_NOT_FOUND")
+        registered = self.post(self.product_names)
+        self.assertNotIn("errors", registered)
+
+        response_cache.backend.clear()
+        self.assertEqual(self.post(sha256=query_hash(self.product_names))["data"], registered["data"])
+        self.assertEqual(self.document_cache.stats()["hits"], 1)
+
+    def test_hash_must_match_the_query(self):
+        content = self.post(self.product_names, sha256=query_hash("{ allProducts { totalCount } }"))
+        self.assertEqual(self.error_code(content), "BAD_PERSISTED_QUERY")
+        self.assertIsNone(self.document_cache.peek(query_hash(self.product_names)))
+
+    def test_least_recently_used_documents_are_evicted(self):
+        queries = [
+            self.product_names,
+            "{ allProducts(first: 1) { edges { node { name } } } }",
+            "{ allProducts(first: 2) { edges { node { stock } } } }",
+        ]
+        self.post(queries[0])
+        self.post(queries[1])
+        # Touching the first document makes the second the oldest.
+        self.post(sha256=query_hash(queries[0]))
+        self.post(queries[2])
+
+        self.assertEqual(self.document_cache.stats()["evictions"], 1)
+        self.assertEqual(self.error_code(self.post(sha256=query_hash(queries[1]))), "PERSISTED_QUERY_NOT_FOUND")
+        for query in (queries[0], queries[2]):
+            self.assertNotIn("errors", self.post(sha256=query_hash(query)))
+
+
+class TotalCountTests(CRMTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_catalog(customers=6)
+        # Gaps in the primary key: MAX - MIN + 1 would say 6.
+        Customer.objects.filter(name__in=["Customer 1", "Customer 2", "Customer 3"]).delete()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def total(self, mode=None):
+        argument = f"(mode: {mode})" if mode else ""
+        # Whole responses would be served from the response cache.
+        response_cache.backend.clear()
+        with CaptureQueriesContext(connection) as queries:
+            data = self.execute(f"{{ allCustomers(first: 1) {{ totalCount{argument} edges {{ node {{ id }} }} }} }}")
+        counted = any("COUNT(" in query["sql"] for query in queries.captured_queries)
+        return data["allCustomers"]["totalCount"], counted
+
+    def test_count_runs_only_when_selected(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.execute("{ allCustomers(first: 2) { edges { node { id } } } }")
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries.captured_queries))
+        self.assertEqual(self.total(), (3, True))
+
+    def test_cached_count_is_shared_until_it_expires(self):
+        self.assertEqual(self.total("CACHED"), (3, True))
+        Customer.objects.create(name="Late", email="late@example.com")
+        self.assertEqual(self.total("CACHED"), (3, False))
+        cache.clear()
+        self.assertEqual(self.total("CACHED"), (4, True))
+
+    @override_settings(GRAPHQL_TOTAL_COUNT={"ESTIMATE_THRESHOLD": 2})
+    def test_estimate_comes_from_statistics_or_falls_back_to_exact(self):
+        self.assertEqual(self.total("ESTIMATE"), (3, True))
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        Customer.objects.create(name="Late", email="late@example.com")
+        # The estimate is as of ANALYZE; no COUNT runs.
+        self.assertEqual(self.total("ESTIMATE"), (3, False))
+
+    @override_settings(GRAPHQL_TOTAL_COUNT={"ESTIMATE_THRESHOLD": 100})
+    def test_small_tables_are_counted_exactly(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(self.total("ESTIMATE"), (3, True))
+
+
+class CRMStatsTests(CRMTestCase):
+    query_text = "{ crmStats { customerCount orderCount totalRevenue } }"
+
+    @classmethod
+    def setUpTestData(cls):
+        (alice, bob), products = make_catalog()
+        make_orders(alice, products[:1], 2, amount="10.05")
+        make_orders(bob, products[:1], 1, amount="0.90")
+
+    def test_total_revenue_in_cents(self):
+        self.assertEqual(
+            self.execute(self.query_text)["crmStats"],
+            {"customerCount": 2, "orderCount": 3, "totalRevenue": "21.00"},
+        )
+
+    def test_total_revenue_without_orders(self):
+        data = self.execute('{ crmStats(orderDateGte: "2100-01-01T00:00:00Z") { orderCount totalRevenue } }')
+        self.assertEqual(data["crmStats"], {"orderCount": 0, "totalRevenue": "0.00"})
+
+    async def test_async_total_revenue_in_cents(self):
+        response = await self.async_client.post(
+            "/graphql/async", {"query": self.query_text}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["data"]["crmStats"]["totalRevenue"], "21.00")
+
+
+class CreateOrderTests(CRMTestCase):
+    def test_total_amount_in_cents(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        products = [
+            Product.objects.create(name=f"Part {i}", price=price, stock=1)
+            for i, price in enumerate((Decimal("0.10"), Decimal("0.20"), Decimal("19.99")))
+        ]
+        data = self.execute(
+            """
+            mutation($customerId: ID!, $productIds: [ID]!) {
+                createOrder(customerId: $customerId, productIds: $productIds) { order { totalAmount } }
+            }
+            """,
+            {"customerId": customer.pk, "productIds": [product.pk for product in products]},
+        )
+        self.assertEqual(data["createOrder"]["order"]["totalAmount"], "20.29")
+        self.assertEqual(Order.objects.get().total_amount, Decimal("20.29"))
+
+
+class RestockTests(CRMTestCase):
+    query_text = """
+        mutation { updateLowStockProducts(threshold: 10, increment: 5) { message products { name stock } } }
+    """
+
+    def test_sparse_keys_take_one_update_per_page(self):
+        for pk, stock in ((3, 2), (40_000, 50), (90_000, 9), (500_000, 0)):
+            Product.objects.create(pk=pk, name=f"Product {pk}", price=Decimal("1.00"), stock=stock)
+
+        with mock.patch("crm.schema.RESTOCK_CHUNK_SIZE", 2), OperationQueries(self, 3, connection):
+            data = self.execute(self.query_text)["updateLowStockProducts"]
+        self.assertEqual(data["message"], "Successfully restocked 3 products.")
+        self.assertEqual(
+            data["products"],
+            [
+                {"name": "Product 3", "stock": 7},
+                {"name": "Product 90000", "stock": 14},
+                {"name": "Product 500000", "stock": 5},
+            ],
+        )
+        self.assertEqual(Product.objects.get(pk=40_000).stock, 50)
+
+    def test_nothing_to_restock(self):
+        Product.objects.create(name="Full", price=Decimal("1.00"), stock=50)
+        data = self.execute(self.query_text)["updateLowStockProducts"]
+        self.assertEqual(data, {"message": "No low stock products found to update.", "products": []})
+
+
+class BackfillLastOrderAtCommandTests(TestCase):
+    def test_sparse_keys(self):
+        customers = [
+            Customer.objects.create(pk=pk, name=f"Customer {pk}", email=f"customer{pk}@example.com")
+            for pk in (2, 7_000, 7_001, 80_000, 900_000)
+        ]
+        orders = {customer.pk: Order.objects.create(customer=customer) for customer in customers[1::2]}
+        Customer.objects.update(last_order_at=None)
+
+        stdout = StringIO()
+        # Three pages of two keys, each one key lookup and one UPDATE.
+        with OperationQueries(self, 6, connection):
+            call_command("backfill_last_order_at", batch_size=2, stdout=stdout)
+        self.assertIn("Backfilled last_order_at for 5 customers.", stdout.getvalue())
+        self.assertEqual(
+            dict(Customer.objects.values_list("pk", "last_order_at")),
+            {customer.pk: getattr(orders.get(customer.pk), "order_date", None) for customer in customers},
+        )
+
+
+class SendOrderRemindersCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (customer,), products = make_catalog(customers=1, products=1)
+        cls.orders = make_orders(customer, products, 3)
+
+    def setUp(self):
+        RecordingSender.sent = []
+
+    def run_command(self, fail=(), **options):
+        config = {"SENDER": "crm.tests.RecordingSender", "OPTIONS": {"fail": fail}}
+        with override_settings(ORDER_REMINDERS=config):
+            call_command(
+                "send_order_reminders", retries=0, concurrency=2, stdout=StringIO(), stderr=StringIO(), **options
+            )
+
+    def test_sends_each_reminder_once(self):
+        self.run_command()
+        self.run_command()
+        self.assertEqual(sorted(RecordingSender.sent), [order.pk for order in self.orders])
+        self.assertEqual(OrderReminder.objects.filter(sent_at__isnull=False).count(), 3)
+
+    def test_failed_sends_raise_command_error_and_are_retried(self):
+        failing = self.orders[0].pk
+        with self.assertRaisesMessage(CommandError, "2 order reminders, 1 failed"):
+            self.run_command(fail=[failing])
+        self.assertFalse(OrderReminder.objects.filter(order_id=failing).exists())
+
+        self.run_command()
+        self.assertEqual(RecordingSender.sent[-1], failing)
+
+    def test_interrupted_run_is_resumed_without_resending(self):
+        claim_reminders = send_order_reminders.claim_reminders
+
+        def interrupted(*args):
+            reminders = claim_reminders(*args)
+            yield next(reminders)
+            yield next(reminders)
+            raise KeyboardInterrupt
+
+        with mock.patch.object(send_order_reminders, "claim_reminders", interrupted):
+            with self.assertRaises(KeyboardInterrupt):
+                self.run_command()
+        self.assertEqual(len(RecordingSender.sent), 2)
+        self.assertEqual(OrderReminder.objects.filter(sent_at__isnull=False).count(), 2)
+
+        # The third order was claimed but never sent; its claim has expired.
+        self.run_command(lease=0)
+        self.assertEqual(sorted(RecordingSender.sent), [order.pk for order in self.orders])
+
+
+class QueryCostTests(CRMTestCase):
+    def cost(self, query_text):
+        response = self.query(query_text)
+        return response.json()["extensions"]["cost"]
+
+    def test_connections_cost_per_row_of_their_page(self):
+        small = self.cost("{ allOrders(first: 1) { edges { node { id } } } }")["requested"]
+        large = self.cost("{ allOrders(first: 100) { edges { node { id } } } }")["requested"]
+        self.assertEqual(large - small, 99)
+
+    def test_nested_pages_multiply(self):
+        cost = self.cost("{ allCustomers(first: 10) { edges { node { orders(first: 20) { edges { node { id } } } } } } }")
+        # allCustomers, 10 rows, and per customer: orders and its 20 rows.
+        self.assertEqual(cost["requested"], 1 + 10 + 10 * (1 + 20))
+
+    @override_settings(GRAPHQL_QUERY_COST={"MAX_COST": 50})
+    def test_over_budget_operations_are_rejected_before_execution(self):
+        with self.assertNumQueries(0):
+            response = self.query("{ allOrders(first: 100) { edges { node { id } } } }")
+        payload = response.json()
+        self.assertNotIn("data", payload)
+        self.assertEqual(payload["errors"][0]["extensions"]["code"], "QUERY_TOO_COSTLY")
+
+    @override_settings(GRAPHQL_QUERY_COST={"MAX_DEPTH": 2})
+    def test_too_deep_operations_are_rejected(self):
+        response = self.query(
+            "{ allOrders(first: 1) { edges { node { customer { orders(first: 1) { edges { node { id } } } } } } } }"
+        )
+        self.assertEqual(response.json()["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+
+
+class OperationalEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("ops", password="secret", is_staff=True)
+        cls.customer = User.objects.create_user("customer", password="secret")
+
+    def test_cache_stats_are_staff_only(self):
+        self.assertEqual(self.client.get("/graphql/cache-stats").status_code, 403)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.client.get("/graphql/cache-stats").status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get("/graphql/cache-stats")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hits", response.json())
+
+    def test_metrics_need_staff_or_the_scrape_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+        self.client.logout()
+
+        with override_settings(GRAPHQL_TRACING={"METRICS_TOKEN": "scrape-secret"}):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("ops", password="secret", is_staff=True)
+        (cls.alice, cls.bob), products = make_catalog()
+        cls.orders = make_orders(cls.alice, products[:2], 2, amount="21.00")
+
+    def download(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_exports_need_staff_or_the_export_token(self):
+        self.assertEqual(self.client.get("/export/orders").status_code, 403)
+        with override_settings(CRM_EXPORTS={"TOKEN": "export-secret"}):
+            self.assertEqual(self.client.get("/export/orders", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+            self.download("/export/orders", HTTP_AUTHORIZATION="Bearer export-secret")
+
+    def test_orders_as_csv(self):
+        self.client.force_login(self.staff)
+        rows = list(csv.DictReader(self.download("/export/orders").splitlines()))
+        self.assertEqual([int(row["id"]) for row in rows], [order.pk for order in self.orders])
+        self.assertEqual(rows[0]["customer_email"], self.alice.email)
+        self.assertEqual(rows[0]["total_amount"], "21.00")
+        self.assertEqual(
+            rows[0]["product_ids"],
+            ";".join(str(pk) for pk in sorted(self.orders[0].products.values_list("pk", flat=True))),
+        )
+
+    def test_filtered_customers_as_ndjson(self):
+        self.client.force_login(self.staff)
+        content = self.download("/export/customers?format=ndjson&emailIcontains=customer1@")
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [self.bob.pk])
+        self.assertEqual(rows[0]["email"], self.bob.email)
+        self.assertIsNone(rows[0]["last_order_at"])
+
+    def test_unknown_export_and_format(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get("/export/payments").status_code, 404)
+        self.assertEqual(self.client.get("/export/orders?format=xml").status_code, 400)
+
+
+class CaptureReplayTests(LiveServerTestCase):
+    products_query = "query Products($first: Int) { allProducts(first: $first) { edges { node { name } } } }"
+    create_customer = (
+        "mutation AddCustomer($name: String!, $email: String!, $phone: String) "
+        "{ createCustomer(name: $name, email: $email, phone: $phone) { message } }"
+    )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.capture_path = os.path.join(directory.name, "capture.ndjson")
+        self.report_path = os.path.join(directory.name, "report.json")
+        # The capture logger keeps its file handler for the whole process.
+        self.addCleanup(self.close_capture_file)
+        make_catalog(customers=0, products=2)
+
+    def close_capture_file(self):
+        capture = logging.getLogger("crm.capture.records")
+        for handler in list(capture.handlers):
+            capture.removeHandler(handler)
+            handler.close()
+
+    def capture(self):
+        config = {"ENABLED": True, "SAMPLE_RATE": 1, "PATH": self.capture_path, "REDACT": ["email"]}
+        with override_settings(GRAPHQL_CAPTURE=config):
+            for query, variables in (
+                (self.products_query, {"first": 1}),
+                (self.create_customer, {"name": "Ada", "email": "ada@example.com", "phone": "+1234567890"}),
+                ("query Broken { allProducts { nope } }", None),
+            ):
+                self.client.post("/graphql", {"query": query, "variables": variables}, content_type="application/json")
+        self.close_capture_file()
+        with open(self.capture_path) as capture:
+            return [json.loads(line) for line in capture]
+
+    def replay(self, **options):
+        out = StringIO()
+        call_command(
+            "replay_graphql", self.capture_path, url=self.live_server_url, concurrency=2,
+            output=self.report_path, stdout=out, **options,
+        )
+        with open(self.report_path) as report:
+            rows = json.load(report)["operations"]
+        return out.getvalue(), {row["operation"]: (row["requests"], row["error_rate"]) for row in rows}
+
+    def test_captured_requests_replay_without_mutations(self):
+        lines = self.capture()
+        self.assertEqual([line["operationName"] for line in lines], [None, None, None])
+        self.assertEqual([line["status"] for line in lines], [200, 200, 400])
+        self.assertEqual(lines[0]["variables"], {"first": 1})
+        self.assertEqual(lines[1]["variables"], {"name": "Ada", "email": "[redacted]", "phone": "+1234567890"})
+
+        output, report = self.replay()
+        self.assertIn("Skipped 1 captured requests", output)
+        self.assertEqual(report, {"Products": (1, 0.0), "Broken": (1, 1.0), "TOTAL": (2, 0.5)})
+        self.assertEqual(Customer.objects.count(), 1)
+
+        output, report = self.replay(include_mutations=True)
+        self.assertNotIn("Skipped", output)
+        self.assertEqual(report["AddCustomer"], (1, 0.0))
+        self.assertTrue(Customer.objects.filter(email="[redacted]").exists())
+
+
+class GraphQLClientTests(LiveServerTestCase):
+    add_product = gql(
+        "mutation AddProduct($name: String!, $price: Float!) "
+        "{ createProduct(name: $name, price: $price, stock: 3) { product { name stock } } }"
+    )
+
+    def setUp(self):
+        # The shared session is built from these settings on first use.
+        settings_override = override_settings(GRAPHQL_CLIENT={
+            "ENDPOINT": f"{self.live_server_url}/graphql",
+            "SCHEMA_PATH": os.path.join(tempfile.gettempdir(), "missing-schema.graphql"),
+            "RETRIES": 0,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        graphql_client.close_session()
+        self.addCleanup(graphql_client.close_session)
+
+    def test_query_and_mutation_share_a_session(self):
+        with self.assertLogs("crm.graphql_client", "INFO") as logs:
+            created = graphql_client.execute(self.add_product, {"name": "Widget", "price": 4.5})
+            session = graphql_client.get_session()
+            listed = graphql_client.execute(gql("query Products { allProducts { edges { node { name } } } }"))
+
+        self.assertEqual(created, {"createProduct": {"product": {"name": "Widget", "stock": 3}}})
+        self.assertEqual(listed, {"allProducts": {"edges": [{"node": {"name": "Widget"}}]}})
+        self.assertIs(graphql_client.get_session(), session)
+        self.assertEqual(
+            [line.split(" took ")[0] for line in logs.output],
+            ["INFO:crm.graphql_client:GraphQL operation AddProduct", "INFO:crm.graphql_client:GraphQL operation Products"],
+        )
+
+    def test_errors_propagate(self):
+        with self.assertRaises(TransportQueryError) as raised:
+            graphql_client.execute(self.add_product, {"name": "Free", "price": -1})
+        self.assertEqual(raised.exception.errors[0]["message"], "Price must be positive")
+        self.assertFalse(Product.objects.exists())
+
+        # Documents are validated against the local schema before sending.
+        with self.assertRaises(GraphQLError):
+            graphql_client.execute(gql("{ allProducts { nope } }"))
+
+
+class OperationQueries(CaptureQueriesContext):
+    """assertNumQueries without the transaction statements, as benchmark_operations counts."""
+
+    def __init__(self, test_case, num, connection):
+        self.test_case = test_case
+        self.num = num
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        statements = [query["sql"] for query in self.captured_queries if not query["sql"].startswith(TRANSACTION_STATEMENTS)]
+        self.test_case.assertEqual(
+            len(statements),
+            self.num,
+            f"{len(statements)} queries executed, {self.num} expected\nCaptured queries were:\n"
+            + "\n".join(f"{i}. {sql}" for i, sql in enumerate(statements, start=1)),
+        )
+
+
+class OperationBudgetTests(TestCase):
+    """
+    Every crm.benchmarks operation against the "tiny" dataset runs exactly
+    its query budget. Test methods are added per operation below.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_data", scale="tiny", seed=DATASET_SEED, until=DATASET_UNTIL, verbosity=0, stdout=StringIO()
+        )
+
+    def setUp(self):
+        self.fixtures = dataset_fixtures()
+
+    def assertNumQueries(self, num, func=None, *args, using="default", **kwargs):
+        # Mutations run in atomic blocks, which add SAVEPOINT statements
+        # inside the test's transaction; the budgets leave those out.
+        context = OperationQueries(self, num, connections[using])
+        if func is None:
+            return context
+        with context:
+            func(*args, **kwargs)
+
+    def post(self, operation):
+        body = {"query": operation.document, "variables": operation.variables(self.fixtures)}
+        response_cache.backend.clear()
+        with transaction.atomic():
+            response = self.client.post("/graphql", body, content_type="application/json")
+            transaction.set_rollback(True)
+        return response
+
+    def run_operation(self, operation):
+        budget = operation.budget(self.fixtures) if callable(operation.budget) else operation.budget
+        # Warm-up: parses the document and fills the per-process caches.
+        self.post(operation)
+        with self.assertNumQueries(budget):
+            response = self.post(operation)
+        payload = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("errors", payload)
+
+
+def operation_test(operation):
+    def test(self):
+        self.run_operation(operation)
+
+    test.__name__ = f"test_{operation.name}"
+    return test
+
+
+for _operation in OPERATIONS:
+    setattr(OperationBudgetTests, f"test_{_operation.name}", operation_test(_operation))
+
+
+class KeysetPaginationTests(CRMTestCase):
+    query_text = """
+        query Orders($first: Int, $after: String, $last: Int, $before: String) {
+            allOrdersKeyset(first: $first, after: $after, last: $last, before: $before) {
+                pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+                edges { node { id } }
+            }
+        }
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        (customer,), products = make_catalog(customers=1, products=1)
+        orders = make_orders(customer, products, 7)
+        # Pairs of equal dates, so the id breaks ties.
+        start = timezone.now() - timedelta(days=10)
+        for i, order in enumerate(reversed(orders)):
+            Order.objects.filter(pk=order.pk).update(order_date=start + timedelta(days=i // 2))
+        cls.expected = [
+            Node.to_global_id("OrderNode", pk)
+            for pk in Order.objects.order_by("order_date", "id").values_list("pk", flat=True)
+        ]
+
+    def page(self, **variables):
+        connection = self.execute(self.query_text, variables)["allOrdersKeyset"]
+        return [edge["node"]["id"] for edge in connection["edges"]], connection["pageInfo"]
+
+    def test_forward_pages_follow_the_sort_key(self):
+        ids, info = self.page(first=3)
+        seen = list(ids)
+        while info["hasNextPage"]:
+            ids, info = self.page(first=3, after=info["endCursor"])
+            seen += ids
+        self.assertEqual(seen, self.expected)
+
+    def test_backward_page_before_a_cursor(self):
+        _, info = self.page(first=5)
+        ids, info = self.page(last=2, before=info["endCursor"])
+        self.assertEqual(ids, self.expected[2:4])
+        self.assertTrue(info["hasPreviousPage"])
+        self.assertTrue(info["hasNextPage"])
+
+    def test_inserts_do_not_shift_later_cursors(self):
+        ids, info = self.page(first=3)
+        customer = Customer.objects.get()
+        Order.objects.create(customer=customer, total_amount=Decimal("1.00"))
+        Order.objects.filter(pk=Order.objects.latest("pk").pk).update(order_date=timezone.now() - timedelta(days=30))
+        ids, _ = self.page(first=2, after=info["endCursor"])
+        self.assertEqual(ids, self.expected[3:5])
+
+    def test_rejects_bad_arguments(self):
+        for variables, message in (
+            ({"first": 1000}, "must be between 0 and"),
+            ({"first": 1, "last": 1}, "either `first` or `last`"),
+            ({"first": 1, "after": "bm90LWEtY3Vyc29y"}, "Invalid cursor"),
+        ):
+            response = self.query(self.query_text, variables=variables)
+            self.assertIn(message, response.json()["errors"][0]["message"])
+
+
+class OrderImportTests(CRMTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        (cls.alice, cls.bob), cls.products = make_catalog()
+        Product.objects.filter(pk=cls.products[2].pk).update(stock=1)
+
+    def test_valid_rows_are_created_and_bad_rows_reported(self):
+        p0, p1 = self.products[0].pk, self.products[1].pk
+        rows = [
+            {"customer_id": self.alice.pk, "product_ids": [p0, p1], "order_date": "2024-05-01T10:00:00Z"},
+            {"customer_email": self.bob.email, "product_ids": f"{p0};{p1}"},
+            {"customer_id": 999999, "product_ids": [p0]},
+            {"customer_id": self.alice.pk, "product_ids": []},
+            {"customer_id": self.alice.pk, "product_ids": [p0, p0]},
+            {"customer_id": self.alice.pk, "product_ids": [p0], "order_date": "yesterday"},
+        ]
+        results = list(import_orders(rows, chunk_size=4))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(sum(len(result.orders) for result in results), 2)
+        self.assertEqual(
+            [index for result in results for index, _ in result.errors],
+            [2, 3, 4, 5],
+        )
+        self.assertEqual(results[0].errors[0], (2, "Unknown customer_id 999999."))
+
+        alice_order = Order.objects.get(customer=self.alice)
+        self.assertEqual(alice_order.total_amount, Decimal("21.00"))
+        self.assertEqual(alice_order.order_date.isoformat(), "2024-05-01T10:00:00+00:00")
+        self.assertEqual(sorted(alice_order.products.values_list("pk", flat=True)), [p0, p1])
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.last_order_at, alice_order.order_date)
+        # Historical imports leave stock alone.
+        self.assertEqual(Product.objects.get(pk=p0).stock, 100)
+
+    def test_reserve_stock_rejects_orders_past_the_last_unit(self):
+        scarce = self.products[2].pk
+        rows = [{"customer_id": self.alice.pk, "product_ids": [scarce]} for _ in range(2)]
+        (result,) = import_orders(rows, reserve_stock=True)
+        self.assertEqual(len(result.orders), 1)
+        self.assertEqual(result.errors, [(1, "One or more products are out of stock.")])
+        self.assertEqual(Product.objects.get(pk=scarce).stock, 0)
+
+    def test_bulk_create_orders_mutation(self):
+        query = """
+            mutation Import($orders: [BulkOrderInput]!) {
+                bulkCreateOrders(orders: $orders, reserveStock: false) {
+                    createdCount orders { totalAmount } rowErrors { index message }
+                }
+            }
+        """
+        orders = [
+            {"customerId": self.bob.pk, "productIds": [self.products[0].pk]},
+            {"customerId": self.bob.pk, "productIds": [999999]},
+        ]
+        data = self.execute(query, {"orders": orders})["bulkCreateOrders"]
+        self.assertEqual(data["createdCount"], 1)
+        self.assertEqual(data["orders"], [{"totalAmount": "10.00"}])
+        self.assertEqual(data["rowErrors"], [{"index": 1, "message": "One or more product IDs are invalid."}])
+
+    def test_import_orders_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as source:
+            source.write("customer_email,product_ids,order_date\n")
+            source.write(f"{self.alice.email},{self.products[0].pk};{self.products[1].pk},2024-01-01T00:00:00Z\n")
+            source.write("nobody@example.com,1,\n")
+        self.addCleanup(os.unlink, source.name)
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command("import_orders", source.name, stdout=stdout, stderr=stderr)
+        self.assertIn("Imported 1 orders", stdout.getvalue())
+        self.assertIn("Row 2: Unknown customer_email nobody@example.com.", stderr.getvalue())
+        self.assertEqual(Order.objects.filter(customer=self.alice).count(), 1)
+
+
+class SeedDataCommandTests(TestCase):
+    def seed(self, workers):
+        call_command(
+            "seed_data", customers=20, products=8, orders=60, chunk_size=7, workers=workers,
+            flush=True, seed=DATASET_SEED, until=DATASET_UNTIL, stdout=StringIO(),
+        )
+        return (
+            list(Customer.objects.order_by("pk").values_list("pk", "email", "created_at", "last_order_at")),
+            list(Order.objects.order_by("pk").values_list("pk", "customer_id", "total_amount", "order_date")),
+            list(Order.products.through.objects.order_by("order_id", "product_id").values_list("order_id", "product_id")),
+        )
+
+    def test_workers_generate_the_same_rows_as_one_process(self):
+        customers, orders, links = self.seed(workers=1)
+        self.assertEqual((len(customers), len(orders)), (20, 60))
+        self.assertTrue(all(created_at < DATASET_UNTIL for _, _, created_at, _ in customers))
+        self.assertEqual(self.seed(workers=3), (customers, orders, links))
@@ -0,0 +1,283 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import isawaitable
+
+from django.conf import settings
+from graphene.utils.str_converters import to_snake_case
+from graphql import get_named_type, is_leaf_type
+
+DEFAULTS = {
+    "ENABLED": True,
+    # Add each operation's trace to the response extensions.
+    "EXTENSIONS": False,
+    "BUCKETS": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    # Rolling window behind the quantile gauges: SLOTS slots of SLOT_SECONDS.
+    "SLOT_SECONDS": 60,
+    "SLOTS": 5,
+    # Operation names come from clients; cap the label values.
+    "MAX_OPERATIONS": 200,
+    # Bearer token that lets a scraper read /metrics without a staff
+    # session. None: staff only.
+    "METRICS_TOKEN": None,
+}
+
+_current = ContextVar("crm_trace", default=None)
+
+
+def tracing_settings():
+    return {**DEFAULTS, **getattr(settings, "GRAPHQL_TRACING", {})}
+
+
+class OperationTrace:
+    """Resolver and SQL timings of one GraphQL request."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.started = time.perf_counter()
+        self.duration = None
+        self.sql_count = 0
+        self.sql_time = 0.0
+        # "Type.field" -> [calls, seconds]
+        self.resolvers = {}
+
+    def add_resolver(self, key, elapsed):
+        entry = self.resolvers.get(key)
+        if entry is None:
+            self.resolvers[key] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def elapsed(self):
+        if self.duration is not None:
+            return self.duration
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            "operation": self.operation,
+            "duration": self.elapsed(),
+            "sql": {"count": self.sql_count, "time": self.sql_time},
+            "resolvers": {
+                key: {"calls": calls, "time": elapsed}
+                for key, (calls, elapsed) in sorted(self.resolvers.items(), key=lambda item: -item[1][1])
+            },
+        }
+
+
+def current_trace():
+    return _current.get()
+
+
+def name_operation(name):
+    trace = _current.get()
+    if trace is not None and name:
+        trace.operation = name
+
+
+@contextmanager
+def trace_operation(operation=None):
+    """
+    Collect a trace for the code inside the block and record its latency.
+    Yields None when tracing is disabled.
+    """
+    config = tracing_settings()
+    if not config["ENABLED"]:
+        yield None
+        return
+    trace = OperationTrace(operation)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        metrics.observe(trace)
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """Connection execute wrapper charging each query to the current trace."""
+    trace = _current.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.sql_count += 1
+        trace.sql_time += time.perf_counter() - started
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    if sql_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(sql_execute_wrapper)
+
+
+class TracingMiddleware:
+    """
+    Graphene middleware timing resolvers into the current trace.
+
+    Plain attribute reads are not timed: only fields that return an object
+    or connection, or that have their own ``resolve_*`` method (totalCount,
+    crmStats, ...). The decision is cached per field, so untimed fields cost
+    one dict lookup. Views are instantiated per request, so they share the
+    module-level ``tracing_middleware`` to keep that cache warm.
+    """
+
+    def __init__(self):
+        self._timed = {}
+
+    def should_time(self, info):
+        # The sync and async schemas both have a "Query" type; key by object.
+        key = (info.parent_type, info.field_name)
+        timed = self._timed.get(key)
+        if timed is None:
+            field = info.parent_type.fields[info.field_name]
+            graphene_type = getattr(info.parent_type, "graphene_type", None)
+            timed = not is_leaf_type(get_named_type(field.type)) or hasattr(
+                graphene_type, f"resolve_{to_snake_case(info.field_name)}"
+            )
+            self._timed[key] = timed
+        return timed
+
+    def resolve(self, next, root, info, **args):
+        trace = _current.get()
+        if trace is None or not self.should_time(info):
+            return next(root, info, **args)
+
+        key = f"{info.parent_type.name}.{info.field_name}"
+        started = time.perf_counter()
+        result = next(root, info, **args)
+        if isawaitable(result):
+            return self._await(result, trace, key, started)
+        trace.add_resolver(key, time.perf_counter() - started)
+        return result
+
+    async def _await(self, result, trace, key, started):
+        try:
+            return await result
+        finally:
+            trace.add_resolver(key, time.perf_counter() - started)
+
+
+tracing_middleware = TracingMiddleware()
+
+
+class RollingHistogram:
+    """
+    Latency histogram with cumulative bucket counts for Prometheus plus a
+    ring of time slots, so quantiles can be read over the recent window.
+    """
+
+    def __init__(self, buckets, slot_seconds, slots):
+        self.buckets = buckets
+        self.slot_seconds = slot_seconds
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.window = [[None, [0] * (len(buckets) + 1)] for _ in range(slots)]
+
+    def observe(self, trace, now):
+        index = bisect_left(self.buckets, trace.duration)
+        self.counts[index] += 1
+        self.total += 1
+        self.sum += trace.duration
+        self.sql_count += trace.sql_count
+        self.sql_time += trace.sql_time
+
+        slot_id = int(now // self.slot_seconds)
+        slot = self.window[slot_id % len(self.window)]
+        if slot[0] != slot_id:
+            slot[0] = slot_id
+            slot[1] = [0] * (len(self.buckets) + 1)
+        slot[1][index] += 1
+
+    def window_quantile(self, q, now):
+        oldest = int(now // self.slot_seconds) - len(self.window) + 1
+        counts = [0] * (len(self.buckets) + 1)
+        for slot_id, slot_counts in self.window:
+            if slot_id is not None and slot_id >= oldest:
+                counts = [a + b for a, b in zip(counts, slot_counts)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= rank:
+                # Upper bound of the bucket; the overflow bucket reports the
+                # largest finite bound.
+                return self.buckets[min(index, len(self.buckets) - 1)]
+        return self.buckets[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, trace):
+        config = tracing_settings()
+        name = trace.operation or "anonymous"
+        now = time.time()
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                if len(self._histograms) >= config["MAX_OPERATIONS"]:
+                    name = "other"
+                    histogram = self._histograms.get(name)
+                if histogram is None:
+                    histogram = RollingHistogram(config["BUCKETS"], config["SLOT_SECONDS"], config["SLOTS"])
+                    self._histograms[name] = histogram
+            histogram.observe(trace, now)
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        now = time.time()
+        duration = "crm_graphql_operation_duration_seconds"
+        lines = [
+            f"# HELP {duration} GraphQL operation latency.",
+            f"# TYPE {duration} histogram",
+        ]
+        window = [
+            f"# HELP {duration}_window Latency quantiles over the recent rolling window.",
+            f"# TYPE {duration}_window gauge",
+        ]
+        sql_count = [
+            "# HELP crm_graphql_sql_queries_total SQL queries run by GraphQL operations.",
+            "# TYPE crm_graphql_sql_queries_total counter",
+        ]
+        sql_time = [
+            "# HELP crm_graphql_sql_seconds_total Time spent in SQL by GraphQL operations.",
+            "# TYPE crm_graphql_sql_seconds_total counter",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                label = 'operation="{}"'.format(name.replace("\\", "\\\\").replace('"', '\\"'))
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {histogram.total}')
+                lines.append(f"{duration}_sum{{{label}}} {histogram.sum}")
+                lines.append(f"{duration}_count{{{label}}} {histogram.total}")
+                for q in (0.5, 0.95, 0.99):
+                    value = histogram.window_quantile(q, now)
+                    if value is not None:
+                        window.append(f'{duration}_window{{{label},quantile="{q}"}} {value}')
+                sql_count.append(f"crm_graphql_sql_queries_total{{{label}}} {histogram.sql_count}")
+                sql_time.append(f"crm_graphql_sql_seconds_total{{{label}}} {histogram.sql_time}")
+        return "\n".join(lines + window + sql_count + sql_time) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = Metrics()
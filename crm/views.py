@@ -1,3 +1,470 @@
-from django.shortcuts import render
+import hashlib
+import hmac
+import json
+import threading
+from functools import partial, wraps
+from inspect import isawaitable
+from collections import OrderedDict
 
-# Create your views here.
+from django.conf import settings
+from django.db import connection, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+    validate_schema,
+)
+
+from crm.cost import analyze
+from crm.exports import EXPORT_CHUNK_SIZE, EXPORTS, FORMATS, aiterate, export_queryset, export_settings
+from crm.response_cache import response_cache
+from crm.tracing import metrics, name_operation, trace_operation, tracing_middleware, tracing_settings
+
+
+class CachedDocument:
+    def __init__(self, query, document, errors):
+        self.query = query
+        self.document = document
+        self.errors = errors
+        self.normalized = None
+
+
+class DocumentCache:
+    """
+    Thread-safe bounded LRU of parsed and validated GraphQL documents, keyed
+    by the SHA-256 of the query text. The same keys serve automatic persisted
+    queries, so a client can send just the hash once its query is cached.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def peek(self, key):
+        """Like get() without touching the LRU order or the counters."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+document_cache = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 1000))
+# Documents are validated against one schema, so the async schema gets its own.
+async_document_cache = DocumentCache(getattr(settings, "GRAPHQL_DOCUMENT_CACHE_SIZE", 1000))
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def with_extensions(result, extensions):
+    if extensions:
+        result.extensions = {**(result.extensions or {}), **extensions}
+    return result
+
+
+def persisted_query_error(message, code):
+    return ExecutionResult(errors=[GraphQLError(message, extensions={"code": code})])
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView that parses and validates each distinct document once.
+
+    Supports the automatic persisted query protocol: a request whose
+    ``extensions.persistedQuery.sha256Hash`` is known may omit ``query``;
+    an unknown hash answers ``PersistedQueryNotFound`` so the client retries
+    with the full text.
+    """
+
+    document_cache = document_cache
+    response_cache = response_cache
+
+    def get_persisted_hash(self, request, data):
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if not extensions:
+            return None
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = extensions.get("persistedQuery") or {}
+        return persisted.get("sha256Hash")
+
+    def get_document(self, schema, query, key):
+        entry = self.document_cache.get(key)
+        if entry is None:
+            document = parse(query)
+            errors = validate(
+                schema,
+                document,
+                self.validation_rules,
+                graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+            entry = CachedDocument(query, document, errors)
+            self.document_cache.put(key, entry)
+        return entry
+
+    def load_document(self, request, data, query, operation_name, show_graphiql=False):
+        """
+        Find or parse and validate the request's document. Returns
+        ``(result, entry, operation_ast)``; when ``entry`` is None the request
+        is already answered with ``result`` (persisted query miss, validation
+        errors, ...).
+        """
+        persisted_hash = self.get_persisted_hash(request, data)
+        entry = None
+
+        if not query and persisted_hash:
+            entry = self.document_cache.get(persisted_hash)
+            if entry is None:
+                return persisted_query_error("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND"), None, None
+        elif not query:
+            if show_graphiql:
+                return None, None, None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors), None, None
+
+        if entry is None:
+            key = query_hash(query)
+            if persisted_hash and persisted_hash != key:
+                return persisted_query_error("provided sha does not match query", "BAD_PERSISTED_QUERY"), None, None
+            try:
+                entry = self.get_document(schema, query, key)
+            except GraphQLError as e:
+                return ExecutionResult(errors=[e]), None, None
+
+        operation_ast = get_operation_ast(entry.document, operation_name)
+        if operation_ast is not None and operation_ast.name is not None:
+            name_operation(operation_ast.name.value)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None, None, None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if entry.errors:
+            return ExecutionResult(data=None, errors=entry.errors), None, None
+        return None, entry, operation_ast
+
+    def analyze_cost(self, schema, entry, operation_ast, variables):
+        """``(extensions, error)`` from crm.cost; ``error`` rejects the request unexecuted."""
+        if operation_ast is None:
+            return None, None
+        return analyze(schema, entry.document, operation_ast, variables)
+
+    def result_payload(self, execution_result):
+        """Response body and status for ``execution_result``, keeping its ``extensions``."""
+        response = {}
+        status_code = 200
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+        return response, status_code
+
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if middleware is None:
+            return [tracing_middleware]
+        return [tracing_middleware, *middleware]
+
+    def trace_extensions(self, result, trace):
+        """Attach the operation's trace when GRAPHQL_TRACING["EXTENSIONS"] is on."""
+        if result is not None and trace is not None and tracing_settings()["EXTENSIONS"]:
+            with_extensions(result, {"tracing": trace.as_dict()})
+        return result
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        with trace_operation(operation_name) as trace:
+            execution_result = self.trace_extensions(
+                self.execute_graphql_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                ),
+                trace,
+            )
+
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        if not execution_result:
+            return None, 200
+
+        if execution_result.errors:
+            set_rollback()
+        response, status_code = self.result_payload(execution_result)
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        result, entry, operation_ast = self.load_document(
+            request, data, query, operation_name, show_graphiql
+        )
+        if entry is None:
+            return result
+
+        schema = self.schema.graphql_schema
+        document = entry.document
+        extensions, error = self.analyze_cost(schema, entry, operation_ast, variables)
+        if error is not None:
+            return ExecutionResult(errors=[error], extensions=extensions)
+
+        cache_key = self.response_cache.get_key(
+            schema, entry, operation_ast, operation_name, variables
+        )
+        if cache_key is not None:
+            data = self.response_cache.get(cache_key)
+            if data is not None:
+                return ExecutionResult(data=data, extensions=extensions)
+
+        try:
+            execute_options = self.execute_options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return with_extensions(result, extensions)
+
+            result = execute(schema, document, **execute_options)
+            if cache_key is not None and not result.errors:
+                self.response_cache.set(cache_key, result.data)
+            return with_extensions(result, extensions)
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+
+
+class AsyncGraphQLView(CachedGraphQLView):
+    """
+    Query-only GraphQL endpoint for ASGI. Execution runs on the event loop
+    with the async schema's coroutine resolvers, so a slow query no longer
+    holds a worker thread and independent root fields resolve concurrently.
+    Shares document parsing, persisted queries and the response cache with
+    CachedGraphQLView; GraphiQL and batching are not served here.
+    """
+
+    document_cache = async_document_cache
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+            data = self.parse_body(request)
+            query, variables, operation_name, _ = self.get_graphql_params(request, data)
+            with trace_operation(operation_name) as trace:
+                result = self.trace_extensions(
+                    await self.aexecute_graphql_request(
+                        request, data, query, variables, operation_name
+                    ),
+                    trace,
+                )
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+        response, status_code = self.result_payload(result)
+        return HttpResponse(
+            status=status_code,
+            content=self.json_encode(request, response),
+            content_type="application/json",
+        )
+
+    async def aexecute_graphql_request(self, request, data, query, variables, operation_name):
+        result, entry, operation_ast = self.load_document(request, data, query, operation_name)
+        if entry is None:
+            return result
+
+        schema = self.schema.graphql_schema
+        extensions, error = self.analyze_cost(schema, entry, operation_ast, variables)
+        if error is not None:
+            return ExecutionResult(errors=[error], extensions=extensions)
+
+        cache_key = self.response_cache.get_key(
+            schema, entry, operation_ast, operation_name, variables
+        )
+        if cache_key is not None:
+            data = self.response_cache.get(cache_key)
+            if data is not None:
+                return ExecutionResult(data=data, extensions=extensions)
+
+        try:
+            result = execute(
+                schema, entry.document, **self.execute_options(request, variables, operation_name)
+            )
+            if isawaitable(result):
+                result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e], extensions=extensions)
+        if cache_key is not None and not result.errors:
+            self.response_cache.set(cache_key, result.data)
+        return with_extensions(result, extensions)
+
+
+def staff_only(view=None, token=None):
+    """
+    Keep an operational endpoint to logged-in staff; anyone else gets a 403.
+    ``token()`` may return a secret that also grants access when sent as
+    ``Authorization: Bearer <token>``, for clients without a session.
+    """
+    if view is None:
+        return partial(staff_only, token=token)
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not (request.user.is_staff or has_bearer_token(request, token() if token else None)):
+            return JsonResponse({"error": "Staff only."}, status=403)
+        return view(request, *args, **kwargs)
+
+    return wrapped
+
+
+def has_bearer_token(request, expected):
+    if not expected:
+        return False
+    scheme, _, given = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(given.encode(), expected.encode())
+
+
+@staff_only
+def document_cache_stats(request):
+    return JsonResponse(document_cache.stats())
+
+
+@staff_only(token=lambda: tracing_settings()["METRICS_TOKEN"])
+def graphql_metrics(request):
+    """Operation latency histograms and SQL totals for Prometheus to scrape."""
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@staff_only(token=lambda: export_settings()["TOKEN"])
+def export(request, name):
+    """
+    Stream every order or customer matching the query-string filters (the
+    OrderFilter/CustomerFilter arguments, snake_case or camelCase) as
+    ``?format=csv`` (default) or ``ndjson``. Rows are read ``EXPORT_CHUNK_SIZE``
+    at a time, so memory does not grow with the size of the export. Exports
+    hold customer data: staff only, or ``CRM_EXPORTS["TOKEN"]`` as a bearer
+    token.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if name not in EXPORTS:
+        return JsonResponse({"error": f"Unknown export {name!r}."}, status=404)
+    export_format = request.GET.get("format", "csv")
+    if export_format not in FORMATS:
+        return JsonResponse({"error": f"Unknown format {export_format!r}; use csv or ndjson."}, status=400)
+
+    queryset, filterset = export_queryset(name, request.GET)
+    if queryset is None:
+        return JsonResponse({"errors": filterset.errors}, status=400)
+
+    _, _, row_chunks, columns = EXPORTS[name]
+    content_type, render = FORMATS[export_format]
+    content = render(row_chunks(queryset, EXPORT_CHUNK_SIZE), columns)
+    if isinstance(request, ASGIRequest):
+        content = aiterate(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{name}.{export_format}"'
+    return response
@@ -4,27 +4,13 @@ import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql_crm.settings")
 django.setup()
 
-from crm.models import Customer, Product
+from django.core.management import call_command
 
-def run():
-    Customer.objects.all().delete()
-    Product.objects.all().delete()
-
-    customers = [
-        {"name": "Alice", "email": "alice@example.com", "phone": "+1234567890"},
-        {"name": "Bob", "email": "bob@example.com", "phone": "123-456-7890"},
-    ]
-    for c in customers:
-        Customer.objects.create(**c)
 
-    products = [
-        {"name": "Laptop", "price": 1200.00, "stock": 5},
-        {"name": "Phone", "price": 500.00, "stock": 15},
-    ]
-    for p in products:
-        Product.objects.create(**p)
+def run():
+    # See `python manage.py seed_data --help` for larger datasets.
+    call_command("seed_data", scale="tiny", flush=True)
 
-    print("Database seeded successfully!")
 
 if __name__ == "__main__":
     run()